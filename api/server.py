@@ -3,16 +3,34 @@
 
 import os
 import sys
+import time
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory
 from flask_cors import CORS
 
 # Ajouter le répertoire parent au path pour les imports entre modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.config import logger, config, HOST, PORT
-from printer.printer_utils import get_printers, print_raw, print_smart, print_test, detect_printer_width, detect_printer_encoding
+from printer.printer_utils import print_test, detect_printer_width, detect_printer_encoding, get_logo_cache_stats, safe_encode_french
 from printer.receipt import format_receipt
+from printer.registry import printer_registry
+from printer.jobs import job_manager, printer_key, JOB_DONE
+from printer.groups import printer_groups
+from printer.status import printer_status
+from printer.templates import receipt_templates, find_placeholders, substitute
+from printer.raster import DITHER_METHODS
+from utils.metrics import metrics
+from utils.idempotency import idempotency_cache, IDEMPOTENCY_REPLAY, IDEMPOTENCY_IN_PROGRESS, IDEMPOTENCY_MISMATCH
+
+# Histogramme des durées par étape (analyse, validation, rendu, file, transport)
+STAGE_METRIC = 'thermal_stage_duration_seconds'
+
+# Endpoints comptés dans thermal_requests_total
+METERED_ENDPOINTS = ('print_endpoint', 'print_batch_endpoint', 'network_print_endpoint', 'bluetooth_print')
 
 def create_static_content():
     """Crée les fichiers statiques nécessaires"""
@@ -183,12 +201,141 @@ def create_static_content():
     with open('static/index.html', 'w', encoding='utf-8') as f:
         f.write(html)
 
+SECTION_TYPES = {'header', 'text', 'separator', 'keyvalue', 'table', 'feed', 'cut', 'logo'}
+
+
+def _is_amount(value):
+    """Cellule 'price' / 'integer' : nombre, chaîne contenant des chiffres, ou vide."""
+    if value is None or value == '':
+        return True
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    return isinstance(value, str) and any(c.isdigit() for c in value)
+
+
+def validate_section(i, section, templated=False):
+    """
+    Valide la section n° i d'un reçu dynamique. Retourne une liste d'erreurs.
+
+    Args:
+        templated (bool): section de modèle ; les chaînes contenant une variable
+                          "{{nom}}" ne sont vérifiées qu'après substitution
+    """
+    def pending(value):
+        return templated and isinstance(value, str) and bool(find_placeholders(value))
+
+    errors = []
+    if not isinstance(section, dict):
+        errors.append(f"Section {i}: doit être un objet JSON")
+        return errors
+    sec_type = section.get('type')
+    if sec_type not in SECTION_TYPES:
+        errors.append(f"Section {i}: type '{sec_type}' inconnu. Types valides: {sorted(SECTION_TYPES)}")
+    if sec_type == 'table':
+        columns, rows = section.get('columns'), section.get('rows')
+        if 'columns' not in section:
+            errors.append(f"Section {i} (table): 'columns' manquant")
+        elif not pending(columns) and (not isinstance(columns, list) or not columns
+                                       or not all(isinstance(c, (str, dict)) for c in columns)):
+            errors.append(f"Section {i} (table): 'columns' doit être une liste non vide")
+            columns = []
+        if 'rows' not in section:
+            errors.append(f"Section {i} (table): 'rows' manquant")
+        elif not pending(rows):
+            if not isinstance(rows, list):
+                errors.append(f"Section {i} (table): 'rows' doit être une liste de lignes")
+            elif isinstance(columns, list):
+                amounts = [(j, c.get('label', j)) for j, c in enumerate(columns)
+                           if isinstance(c, dict) and c.get('format') in ('price', 'integer')]
+                for r, row in enumerate(rows):
+                    if pending(row):
+                        continue
+                    if not isinstance(row, list):
+                        errors.append(f"Section {i} (table): ligne {r} doit être une liste")
+                        break
+                    bad = [label for j, label in amounts
+                           if j < len(row) and not pending(row[j]) and not _is_amount(row[j])]
+                    if bad:
+                        errors.append(f"Section {i} (table): ligne {r}, montant invalide "
+                                      f"(colonne(s) {bad})")
+                        break
+    if sec_type == 'keyvalue':
+        rows = section.get('rows')
+        if 'rows' not in section:
+            errors.append(f"Section {i} (keyvalue): 'rows' manquant")
+        elif not pending(rows) and (not isinstance(rows, list) or not all(
+                pending(row) or isinstance(row, dict) for row in rows)):
+            errors.append(f"Section {i} (keyvalue): 'rows' doit être une liste d'objets {{key, value}}")
+    if sec_type in ('feed', 'cut') and 'lines' in section and not pending(section['lines']):
+        try:
+            int(section['lines'])
+        except (TypeError, ValueError):
+            errors.append(f"Section {i} ({sec_type}): 'lines' doit être un entier")
+    if sec_type == 'logo' and not section.get('image') and not section.get('path'):
+        errors.append(f"Section {i} (logo): champ 'image' (base64) ou 'path' requis")
+    if sec_type == 'logo' and section.get('dither') not in (None,) + DITHER_METHODS:
+        errors.append(f"Section {i} (logo): 'dither' inconnu. Valeurs: {list(DITHER_METHODS)}")
+    return errors
+
+
+def validate_sections(sections, templated=False):
+    """Valide les sections d'un reçu dynamique. Retourne une liste d'erreurs (vide si OK)."""
+    errors = []
+    if not isinstance(sections, list):
+        errors.append("'data.sections' doit être une liste")
+        return errors
+    for i, section in enumerate(sections):
+        errors.extend(validate_section(i, section, templated))
+    return errors
+
+
+def validate_template_request(data):
+    """
+    Valide une impression par modèle ('template_id' + 'variables') : les
+    sections à variables sont validées après substitution, comme celles de
+    /print, et chaque erreur nomme la variable en cause.
+    """
+    errors = []
+    template = receipt_templates.get(data['template_id'])
+    if template is None:
+        errors.append(f"Modèle '{data['template_id']}' inconnu")
+        return errors
+    variables = data.get('variables', {})
+    if not isinstance(variables, dict):
+        errors.append("'variables' doit être un objet JSON")
+        return errors
+    missing = sorted(template.variables - set(variables))
+    if missing:
+        errors.append(f"Variable(s) manquante(s) pour le modèle '{template.id}': {missing}")
+        return errors
+
+    for i, (section, names) in enumerate(zip(template.sections, template.section_variables)):
+        if not names:
+            continue
+        section_errors = validate_section(i, substitute(section, variables))
+        if not section_errors:
+            continue
+        # Variable(s) en cause : substituées une à une, les autres restant en attente
+        unresolved = {name: '{{%s}}' % name for name in names}
+        culprits = [name for name in sorted(names)
+                    if validate_section(i, substitute(section, {**unresolved, name: variables[name]}),
+                                        templated=True)] or sorted(names)
+        errors.extend(f"{error} — variable(s) {culprits}" for error in section_errors)
+    return errors
+
+
 def validate_print_request(data):
     """Valide les données d'une requête d'impression. Retourne une liste d'erreurs (vide si OK)."""
     errors = []
     print_type = data.get('type', 'receipt')
 
     if print_type == 'receipt':
+        # ── Modèle compilé : seules les variables sont transmises ──────────
+        if 'template_id' in data:
+            return validate_template_request(data)
+
         receipt_data = data.get('data')
         if receipt_data is None:
             errors.append("Champ 'data' manquant")
@@ -199,27 +346,7 @@ def validate_print_request(data):
 
         # ── Mode dynamique : valider les sections ──────────────────────────
         if 'sections' in receipt_data:
-            sections = receipt_data['sections']
-            if not isinstance(sections, list):
-                errors.append("'data.sections' doit être une liste")
-            else:
-                valid_types = {'header', 'text', 'separator', 'keyvalue', 'table', 'feed', 'cut', 'logo'}
-                for i, section in enumerate(sections):
-                    if not isinstance(section, dict):
-                        errors.append(f"Section {i}: doit être un objet JSON")
-                        continue
-                    sec_type = section.get('type')
-                    if sec_type not in valid_types:
-                        errors.append(f"Section {i}: type '{sec_type}' inconnu. Types valides: {sorted(valid_types)}")
-                    if sec_type == 'table':
-                        if 'columns' not in section:
-                            errors.append(f"Section {i} (table): 'columns' manquant")
-                        if 'rows' not in section:
-                            errors.append(f"Section {i} (table): 'rows' manquant")
-                    if sec_type == 'keyvalue' and 'rows' not in section:
-                        errors.append(f"Section {i} (keyvalue): 'rows' manquant")
-                    if sec_type == 'logo' and not section.get('image') and not section.get('path'):
-                        errors.append(f"Section {i} (logo): champ 'image' (base64) ou 'path' requis")
+            errors.extend(validate_sections(receipt_data['sections']))
             return errors
 
         # ── Mode classique : valider les items ─────────────────────────────
@@ -251,6 +378,216 @@ def validate_print_request(data):
     return errors
 
 
+
+def validate_callback_url(data):
+    """Vérifie le champ optionnel 'callback_url'. Retourne un message d'erreur ou None."""
+    callback_url = data.get('callback_url')
+    if callback_url is None:
+        return None
+    if not isinstance(callback_url, str) or not callback_url.lower().startswith(('http://', 'https://')):
+        return "'callback_url' doit être une URL http(s)"
+    return None
+
+
+def is_async_request(data, default):
+    """Mode de soumission demandé : champ 'async' (ou ?async=1), sinon `default`."""
+    value = data.get('async', request.args.get('async'))
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def job_accepted_response(job, message, **fields):
+    """Réponse HTTP 202 d'un travail mis en file (suivi via /jobs/<id> et /jobs/<id>/wait)."""
+    return jsonify({
+        'status': 'success',
+        'message': message,
+        'job_id': job.id,
+        'job_status': job.status,
+        'job_url': f"/jobs/{job.id}",
+        'wait_url': f"/jobs/{job.id}/wait",
+        **fields,
+    }), 202
+
+
+def resolve_printer(data):
+    """
+    Retourne l'imprimante ciblée par une requête d'impression : membre choisi du
+    groupe 'printer_group', sinon 'printer_id', sinon imprimante par défaut.
+
+    Returns:
+        tuple: (printer_info, None) si trouvée, sinon (None, (message, code HTTP))
+    """
+    group_name = data.get('printer_group')
+    if group_name is not None:
+        if printer_groups.get_config(group_name) is None:
+            return None, (f"Groupe d'imprimantes '{group_name}' inconnu", 404)
+        printer_info = printer_groups.choose(group_name, load=job_manager.load)
+        if printer_info is None:
+            return None, (f"Aucune imprimante disponible dans le groupe '{group_name}'", 503)
+        return printer_info, None
+
+    printer_id = data.get('printer_id', config.get('default_printer_id'))
+    if printer_id is None:
+        return None, ("Aucune imprimante par défaut configurée et aucun ID d'imprimante spécifié", 400)
+
+    printer_info = printer_registry.get_by_id(printer_id)
+    if printer_info is None:
+        return None, (f"Imprimante avec ID {printer_id} non trouvée", 404)
+    return printer_info, None
+
+
+def render_print_request(data, printer_info):
+    """
+    Construit les commandes ESC/POS d'une requête d'impression déjà validée.
+
+    Returns:
+        tuple: (commands, printer_width, encoding)
+    """
+    printer_name = printer_info['name']
+
+    # Récupérer ou détecter la largeur de l'imprimante
+    printer_width = data.get('printer_width')
+    if printer_width is None:
+        printer_width = printer_info.get('width',
+                              config.get('default_printer_width', '58mm'))
+
+    encoding = 'ascii'
+    logger.info(f"Impression sur {printer_name} ({printer_info.get('connection_type', 'usb')}), "
+                f"largeur: {printer_width}")
+
+    # Type d'impression
+    print_type = data.get('type', 'receipt')
+
+    if print_type == 'receipt' and 'template_id' in data:
+        # Sections statiques déjà rendues : seules les sections à variables le sont ici
+        template = receipt_templates.get(data['template_id'])
+        if template is None:
+            raise ValueError(f"Modèle '{data['template_id']}' inconnu")
+        commands = template.render(data.get('variables', {}), printer_width, encoding, printer_name)
+    elif print_type == 'receipt':
+        receipt_data = data.get('data', {})
+        receipt_type = data.get('receipt_type', 'standard')
+        commands = format_receipt(
+            receipt_data,
+            receipt_type,
+            printer_width,
+            encoding,
+            printer_name
+        )
+    elif print_type == 'raw':
+        commands = safe_encode_french(data.get('text', ''), encoding, printer_name)
+    else:
+        raise ValueError(f"Type d'impression '{print_type}' non pris en charge")
+
+    return bytes(commands), printer_width, encoding
+
+
+def handle_print_request():
+    """
+    Traite une requête POST /print : validation, rendu et mise en file.
+
+    Returns:
+        tuple: (réponse JSON, code HTTP)
+    """
+    try:
+        with metrics.timer(STAGE_METRIC, stage='parse'):
+            data = request.get_json(silent=True)
+
+        if not data or not isinstance(data, dict):
+            return jsonify({
+                'status': 'error',
+                'message': "Aucune donnée reçue"
+            }), 400
+        logger.info(f"Requête d'impression reçue, type: {data.get('type', 'inconnu')}")
+
+        # Validation des données
+        with metrics.timer(STAGE_METRIC, stage='validate'):
+            validation_errors = validate_print_request(data)
+            callback_error = validate_callback_url(data)
+            if callback_error:
+                validation_errors.append(callback_error)
+        if validation_errors:
+            metrics.inc('thermal_errors_total', stage='validate')
+            return jsonify({
+                'status': 'error',
+                'message': "Données invalides",
+                'errors': validation_errors
+            }), 400
+
+        # Utiliser l'imprimante spécifiée ou l'imprimante par défaut
+        with metrics.timer(STAGE_METRIC, stage='resolve'):
+            printer_info, error = resolve_printer(data)
+        if error:
+            metrics.inc('thermal_errors_total', stage='resolve')
+            message, status_code = error
+            return jsonify({
+                'status': 'error',
+                'message': message
+            }), status_code
+        
+        printer_name = printer_info['name']
+        conn_type = printer_info.get('connection_type', 'usb')
+
+        render_labels = {'type': data.get('type', 'receipt'), 'printer': printer_name,
+                         'connection_type': conn_type}
+        try:
+            with metrics.timer(STAGE_METRIC, stage='render', **render_labels):
+                commands, printer_width, encoding = render_print_request(data, printer_info)
+        except Exception as e:
+            logger.error(f"Erreur de rendu pour {printer_name}: {e}")
+            metrics.inc('thermal_errors_total', stage='render', **render_labels)
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 500
+
+        # Mise en file : l'écriture sur le périphérique est faite par le thread
+        # dédié à cette imprimante, la requête retourne immédiatement
+        job = job_manager.submit(printer_info, commands, meta={
+            'printer_width': printer_width,
+            'encoding_used': encoding,
+        }, callback_url=data.get('callback_url'), group=data.get('printer_group'))
+
+        # "async": false -> attendre la fin de l'impression (ancien comportement)
+        if not is_async_request(data, default=True) and job.wait(config.get('job_wait_timeout', 30)):
+            if job.status == JOB_DONE:
+                return jsonify({
+                    'status': 'success',
+                    'message': f"Impression envoyée à {printer_name}",
+                    'job': job.to_dict(),
+                    'printer_width': printer_width,
+                    'encoding_used': encoding,
+                    'connection_type': conn_type,
+                    'universal_ascii': True,
+                    'conversion_applied': True,
+                }), 200
+            return jsonify({
+                'status': 'error',
+                'message': job.error or f"Échec de l'impression sur {printer_name}",
+                'job': job.to_dict(),
+            }), 500
+
+        return job_accepted_response(
+            job, f"Impression mise en file d'attente sur {printer_name}",
+            printer_width=printer_width,
+            encoding_used=encoding,
+            connection_type=conn_type,
+            universal_ascii=True,
+            conversion_applied=True,
+        )
+            
+    except Exception as e:
+        logger.error(f"Erreur lors de l'impression: {e}")
+        metrics.inc('thermal_errors_total', stage='internal')
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
 def create_app():
     """Crée et configure l'application Flask"""
     app = Flask(__name__, static_folder='static')
@@ -265,7 +602,8 @@ def create_app():
         "https://hotelia.cloud"
     ]
 
-    CORS(app, resources={r"/*": {"origins": origins}}, supports_credentials=True)
+    CORS(app, resources={r"/*": {"origins": origins}}, supports_credentials=True,
+         expose_headers=['Idempotent-Replayed'])
 
     # Vérification de la clé API sur toutes les routes sauf /health et /
     @app.before_request
@@ -279,8 +617,35 @@ def create_app():
         if request_key != api_key:
             return jsonify({'status': 'error', 'message': 'Clé API invalide ou manquante'}), 401
 
+    # Durée totale et statut des requêtes d'impression (/metrics)
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        if request.endpoint in METERED_ENDPOINTS and 'request_started' in g:
+            metrics.observe(STAGE_METRIC, time.perf_counter() - g.request_started,
+                            stage='request', endpoint=request.endpoint)
+            metrics.inc('thermal_requests_total', endpoint=request.endpoint,
+                        code=str(response.status_code))
+        return response
+
     # Créer les fichiers statiques
     create_static_content()
+
+    # Enumération des imprimantes en arrière-plan (plus d'énumération par requête)
+    printer_registry.start_background_refresh()
+
+    # Etat temps reel (DLE EOT) des imprimantes reseau / COM
+    printer_status.start_background_polling()
+
+    # Journal durable : rejoue les travaux non terminés avant le dernier arrêt
+    if config.get('spool_enabled', True):
+        try:
+            job_manager.start_spool()
+        except Exception as e:
+            logger.error(f"Journal d'impression indisponible, travaux non persistés: {e}")
     
     # Routes API
     @app.route('/')
@@ -302,13 +667,19 @@ def create_app():
             'ascii_support': True,
             'french_conversion': True,    # Conversion française activée
             'all_printers_ascii': config.get('force_ascii_for_all', True),
-            'smart_fallback': config.get('smart_fallback', True)
+            'smart_fallback': config.get('smart_fallback', True),
+            'logo_cache': get_logo_cache_stats(),
+            'printer_status': printer_status.summary(),
         })
 
     @app.route('/printers')
     def list_printers():
-        """Liste les imprimantes disponibles avec encodage ASCII universel"""
-        printers = get_printers()
+        """Liste les imprimantes disponibles avec encodage ASCII universel.
+        Parametre optionnel: ?refresh=1 pour forcer une nouvelle enumeration"""
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+        # Copies : les entrees du registre sont partagees
+        printers = [dict(p, status=printer_status.get(p))
+                    for p in printer_registry.get_all(refresh=refresh)]
         return jsonify({
             'status': 'success',
             'printers': printers,
@@ -329,17 +700,17 @@ def create_app():
     @app.route('/test-printer/<int:printer_id>')
     def test_printer_endpoint(printer_id):
         """Imprime un test ASCII avec conversion française sur l'imprimante spécifiée"""
-        printers = get_printers()
+        printer_info = printer_registry.get_by_id(printer_id)
         
-        if printer_id < 0 or printer_id >= len(printers):
+        if printer_info is None:
             return jsonify({
                 'status': 'error',
                 'message': f"Imprimante avec ID {printer_id} non trouvée"
             }), 404
         
-        printer_name = printers[printer_id]['name']
+        printer_name = printer_info['name']
         # ASCII universel maintenant
-        printer_width = printers[printer_id].get('width', detect_printer_width(printer_name))
+        printer_width = printer_info.get('width') or detect_printer_width(printer_name)
         printer_encoding = 'ascii'  # ASCII pour toutes les imprimantes
         
         success = print_test(printer_name)
@@ -362,117 +733,312 @@ def create_app():
 
     @app.route('/print', methods=['POST'])
     def print_endpoint():
-        """Imprime les données reçues avec encodage ASCII universel"""
+        """
+        Imprime les données reçues avec encodage ASCII universel.
+
+        En-tête optionnel Idempotency-Key : une requête répétée avec la même clé
+        (nouvelle tentative du client) retourne la réponse d'origine sans réimprimer.
+        """
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key:
+            return handle_print_request()
+
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        state, entry = idempotency_cache.begin(idempotency_key, fingerprint)
+        if state == IDEMPOTENCY_REPLAY:
+            body = dict(entry['body'])
+            job = job_manager.get(body.get('job_id') or '')
+            if job is not None:
+                body['job_status'] = job.status
+            response = jsonify(body)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response, entry['status_code']
+        if state == IDEMPOTENCY_IN_PROGRESS:
+            return jsonify({
+                'status': 'error',
+                'message': "Une requête avec cette clé d'idempotence est en cours de traitement"
+            }), 409
+        if state == IDEMPOTENCY_MISMATCH:
+            return jsonify({
+                'status': 'error',
+                'message': "Clé d'idempotence déjà utilisée pour une requête différente"
+            }), 422
+
+        response, status_code = None, 500
         try:
-            data = request.json
-            logger.info(f"Requête d'impression reçue, type: {data.get('type', 'inconnu')}")
-            
-            if not data:
+            response, status_code = handle_print_request()
+        finally:
+            # Seules les requêtes acceptées sont mémorisées : une erreur peut être retentée
+            if 200 <= status_code < 300:
+                idempotency_cache.complete(idempotency_key, status_code, response.get_json())
+            else:
+                idempotency_cache.abort(idempotency_key)
+        return response, status_code
+
+    @app.route('/print/batch', methods=['POST'])
+    def print_batch_endpoint():
+        """
+        Imprime plusieurs reçus en une seule requête HTTP.
+
+        Body JSON:
+          { "jobs": [ { ...payload /print... }, ... ] }   (ou directement la liste)
+
+        Chaque élément est validé et rendu (en parallèle), puis les éléments
+        d'une même imprimante sont envoyés en un seul document spouleur /
+        un seul flux socket. La réponse détaille le résultat de chaque élément.
+        """
+        try:
+            data = request.get_json(silent=True)
+            items = data.get('jobs') if isinstance(data, dict) else data
+            if not isinstance(items, list) or not items:
                 return jsonify({
                     'status': 'error',
-                    'message': "Aucune donnée reçue"
+                    'message': "Liste 'jobs' manquante ou vide"
                 }), 400
 
-            # Validation des données
-            validation_errors = validate_print_request(data)
-            if validation_errors:
+            callback_error = validate_callback_url(data) if isinstance(data, dict) else None
+            if callback_error:
                 return jsonify({
                     'status': 'error',
-                    'message': "Données invalides",
-                    'errors': validation_errors
+                    'message': callback_error
                 }), 400
+            callback_url = data.get('callback_url') if isinstance(data, dict) else None
 
-            # Utiliser l'imprimante spécifiée ou l'imprimante par défaut
-            printer_id = data.get('printer_id', config.get('default_printer_id'))
-            
-            if printer_id is None:
+            max_items = config.get('batch_max_items', 500)
+            if len(items) > max_items:
                 return jsonify({
                     'status': 'error',
-                    'message': "Aucune imprimante par défaut configurée et aucun ID d'imprimante spécifié"
+                    'message': f"Trop d'éléments dans le lot ({len(items)} > {max_items})"
                 }), 400
-            
-            printers = get_printers()
-            
-            if printer_id < 0 or printer_id >= len(printers):
-                return jsonify({
-                    'status': 'error',
-                    'message': f"Imprimante avec ID {printer_id} non trouvée"
-                }), 404
-            
-            printer_info = printers[printer_id]
-            printer_name = printer_info['name']
-            conn_type = printer_info.get('connection_type', 'usb')
 
-            # Récupérer ou détecter la largeur de l'imprimante
-            printer_width = data.get('printer_width')
-            if printer_width is None:
-                printer_width = printer_info.get('width',
-                                      config.get('default_printer_width', '58mm'))
+            logger.info(f"Lot d'impression reçu: {len(items)} éléments")
+            results = [None] * len(items)
+            accepted = []  # (index, payload, printer_info)
 
-            encoding = 'ascii'
-            logger.info(f"Impression sur {printer_name} ({conn_type}), largeur: {printer_width}")
+            # Validation + résolution de l'imprimante (registre en mémoire)
+            for i, item in enumerate(items):
+                if not isinstance(item, dict):
+                    results[i] = {'index': i, 'status': 'error',
+                                  'message': "L'élément doit être un objet JSON"}
+                    continue
+                validation_errors = validate_print_request(item)
+                if validation_errors:
+                    results[i] = {'index': i, 'status': 'error',
+                                  'message': "Données invalides", 'errors': validation_errors}
+                    continue
+                printer_info, error = resolve_printer(item)
+                if error:
+                    results[i] = {'index': i, 'status': 'error', 'message': error[0]}
+                    continue
+                accepted.append((i, item, printer_info))
 
-            # Type d'impression
-            print_type = data.get('type', 'receipt')
+            # Rendu parallèle des reçus
+            def render(entry):
+                index, item, printer_info = entry
+                render_labels = {'type': item.get('type', 'receipt'), 'printer': printer_info['name'],
+                                 'connection_type': printer_info.get('connection_type', 'usb')}
+                try:
+                    with metrics.timer(STAGE_METRIC, stage='render', **render_labels):
+                        return render_print_request(item, printer_info)[0], None
+                except Exception as e:
+                    logger.error(f"Erreur rendu élément {index} du lot: {e}")
+                    metrics.inc('thermal_errors_total', stage='render', **render_labels)
+                    return None, str(e)
 
-            if print_type == 'receipt':
-                receipt_data = data.get('data', {})
-                receipt_type = data.get('receipt_type', 'standard')
-                commands = format_receipt(
-                    receipt_data,
-                    receipt_type,
-                    printer_width,
-                    encoding,
-                    printer_name
-                )
-                success = print_smart(printer_info, commands)
+            workers = max(1, min(config.get('batch_render_workers', 4), len(accepted) or 1))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                rendered = list(executor.map(render, accepted))
 
-            elif print_type == 'raw':
-                from printer.printer_utils import safe_encode_french
-                encoded_text = safe_encode_french(data.get('text', ''), encoding, printer_name)
-                success = print_smart(printer_info, encoded_text)
+            # Regroupement par imprimante, dans l'ordre du lot
+            groups = OrderedDict()
+            for (index, item, printer_info), (commands, error) in zip(accepted, rendered):
+                if error:
+                    results[index] = {'index': index, 'status': 'error', 'message': error}
+                    continue
+                group = groups.setdefault(printer_key(printer_info),
+                                          {'printer_info': printer_info, 'indexes': [], 'parts': [],
+                                           'printer_groups': set()})
+                group['indexes'].append(index)
+                group['parts'].append(commands)
+                group['printer_groups'].add(item.get('printer_group'))
 
-            else:
-                return jsonify({
-                    'status': 'error',
-                    'message': f"Type d'impression '{print_type}' non pris en charge"
-                }), 400
+            # Un seul travail (document spouleur / flux socket) par imprimante
+            jobs = []
+            for group in groups.values():
+                printer_info = group['printer_info']
+                # Bascule possible seulement si tous les éléments visent le même groupe
+                printer_group = (next(iter(group['printer_groups']))
+                                 if len(group['printer_groups']) == 1 else None)
+                job = job_manager.submit(printer_info, b''.join(group['parts']),
+                                         meta={'batch_items': len(group['indexes'])},
+                                         callback_url=callback_url, group=printer_group)
+                jobs.append(job.to_dict())
+                for index in group['indexes']:
+                    results[index] = {
+                        'index': index,
+                        'status': 'queued',
+                        'job_id': job.id,
+                        'printer_name': printer_info['name'],
+                    }
+
+            queued = sum(1 for r in results if r['status'] == 'queued')
+            return jsonify({
+                'status': 'success' if queued == len(items) else ('partial' if queued else 'error'),
+                'message': f"{queued}/{len(items)} éléments mis en file d'attente",
+                'count': len(items),
+                'queued': queued,
+                'failed': len(items) - queued,
+                'jobs': jobs,
+                'results': results,
+            }), (202 if queued else 400)
 
-            if success:
-                return jsonify({
-                    'status': 'success',
-                    'message': f"Donnees imprimees sur {printer_name}",
-                    'printer_width': printer_width,
-                    'encoding_used': encoding,
-                    'connection_type': conn_type,
-                    'universal_ascii': True,
-                    'conversion_applied': True,
-                })
-            else:
-                return jsonify({
-                    'status': 'error',
-                    'message': f"Échec de l'impression sur {printer_name}"
-                }), 500
-                
         except Exception as e:
-            logger.error(f"Erreur lors de l'impression: {e}")
+            logger.error(f"Erreur lors de l'impression par lot: {e}")
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 500
+
+    @app.route('/jobs/<job_id>/wait')
+    def job_wait_endpoint(job_id):
+        """
+        Long-poll : attend la fin d'un travail (paramètre ?timeout=secondes).
+        Retourne 200 quand le travail est terminé, 202 si le délai expire avant.
+        """
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({
+                'status': 'error',
+                'message': f"Travail {job_id} inconnu"
+            }), 404
+
+        max_timeout = config.get('job_wait_max_timeout', 60)
+        try:
+            timeout = min(float(request.args.get('timeout', max_timeout)), max_timeout)
+        except ValueError:
+            return jsonify({
+                'status': 'error',
+                'message': "'timeout' doit être un nombre de secondes"
+            }), 400
+
+        finished = job.wait(max(0.0, timeout))
+        return jsonify({
+            'status': 'success',
+            'finished': finished,
+            'job': job.to_dict(),
+        }), (200 if finished else 202)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Compteurs et histogrammes de latence au format texte Prometheus"""
+        return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    @app.route('/templates', methods=['POST'])
+    def create_template_endpoint():
+        """Enregistre un modèle de reçu (sections avec variables {{nom}})"""
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({
+                'status': 'error',
+                'message': "Aucune donnée reçue"
+            }), 400
+
+        errors = validate_sections(data.get('sections'), templated=True)
+        if not errors and not data['sections']:
+            errors.append("'sections' ne doit pas être vide")
+        if errors:
+            return jsonify({
+                'status': 'error',
+                'message': "Modèle invalide",
+                'errors': errors
+            }), 400
+
+        try:
+            template = receipt_templates.create(
+                data['sections'],
+                template_id=data.get('template_id'),
+                name=data.get('name'),
+                currency=data.get('currency'),
+                currency_decimals=data.get('currency_decimals'),
+            )
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+        except OSError as e:
+            logger.error(f"Erreur lors de l'enregistrement du modèle: {e}")
             return jsonify({
                 'status': 'error',
                 'message': str(e)
             }), 500
 
+        return jsonify({
+            'status': 'success',
+            'message': f"Modèle {template.id} enregistré",
+            'template_id': template.id,
+            'template': template.to_dict(),
+        }), 201
+
+    @app.route('/templates')
+    def list_templates_endpoint():
+        """Liste des modèles de reçus enregistrés"""
+        return jsonify({
+            'status': 'success',
+            'templates': [template.to_dict() for template in receipt_templates.get_all()],
+        })
+
+    @app.route('/templates/<template_id>', methods=['GET', 'DELETE'])
+    def template_endpoint(template_id):
+        """Détail (GET) ou suppression (DELETE) d'un modèle de reçu"""
+        if request.method == 'DELETE':
+            if not receipt_templates.delete(template_id):
+                return jsonify({
+                    'status': 'error',
+                    'message': f"Modèle {template_id} inconnu"
+                }), 404
+            return jsonify({
+                'status': 'success',
+                'message': f"Modèle {template_id} supprimé",
+            })
+
+        template = receipt_templates.get(template_id)
+        if template is None:
+            return jsonify({
+                'status': 'error',
+                'message': f"Modèle {template_id} inconnu"
+            }), 404
+        return jsonify({
+            'status': 'success',
+            'template': template.to_dict(with_sections=True),
+        })
+
+    @app.route('/jobs/<job_id>')
+    def job_status_endpoint(job_id):
+        """Statut d'un travail d'impression soumis via /print"""
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({
+                'status': 'error',
+                'message': f"Travail {job_id} inconnu"
+            }), 404
+        return jsonify({
+            'status': 'success',
+            'job': job.to_dict(),
+        })
+
     @app.route('/encoding-test/<int:printer_id>')
     def encoding_test_endpoint(printer_id):
         """Teste tous les encodages sur une imprimante (endpoint de débogage) - MISE À JOUR ASCII"""
-        printers = get_printers()
+        printer_info = printer_registry.get_by_id(printer_id)
         
-        if printer_id < 0 or printer_id >= len(printers):
+        if printer_info is None:
             return jsonify({
                 'status': 'error',
                 'message': f"Imprimante avec ID {printer_id} non trouvée"
             }), 404
         
-        printer_name = printers[printer_id]['name']
+        printer_name = printer_info['name']
         
         try:
             from printer.printer_utils import test_all_encodings_on_printer
@@ -575,20 +1141,25 @@ def create_app():
             "port": "COM3",            // si connection=com
             "address": "AA:BB:CC:...", // si connection=socket
             "rfcomm_port": 1,          // optionnel, defaut 1
-            "baudrate": 9600,          // optionnel, defaut 9600
+            "baudrate": 115200,        // optionnel, defaut: debit memorise/recherche (9600 sinon)
             "type": "receipt" | "raw",
             "data": { ... },           // si type=receipt
             "text": "...",             // si type=raw
             "receipt_type": "standard",
-            "printer_width": "58mm"
+            "printer_width": "58mm",
+            "async": false,            // optionnel : true = mise en file, reponse 202 immediate
+            "callback_url": "https://..." // optionnel (mode async) : POST du resultat
           }
         """
         from printer.bluetooth_utils import print_via_com_port, print_via_bluetooth_socket
 
         try:
-            data = request.json
-            if not data:
+            data = request.get_json(silent=True)
+            if not data or not isinstance(data, dict):
                 return jsonify({'status': 'error', 'message': 'Aucune donnee recue'}), 400
+            callback_error = validate_callback_url(data)
+            if callback_error:
+                return jsonify({'status': 'error', 'message': callback_error}), 400
 
             connection = data.get('connection', 'com').lower()
             print_type = data.get('type', 'receipt')
@@ -612,20 +1183,36 @@ def create_app():
                 port = data.get('port')
                 if not port:
                     return jsonify({'status': 'error', 'message': "'port' requis pour connexion COM"}), 400
-                baudrate = data.get('baudrate', 9600)
-                success = print_via_com_port(port, raw_bytes, baudrate=baudrate)
+                baudrate = data.get('baudrate')
                 target = port
+                printer_info = {'name': port, 'connection_type': 'bluetooth_com', 'com_port': port}
+                if baudrate:
+                    printer_info['baudrate'] = baudrate
+
+                def send():
+                    return print_via_com_port(port, raw_bytes, baudrate=baudrate)
             elif connection == 'socket':
                 address = data.get('address')
                 if not address:
                     return jsonify({'status': 'error', 'message': "'address' requis pour connexion socket"}), 400
                 rfcomm_port = data.get('rfcomm_port', 1)
-                success = print_via_bluetooth_socket(address, raw_bytes, rfcomm_port=rfcomm_port)
                 target = address
+                printer_info = {'name': address, 'connection_type': 'bluetooth_socket',
+                                'address': address, 'rfcomm_port': rfcomm_port}
+
+                def send():
+                    return print_via_bluetooth_socket(address, raw_bytes, rfcomm_port=rfcomm_port)
             else:
                 return jsonify({'status': 'error',
                                 'message': f"Connexion '{connection}' inconnue. Utilisez 'com' ou 'socket'"}), 400
 
+            if is_async_request(data, default=False):
+                # Routage par print_smart : le travail est rejouable depuis le journal
+                job = job_manager.submit(printer_info, raw_bytes, callback_url=data.get('callback_url'))
+                return job_accepted_response(job, f"Impression Bluetooth mise en file vers {target}",
+                                             connection=connection, target=target)
+
+            success = send()
             if success:
                 return jsonify({
                     'status': 'success',
@@ -652,6 +1239,30 @@ def create_app():
             return jsonify({'status': 'success', 'message': f"Test BT COM OK sur {port}", 'port': port})
         return jsonify({'status': 'error', 'message': f"Echec test BT sur {port}"}), 500
 
+    @app.route('/bluetooth/probe-com/<path:port>', methods=['POST'])
+    def bluetooth_probe_com(port):
+        """
+        Recherche le debit le plus rapide du port COM (DLE EOT) et le memorise
+        pour les impressions suivantes (ex: POST /bluetooth/probe-com/COM3).
+        Body JSON optionnel: {"candidates": [115200, 9600]}
+        """
+        from printer.serial_pool import serial_pool
+        candidates = (request.get_json(silent=True) or {}).get('candidates')
+        if candidates is not None and (not isinstance(candidates, list) or not candidates
+                                       or not all(isinstance(b, int) and b > 0 for b in candidates)):
+            return jsonify({'status': 'error',
+                            'message': "'candidates' doit etre une liste de debits (entiers)"}), 400
+        try:
+            import serial  # pyserial requis
+        except ImportError:
+            return jsonify({'status': 'error', 'message': 'pyserial manquant: pip install pyserial'}), 500
+        baudrate = serial_pool.probe_baudrate(port, candidates)
+        if baudrate:
+            return jsonify({'status': 'success', 'message': f"Port {port}: {baudrate} bauds",
+                            'port': port, 'baudrate': baudrate})
+        return jsonify({'status': 'error', 'port': port,
+                        'message': f"Aucune reponse de l'imprimante sur {port}"}), 500
+
     @app.route('/bluetooth/test-socket/<path:address>')
     def bluetooth_test_socket(address):
         """
@@ -720,14 +1331,19 @@ def create_app():
             "data": { ... },        // si type=receipt
             "text": "...",          // si type=raw
             "receipt_type": "standard",
-            "printer_width": "58mm"
+            "printer_width": "58mm",
+            "async": false,         // optionnel : true = mise en file, reponse 202 immediate
+            "callback_url": "https://..." // optionnel (mode async) : POST du resultat
           }
         """
         from printer.printer_utils import print_via_network, safe_encode_french
         try:
-            data = request.json
-            if not data:
+            data = request.get_json(silent=True)
+            if not data or not isinstance(data, dict):
                 return jsonify({'status': 'error', 'message': 'Aucune donnee recue'}), 400
+            callback_error = validate_callback_url(data)
+            if callback_error:
+                return jsonify({'status': 'error', 'message': callback_error}), 400
 
             ip = data.get('ip')
             if not ip:
@@ -747,6 +1363,14 @@ def create_app():
             else:
                 return jsonify({'status': 'error', 'message': f"Type '{print_type}' non supporte"}), 400
 
+            if is_async_request(data, default=False):
+                # Même file que les imprimantes réseau déclarées (clé tcp:ip:port)
+                printer_info = {'name': f"network_{ip}", 'connection_type': 'network',
+                                'ip': ip, 'tcp_port': tcp_port}
+                job = job_manager.submit(printer_info, raw_bytes, callback_url=data.get('callback_url'))
+                return job_accepted_response(job, f"Impression TCP mise en file vers {ip}:{tcp_port}",
+                                             ip=ip, tcp_port=tcp_port)
+
             success = print_via_network(ip, raw_bytes, tcp_port=tcp_port)
             if success:
                 return jsonify({
@@ -769,15 +1393,15 @@ def create_app():
     @app.route('/test-immediate-cut/<int:printer_id>')
     def test_immediate_cut_endpoint(printer_id):
         """Teste spécifiquement le problème de coupe décalée"""
-        printers = get_printers()
+        printer_info = printer_registry.get_by_id(printer_id)
         
-        if printer_id < 0 or printer_id >= len(printers):
+        if printer_info is None:
             return jsonify({
                 'status': 'error',
                 'message': f"Imprimante avec ID {printer_id} non trouvée"
             }), 404
         
-        printer_name = printers[printer_id]['name']
+        printer_name = printer_info['name']
         
         try:
             from printer.printer_utils import test_immediate_cut
@@ -809,6 +1433,44 @@ def create_app():
     
     return app
 
+def serve_app(app, host=None, port=None):
+    """
+    Sert l'application avec le serveur choisi par 'server_mode' :
+      - 'waitress' : serveur WSGI de production, pool de threads borné (défaut)
+      - 'flask'    : serveur de développement Werkzeug (un thread par connexion)
+    Bloquant : à lancer dans un thread pour un service ou avec l'interface graphique.
+    """
+    host = host or config.get('host', HOST)
+    port = port or config.get('port', PORT)
+    mode = config.get('server_mode', 'waitress')
+
+    if mode == 'waitress':
+        try:
+            from waitress import serve
+        except ImportError:
+            logger.warning("waitress non installé (pip install waitress), "
+                           "utilisation du serveur de développement Flask")
+        else:
+            threads = config.get('server_threads', 8)
+            logger.info(f"Serveur waitress sur {host}:{port} ({threads} threads)")
+            serve(
+                app,
+                host=host,
+                port=port,
+                threads=threads,                                        # pool de workers borné
+                backlog=config.get('server_backlog', 1024),             # file d'attente TCP (listen)
+                connection_limit=config.get('server_connection_limit', 100),
+                channel_timeout=config.get('server_keepalive_timeout', 120),  # keep-alive inactif
+                ident='ThermalPrinterAPI',
+            )
+            return
+    elif mode != 'flask':
+        logger.warning(f"server_mode '{mode}' inconnu, utilisation du serveur Flask")
+
+    logger.info(f"Serveur de développement Flask sur {host}:{port}")
+    # use_reloader=False obligatoire dans un service / thread
+    app.run(host=host, port=port, use_reloader=False, threaded=True)
+
 def run_api_server(app=None):
     """Démarre le serveur Flask"""
     if app is None:
@@ -823,6 +1485,8 @@ def run_api_server(app=None):
     print(f"   • GET  /test-printer/<id> : Test d'impression ASCII avec conversion française") 
     print(f"   • GET  /test-immediate-cut/<id> : 🆕 Test coupe immédiate (problème coupe décalée)")
     print(f"   • POST /print : Impression ASCII avec conversion française automatique")
+    print(f"   • POST /print/batch : Impression d'un lot de reçus (un document par imprimante)")
+    print(f"   • GET  /jobs/<id> : Statut d'un travail d'impression en file d'attente")
     print(f"   • GET  /encoding-test/<id> : Test de tous les encodages (ASCII recommandé)")
     print(f"   • GET  /encoding-info : Informations sur la configuration ASCII")
     print(f"   • GET  /network/test/<ip> : 🆕 Test impression WiFi/Ethernet direct (TCP port 9100)")
@@ -832,4 +1496,4 @@ def run_api_server(app=None):
     print(f"🔧 Conversion française automatique: café → cafe, hôtel → hotel, €15,50 → EUR15,50")
     print(f"✅ Compatibilité maximale avec tous les modèles d'imprimantes")
     
-    app.run(host=HOST, port=config.get('port', PORT))
\ No newline at end of file
+    serve_app(app, HOST, config.get('port', PORT))
\ No newline at end of file
@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks hors ligne de l'API d'impression (aucune imprimante requise).
+
+Usage:
+  python benchmark.py                -> toutes les suites
+  python benchmark.py encoding       -> cout d'encodage par ligne (safe_encode_french)
+  python benchmark.py receipt        -> debit de format_receipt sur des recus types
+  python benchmark.py raster         -> tramage d'une photo 576 px par methode
+"""
+
+import os
+import sys
+import io
+import time
+import base64
+import logging
+import argparse
+import tracemalloc
+
+# Ajouter le répertoire du script au path pour les imports entre modules
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from utils.config import logger
+from printer.printer_utils import safe_encode_french, clear_logo_cache
+from printer.receipt import format_receipt
+from printer.templates import ReceiptTemplate
+
+
+def _best_of(func, repeat=5, number=1):
+    """Meilleur temps (secondes) d'un appel de func sur `repeat` series de `number` appels."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+# ---------------------------------------------------------------------------
+# Suite 'encoding' : encodage ligne par ligne d'un reçu réaliste
+# ---------------------------------------------------------------------------
+
+ENCODING_CORPUS = {
+    # Lignes d'articles et de totaux : l'immense majorité d'un reçu
+    'ascii': [
+        "Petit-dejeuner             2   5 000",
+        "Coca-Cola 33cl             1   1 500",
+        "TOTAL:            11 500 FCFA",
+        "--------------------------------",
+        "Chambre 101 - Suite Deluxe",
+        "Mode: Especes",
+    ],
+    # Libellés français accentués (encodables en CP858)
+    'french': [
+        "Crème brûlée maison        1   3 500",
+        "Réservation confirmée",
+        "Hébergement:        45 000 FCFA",
+        "À bientôt chez nous !",
+    ],
+    # Montants formatés par toLocaleString('fr-FR') et symboles monétaires
+    'currency': [
+        "Total : 15 000,50 €",
+        "Remise : -1 500 FCFA",
+        "Prix unitaire 8,50€",
+    ],
+    # Caractères hors CP858 : repli sur la conversion ASCII intelligente
+    'fallback': [
+        "“Merci” — l’équipe",
+        "Cœur de bœuf → 12 000",
+    ],
+}
+
+
+def bench_encoding(iterations=2000):
+    """Mesure le coût moyen de safe_encode_french par ligne, par catégorie."""
+    results = {}
+    for category, lines in ENCODING_CORPUS.items():
+        def run(lines=lines):
+            for line in lines:
+                safe_encode_french(line, 'ascii')
+        seconds = _best_of(run, number=iterations)
+        results[category] = seconds / len(lines) * 1e9
+
+    # Reçu réaliste : 80 % de lignes ASCII, 15 % accentuées, 5 % de montants
+    receipt = (ENCODING_CORPUS['ascii'] * 14 + ENCODING_CORPUS['french'] * 4
+               + ENCODING_CORPUS['currency'] * 2)
+    seconds = _best_of(lambda: [safe_encode_french(l, 'ascii') for l in receipt],
+                       number=max(1, iterations // 10))
+    results['receipt_mix'] = seconds / len(receipt) * 1e9
+
+    print("Encodage par ligne (safe_encode_french)")
+    for category, ns in results.items():
+        print(f"  {category:<12} {ns:>9.0f} ns/ligne")
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Suite 'receipt' : rendu complet de reçus types par format_receipt
+# ---------------------------------------------------------------------------
+
+_HEADER = {
+    'business_name': "Hôtel Le Palmier",
+    'address': "12 avenue de la Marina, Dakar",
+    'phone': "+221 33 000 00 00",
+    'receipt_number': "HTL-2024-00042",
+    'date': "15/03/2024 12:30",
+}
+
+_FOOTER = {
+    'payment_method': "Espèces",
+    'payment_status': "Payé",
+    'thank_you_message': "Merci de votre visite, à bientôt !",
+    'website': "www.hotel-palmier.sn",
+}
+
+
+def _cafe_ticket():
+    """Petit ticket de café : 5 articles, 58mm."""
+    items = [
+        {'name': "Café crème", 'quantity': 2, 'price': 1500},
+        {'name': "Croissant au beurre", 'quantity': 2, 'price': 800},
+        {'name': "Jus d'orange pressé", 'quantity': 1, 'price': 2000},
+        {'name': "Pain au chocolat", 'quantity': 1, 'price': 900},
+        {'name': "Eau minérale 50cl", 'quantity': 1, 'price': 500},
+    ]
+    return {'header': dict(_HEADER, receipt_number="ORD-1187"), 'items': items,
+            'footer': _FOOTER}, 'standard', '58mm'
+
+
+def _hotel_folio():
+    """Note d'hôtel de 200 lignes (nuitées, restaurant, extras), 80mm."""
+    items = []
+    for i in range(200):
+        if i % 10 == 0:
+            items.append({'name': f"Chambre {100 + i // 10} - Suite Deluxe vue mer", 'type': 'accommodation',
+                          'quantity': 3, 'quantity_unit': 'nuit(s)', 'price': 45000})
+        elif i % 3 == 0:
+            items.append({'name': f"Dîner gastronomique n°{i}", 'type': 'food', 'category': 'Restaurant',
+                          'quantity': 2, 'price': 12500})
+        else:
+            items.append({'name': f"Minibar - boisson {i}", 'type': 'drink',
+                          'quantity': 1 + i % 4, 'price': 1500 + (i % 7) * 250})
+    return {'header': _HEADER, 'items': items, 'footer': _FOOTER,
+            'room_info': "Client: M. Diallo\nArrivée: 12/03/2024\nDépart: 15/03/2024"}, 'hotel', '80mm'
+
+
+def _wide_table():
+    """Reçu dynamique 80mm : table à 4 colonnes de 120 lignes + totaux."""
+    rows = [[f"Article référence {i:03d}", 1 + i % 5, 1250.5 + i, (1 + i % 5) * (1250.5 + i)]
+            for i in range(120)]
+    sections = [
+        {'type': 'header', 'text': "Restaurant Le Baobab"},
+        {'type': 'text', 'text': "Table 12 - Service du soir", 'align': 'center'},
+        {'type': 'separator'},
+        {'type': 'table', 'columns': [
+            {'label': "Article", 'width': 22, 'align': 'left', 'format': 'text'},
+            {'label': "Qté", 'width': 4, 'align': 'right', 'format': 'integer'},
+            {'label': "Prix", 'width': 9, 'align': 'right', 'format': 'price'},
+            {'label': "Total", 'width': 10, 'align': 'right', 'format': 'price'},
+        ], 'rows': rows},
+        {'type': 'separator', 'char': '='},
+        {'type': 'keyvalue', 'rows': [{'key': "Sous-total", 'value': "452 380"},
+                                      {'key': "TVA 18 %", 'value': "81 428"},
+                                      {'key': "TOTAL", 'value': "533 808 FCFA"}], 'bold': True},
+        {'type': 'feed', 'lines': 2},
+    ]
+    return {'sections': sections}, 'standard', '80mm'
+
+
+def _logo_png(width, height, seed):
+    """Logo PNG synthétique (dégradé + motif) encodé en base64, sans aléa."""
+    from PIL import Image
+    img = Image.new('L', (width, height))
+    img.putdata([((x * 7 + y * 3 + seed * 31) ^ (x * y)) & 0xFF
+                 for y in range(height) for x in range(width)])
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return base64.b64encode(buf.getvalue()).decode('ascii')
+
+
+def _logo_receipt():
+    """Reçu dynamique 80mm avec trois logos (en-tête, partenaire, QR-like)."""
+    sections = [
+        {'type': 'logo', 'image': _logo_png(384, 160, 1)},
+        {'type': 'header', 'text': "Boutique Teranga"},
+        {'type': 'text', 'text': "Merci pour votre achat !", 'align': 'center'},
+        {'type': 'logo', 'image': _logo_png(256, 96, 2), 'width': 256},
+        {'type': 'table', 'columns': ["Article", "Qté", "Total"],
+         'rows': [["Tissu wax 6 yards", 2, 24000], ["Panier tressé", 1, 8500]]},
+        {'type': 'logo', 'image': _logo_png(200, 200, 3), 'width': 200},
+    ]
+    return {'sections': sections}, 'standard', '80mm'
+
+
+RECEIPT_PAYLOADS = {
+    'cafe_ticket': _cafe_ticket,
+    'hotel_folio': _hotel_folio,
+    'wide_table_80mm': _wide_table,
+    'logo_heavy': _logo_receipt,
+}
+
+
+def _peak_alloc_kib(func):
+    """Pic de mémoire allouée (KiB) pendant un appel de func (tracemalloc)."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_receipt(iterations=50):
+    """Mesure reçus/seconde, octets produits et pic d'allocation de format_receipt."""
+    cases = {}
+    for name, build in RECEIPT_PAYLOADS.items():
+        try:
+            cases[name] = build()
+        except ImportError as e:
+            print(f"  {name:<18} ignoré ({e})")
+    if 'logo_heavy' in cases:
+        # Même reçu sans le cache LRU des logos : coût de la conversion d'image
+        cases['logo_heavy_cold'] = cases['logo_heavy']
+        # Même reçu en modèle compilé : seule la table (variable) est rendue
+        sections = [dict(s, rows='{{rows}}') if s['type'] == 'table' else s
+                    for s in cases['logo_heavy'][0]['sections']]
+        rows = next(s['rows'] for s in cases['logo_heavy'][0]['sections'] if s['type'] == 'table')
+        template = ReceiptTemplate('bench', sections)
+        cases['logo_heavy_template'] = ({'template': template, 'variables': {'rows': rows}},
+                                        'standard', '80mm')
+
+    results = {}
+    for name, (receipt_data, receipt_type, printer_width) in cases.items():
+        def run(receipt_data=receipt_data, receipt_type=receipt_type, printer_width=printer_width,
+                cold=name.endswith('_cold')):
+            if cold:
+                clear_logo_cache()
+            if 'template' in receipt_data:
+                return receipt_data['template'].render(receipt_data['variables'], printer_width,
+                                                       'ascii', 'POS-80')
+            return format_receipt(receipt_data, receipt_type, printer_width, 'ascii', 'POS-80')
+
+        output = run()  # préchauffage (et remplissage du cache des logos)
+        seconds = _best_of(run, number=max(1, iterations // 10 if name.startswith('logo') else iterations))
+        results[name] = {
+            'receipts_per_s': 1 / seconds,
+            'ms_per_receipt': seconds * 1000,
+            'bytes': len(output),
+            'peak_alloc_kib': _peak_alloc_kib(run),
+        }
+
+    print("Rendu de reçus (format_receipt)")
+    print(f"  {'cas':<19} {'reçus/s':>10} {'ms/reçu':>9} {'octets':>8} {'pic KiB':>9}")
+    for name, r in results.items():
+        print(f"  {name:<19} {r['receipts_per_s']:>10.0f} {r['ms_per_receipt']:>9.3f} "
+              f"{r['bytes']:>8} {r['peak_alloc_kib']:>9.1f}")
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Suite 'raster' : tramage + empaquetage d'une photo pleine largeur 80mm
+# ---------------------------------------------------------------------------
+
+def _photo(width, height):
+    """Photo synthétique en niveaux de gris : dégradés croisés et disque, sans aléa."""
+    from PIL import Image, ImageDraw
+    img = Image.linear_gradient('L').resize((width, height))
+    img = Image.blend(img, img.transpose(Image.ROTATE_90).resize((width, height)), 0.5)
+    ImageDraw.Draw(img).ellipse((width // 4, height // 4, 3 * width // 4, 3 * height // 4), fill=90)
+    return img
+
+
+def bench_raster(width=576, height=400):
+    """Mesure le temps de tramage (rasterize) d'une photo 576 px par méthode."""
+    try:
+        img = _photo(width, height)
+    except ImportError as e:
+        print(f"Tramage ignoré ({e})")
+        return {}
+    from printer.raster import rasterize, DITHER_METHODS, np
+
+    results = {}
+    for method in DITHER_METHODS:
+        seconds = _best_of(lambda method=method: rasterize(img, method), number=5)
+        data, bytes_per_row, rows = rasterize(img, method)
+        results[method] = {
+            'ms': seconds * 1000,
+            'bytes': len(data),
+            'ink_ratio': sum(bin(b).count('1') for b in data) / (len(data) * 8),
+        }
+
+    print(f"Tramage d'une photo {width}x{height} (rasterize, NumPy {'oui' if np is not None else 'non'})")
+    print(f"  {'methode':<18} {'ms':>9} {'octets':>8} {'encre':>7}")
+    for method, r in results.items():
+        print(f"  {method:<18} {r['ms']:>9.2f} {r['bytes']:>8} {r['ink_ratio']:>7.1%}")
+    return results
+
+
+SUITES = {
+    'encoding': bench_encoding,
+    'receipt': bench_receipt,
+    'raster': bench_raster,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks hors ligne de l'API d'impression")
+    parser.add_argument('suites', nargs='*',
+                        help=f"Suites a executer parmi {', '.join(SUITES)} (defaut: toutes)")
+    args = parser.parse_args()
+    unknown = [name for name in args.suites if name not in SUITES]
+    if unknown:
+        parser.error(f"suite(s) inconnue(s): {', '.join(unknown)}")
+
+    # Les logs INFO par reçu fausseraient les mesures
+    logger.setLevel(logging.WARNING)
+
+    for name in args.suites or list(SUITES):
+        SUITES[name]()
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -123,9 +123,11 @@ def build_service_exe():
         "--hidden-import=flask_cors",
         "--hidden-import=PIL",
         "--hidden-import=PIL.Image",
+        "--hidden-import=numpy",
         "--hidden-import=serial",
         "--hidden-import=serial.tools.list_ports",
         "--hidden-import=werkzeug",
+        "--hidden-import=waitress",
         "--hidden-import=click",
     ]
 
@@ -179,11 +181,13 @@ def build_config_gui_exe():
         "--hidden-import=PIL",
         "--hidden-import=PIL.Image",
         "--hidden-import=PIL.ImageTk",
+        "--hidden-import=numpy",
         "--hidden-import=serial",
         "--hidden-import=serial.tools.list_ports",
         "--hidden-import=flask",
         "--hidden-import=flask_cors",
         "--hidden-import=werkzeug",
+        "--hidden-import=waitress",
     ]
 
     if icon_path.exists():
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Imprimante ESC/POS simulée pour tester la couche transport sans matériel.
+
+Écoute en TCP (port 9100 par défaut, comme une imprimante réseau) et, en
+option, sur un pseudo-terminal qui remplace un port COM (chemin à utiliser
+comme 'com_port' / 'port' dans /bluetooth/print ou dans la configuration).
+
+Simule :
+  - une vitesse d'impression (octets/seconde) et un tampon de réception borné :
+    l'émetteur est freiné par le contrôle de flux TCP comme avec une vraie tête
+  - des blocages occasionnels (papier coincé, surchauffe de la tête)
+  - les réponses d'état temps réel DLE EOT n (pool réseau, surveillance de
+    l'état) ; fin de papier et capot ouvert simulables (--paper-out)
+
+Usage:
+  python mock_printer.py                                 -> TCP 0.0.0.0:9100
+  python mock_printer.py --port 9101 --speed 20000       -> ~20 Ko/s (tête 80 mm lente)
+  python mock_printer.py --pty --stall-rate 0.01         -> + port série virtuel, 1 % de blocages
+  python mock_printer.py --output /tmp/tickets           -> enregistre les octets reçus
+  python mock_printer.py --paper-out                     -> signale une fin de papier
+
+Note : la socket Bluetooth RFCOMM (print_via_bluetooth_socket) ne peut pas être
+simulée ainsi ; utiliser le mode --pty, qui correspond au chemin COM (SPP).
+"""
+
+import os
+import sys
+import time
+import random
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+
+# Ajouter le répertoire du script au path pour les imports entre modules
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from utils.config import logger
+
+
+DLE_EOT = b'\x10\x04'
+GS_CUT = b'\x1d\x56'
+
+# Réponse à DLE EOT n : bits fixes 1 et 4 à 1, aucun défaut (en ligne, papier présent)
+STATUS_OK = b'\x12'
+
+
+class MockPrinter:
+    """Consommateur de flux ESC/POS avec débit, tampon et blocages simulés."""
+
+    def __init__(self, speed=0, buffer_size=4096, stall_rate=0.0, stall_duration=2.0,
+                 output_dir=None, seed=None):
+        """
+        Args:
+            speed (int): débit d'impression en octets/seconde (0 = illimité)
+            buffer_size (int): taille du tampon de réception (octets lus à la fois)
+            stall_rate (float): probabilité de blocage par bloc reçu (0..1)
+            stall_duration (float): durée d'un blocage (secondes)
+            output_dir (str): dossier où enregistrer les octets reçus (un fichier par session)
+            seed (int): graine du générateur de blocages (reproductibilité)
+        """
+        self.speed = speed
+        self.buffer_size = buffer_size
+        self.stall_rate = stall_rate
+        self.stall_duration = stall_duration
+        self.output_dir = output_dir
+        # Défauts simulés (modifiables pendant l'exécution)
+        self.paper_out = False
+        self.cover_open = False
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._session_seq = 0
+        self.stats = {
+            'sessions': 0,
+            'active_sessions': 0,
+            'bytes': 0,
+            'cuts': 0,
+            'status_requests': 0,
+            'stalls': 0,
+            'busy_seconds': 0.0,
+        }
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def _open_record(self, label):
+        if not self.output_dir:
+            return None
+        with self._lock:
+            self._session_seq += 1
+            seq = self._session_seq
+        safe_label = ''.join(c if c.isalnum() else '_' for c in label)
+        path = os.path.join(self.output_dir, f"{seq:06d}_{safe_label}.bin")
+        return open(path, 'wb')
+
+    def serve_stream(self, read, write, label):
+        """
+        Consomme un flux jusqu'à sa fermeture.
+
+        Args:
+            read (callable): read(n) -> bytes (b'' en fin de flux)
+            write (callable): write(bytes) pour les réponses d'état
+            label (str): nom de la session pour les logs
+        """
+        self._count(sessions=1, active_sessions=1)
+        record = self._open_record(label)
+        tail = b''
+        received = 0
+        started = time.perf_counter()
+        logger.info(f"[mock] Session {label} ouverte")
+        try:
+            while True:
+                chunk = read(self.buffer_size)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if record:
+                    record.write(chunk)
+
+                # Commandes à cheval sur deux blocs : on garde les 2 derniers octets
+                window = tail + chunk
+                status_requests = self._find_commands(window, DLE_EOT, len(tail))
+                cuts = len(self._find_commands(window, GS_CUT, len(tail)))
+                tail = window[-2:]
+                for n in status_requests:
+                    write(self.status_reply(n))
+                self._count(bytes=len(chunk), cuts=cuts, status_requests=len(status_requests))
+
+                self._simulate_printing(len(chunk))
+        except OSError as e:
+            logger.info(f"[mock] Session {label} interrompue: {e}")
+        finally:
+            if record:
+                record.close()
+            elapsed = time.perf_counter() - started
+            self._count(active_sessions=-1)
+            logger.info(f"[mock] Session {label} fermée: {received} octets en {elapsed:.2f} s")
+
+    def status_reply(self, n):
+        """Octet de réponse à DLE EOT n selon les défauts simulés."""
+        status = STATUS_OK[0]
+        if n == 1 and (self.paper_out or self.cover_open):
+            status |= 0x08  # hors ligne
+        elif n == 2:
+            status |= (0x04 if self.cover_open else 0) | (0x20 if self.paper_out else 0)
+        elif n == 4 and self.paper_out:
+            status |= 0x6C  # fin proche + fin de rouleau
+        return bytes([status])
+
+    @staticmethod
+    def _find_commands(window, prefix, new_from):
+        """Paramètres des commandes `prefix` + paramètre dont le paramètre est dans la partie nouvelle."""
+        params = []
+        start = 0
+        while True:
+            i = window.find(prefix, start)
+            if i < 0 or i + len(prefix) >= len(window):
+                return params
+            if i + len(prefix) >= new_from:
+                params.append(window[i + len(prefix)])
+            start = i + 1
+
+    def _simulate_printing(self, nbytes):
+        busy = nbytes / self.speed if self.speed > 0 else 0.0
+        if self.stall_rate > 0 and self._random.random() < self.stall_rate:
+            logger.info(f"[mock] Blocage simulé ({self.stall_duration:.1f} s)")
+            busy += self.stall_duration
+            self._count(stalls=1)
+        if busy:
+            time.sleep(busy)
+            self._count(busy_seconds=busy)
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+        return (f"{stats['sessions']} sessions ({stats['active_sessions']} actives), "
+                f"{stats['bytes']} octets, {stats['cuts']} coupes, "
+                f"{stats['status_requests']} DLE EOT, {stats['stalls']} blocages")
+
+
+class _TCPHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        sock = self.request
+        # Tampon de réception borné : l'émetteur bloque quand la "tête" est en retard
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.server.printer.buffer_size)
+        label = f"tcp-{self.client_address[0]}-{self.client_address[1]}"
+        self.server.printer.serve_stream(sock.recv, sock.sendall, label)
+
+
+class MockTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, printer):
+        self.printer = printer
+        super().__init__(address, _TCPHandler)
+
+
+def start_pty(printer):
+    """
+    Ouvre un pseudo-terminal (Linux/macOS) et consomme ce qui y est écrit.
+    Retourne le chemin du port série virtuel à passer à pyserial.
+    """
+    import pty
+    import tty
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)  # pas de traitement des fins de ligne : octets ESC/POS bruts
+    path = os.ttyname(slave)
+
+    def read(n):
+        try:
+            return os.read(master, n)
+        except OSError:
+            return b''
+
+    def serve():
+        # Le maître reste ouvert : chaque ouverture du port par pyserial
+        # est vue comme un flux continu
+        while True:
+            printer.serve_stream(read, lambda data: os.write(master, data), 'pty')
+            time.sleep(0.1)
+
+    threading.Thread(target=serve, name='mock-pty', daemon=True).start()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Imprimante ESC/POS simulée (TCP 9100 / pseudo-terminal)")
+    parser.add_argument('--host', default='0.0.0.0', help="Adresse d'écoute (defaut: 0.0.0.0)")
+    parser.add_argument('--port', type=int, default=9100, help="Port TCP (defaut: 9100)")
+    parser.add_argument('--speed', type=int, default=0,
+                        help="Debit d'impression en octets/s (defaut: 0 = illimite)")
+    parser.add_argument('--buffer-size', type=int, default=4096,
+                        help="Taille du tampon de reception en octets (defaut: 4096)")
+    parser.add_argument('--stall-rate', type=float, default=0.0,
+                        help="Probabilite de blocage par bloc recu, 0..1 (defaut: 0)")
+    parser.add_argument('--stall-duration', type=float, default=2.0,
+                        help="Duree d'un blocage en secondes (defaut: 2)")
+    parser.add_argument('--seed', type=int, default=None, help="Graine des blocages aleatoires")
+    parser.add_argument('--output', default=None, help="Dossier d'enregistrement des octets recus")
+    parser.add_argument('--pty', action='store_true', help="Ouvre aussi un port serie virtuel (chemin COM)")
+    parser.add_argument('--paper-out', action='store_true', help="Signale une fin de papier (DLE EOT)")
+    parser.add_argument('--quiet', action='store_true', help="N'affiche que le resume periodique")
+    args = parser.parse_args()
+
+    if args.quiet:
+        logger.setLevel(logging.WARNING)
+
+    printer = MockPrinter(speed=args.speed, buffer_size=args.buffer_size,
+                          stall_rate=args.stall_rate, stall_duration=args.stall_duration,
+                          output_dir=args.output, seed=args.seed)
+    printer.paper_out = args.paper_out
+
+    server = MockTCPServer((args.host, args.port), printer)
+    threading.Thread(target=server.serve_forever, name='mock-tcp', daemon=True).start()
+    print(f"Imprimante simulee en ecoute sur {args.host}:{args.port}")
+
+    if args.pty:
+        print(f"Port serie virtuel : {start_pty(printer)}")
+
+    try:
+        while True:
+            time.sleep(10)
+            print(f"[mock] {printer.summary()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        print(f"[mock] Total : {printer.summary()}")
+
+
+if __name__ == '__main__':
+    main()
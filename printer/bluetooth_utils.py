@@ -108,24 +108,24 @@ def discover_bluetooth_devices(duration=8):
 # Impression via port COM (methode principale)
 # ---------------------------------------------------------------------------
 
-def print_via_com_port(port, data, baudrate=9600, timeout=5):
+def print_via_com_port(port, data, baudrate=None, timeout=5):
     """
     Envoie des donnees ESC/POS vers une imprimante via un port COM.
 
     Args:
         port (str): Ex: 'COM3', 'COM4'
         data (bytes): Donnees ESC/POS
-        baudrate (int): 9600 par defaut (standard imprimantes thermiques BT)
+        baudrate (int): debit du port (defaut: debit memorise ou recherche, sinon 9600)
         timeout (int): Timeout en secondes
 
     Returns:
         bool: True si succes
     """
     try:
-        import serial
-        with serial.Serial(port, baudrate=baudrate, timeout=timeout) as ser:
-            ser.write(data)
-            ser.flush()
+        import serial  # pyserial requis (ImportError traitee ci-dessous)
+        # Port conserve ouvert (pas de reconnexion RFCOMM a chaque ticket), ecriture par blocs
+        from printer.serial_pool import serial_pool
+        serial_pool.send(port, bytes(data), baudrate=baudrate, timeout=timeout)
         logger.info(f"Impression OK via port COM {port}")
         return True
     except ImportError:
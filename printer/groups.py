@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Groupes d'imprimantes identiques (config 'printer_groups').
+
+Un travail adresse a un groupe ("printer_group" dans /print) est confie au
+membre le moins charge (ou au suivant, en tourniquet). Si l'impression echoue,
+le travail est reporte sur un autre membre et l'imprimante defaillante est
+ecartee pendant 'printer_group_cooldown' secondes.
+
+  "printer_groups": {
+      "cuisine": {"printers": [2, 3, "Cuisine 3"], "strategy": "least_loaded"}
+  }
+
+Les membres sont des ids ou des noms d'imprimantes du registre.
+"""
+
+import threading
+import time
+from utils.config import logger, config
+
+
+STRATEGY_LEAST_LOADED = 'least_loaded'
+STRATEGY_ROUND_ROBIN = 'round_robin'
+STRATEGIES = (STRATEGY_LEAST_LOADED, STRATEGY_ROUND_ROBIN)
+
+
+class PrinterGroups:
+    """Selection d'un membre de groupe et mise a l'ecart des imprimantes en echec."""
+
+    def __init__(self, registry=None):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._next_index = {}   # groupe -> position du tourniquet
+        self._failed_until = {} # nom d'imprimante -> fin de mise a l'ecart
+
+    def _get_registry(self):
+        if self._registry is None:
+            from printer.registry import printer_registry
+            return printer_registry
+        return self._registry
+
+    @staticmethod
+    def get_config(group_name):
+        """Definition du groupe dans la configuration, ou None s'il n'existe pas."""
+        group = config.get('printer_groups', {}).get(group_name)
+        if isinstance(group, list):  # forme courte : liste des membres
+            group = {'printers': group}
+        return group
+
+    def members(self, group_name):
+        """Entrees du registre des membres du groupe (les imprimantes introuvables sont ignorees)."""
+        group = self.get_config(group_name) or {}
+        registry = self._get_registry()
+        members = []
+        for member in group.get('printers', []):
+            if isinstance(member, int):
+                printer_info = registry.get_by_id(member)
+            else:
+                printer_info = registry.get_by_name(member)
+            if printer_info is None:
+                logger.warning(f"Groupe '{group_name}': imprimante '{member}' introuvable")
+                continue
+            members.append(printer_info)
+        return members
+
+    def choose(self, group_name, load=None, exclude=()):
+        """
+        Choisit le membre qui recevra le prochain travail.
+
+        Args:
+            load (callable): charge d'une imprimante, load(printer_info) -> int
+                             (travaux en attente + en cours)
+            exclude (iterable): noms des membres deja essayes pour ce travail
+
+        Returns:
+            dict: entree du registre, ou None si aucun membre n'est disponible
+        """
+        group = self.get_config(group_name)
+        if group is None:
+            return None
+        candidates = [p for p in self.members(group_name) if p['name'] not in set(exclude)]
+        if not candidates:
+            return None
+
+        from printer.status import printer_status
+        now = time.time()
+        with self._lock:
+            # Ecartees : echec recent, ou defaut signale par l'etat temps reel (papier, capot...)
+            healthy = [p for p in candidates if self._failed_until.get(p['name'], 0) <= now
+                       and printer_status.is_ready(p)]
+            # Tous en echec recent : tenter quand meme plutot que rejeter le travail
+            candidates = healthy or candidates
+
+            start = self._next_index.get(group_name, 0)
+            self._next_index[group_name] = start + 1
+            # Tourniquet : point de depart different a chaque appel
+            ordered = [candidates[(start + i) % len(candidates)] for i in range(len(candidates))]
+
+        strategy = group.get('strategy', STRATEGY_LEAST_LOADED)
+        if strategy == STRATEGY_LEAST_LOADED and load is not None:
+            # min() garde le premier ex aequo : a charge egale, le tourniquet departage
+            return min(ordered, key=load)
+        if strategy not in STRATEGIES:
+            logger.warning(f"Groupe '{group_name}': strategie '{strategy}' inconnue, tourniquet utilise")
+        return ordered[0]
+
+    def mark_failed(self, printer_info):
+        """Ecarte une imprimante en echec des prochaines selections."""
+        cooldown = config.get('printer_group_cooldown', 30)
+        with self._lock:
+            self._failed_until[printer_info['name']] = time.time() + cooldown
+        logger.warning(f"Imprimante {printer_info['name']} ecartee des groupes pendant {cooldown} s")
+
+
+# Instance partagee par l'API et les files d'impression
+printer_groups = PrinterGroups()
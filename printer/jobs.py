@@ -0,0 +1,422 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Files d'attente d'impression par imprimante.
+
+Chaque imprimante (identifiee a partir de l'entree retournee par get_printers)
+possede sa propre file FIFO et un unique thread d'ecriture : les travaux
+destines a un meme peripherique sont serialises (pas d'entrelacement des
+ecritures spouleur / COM / TCP) et la requete HTTP n'attend plus la fin de
+l'impression. La fin d'un travail peut etre attendue (long-poll, PrintJob.wait)
+ou notifiee par un appel HTTP POST vers une URL de rappel (webhook).
+
+Avant l'envoi, l'etat temps reel de l'imprimante (printer.status) est consulte :
+un travail destine a une imprimante en defaut (papier, capot, hors ligne) est
+mis en pause jusqu'a son retour, ou bascule aussitot vers un autre membre de
+son groupe.
+
+Imprimantes du spouleur Windows : les travaux deja en attente au moment de
+l'envoi sont regroupes (au plus 'spooler_batch_max') dans un seul document RAW.
+Les travaux de groupe ne sont jamais regroupes : en cas d'echec, ils sont
+reimprimes sur un autre membre, ce qui dupliquerait les recus deja ecrits.
+"""
+
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from utils.config import logger, config
+from utils.metrics import metrics
+
+
+JOB_QUEUED = 'queued'
+JOB_PRINTING = 'printing'
+JOB_PAUSED = 'paused'  # imprimante en defaut, attente de son retour
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+class PrintJob:
+    """Un travail d'impression : bytes ESC/POS prets a envoyer + imprimante cible."""
+
+    def __init__(self, printer_info, data, meta=None, callback_url=None, job_id=None, group=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.printer_info = printer_info
+        self.data = bytes(data)
+        self.meta = meta or {}
+        self.callback_url = callback_url
+        self.group = group
+        self.attempts = []  # imprimantes essayees (groupe avec bascule)
+        self.callback_status = None
+        self.bytes_sent = None  # progression de l'envoi (liaisons serie par blocs)
+        self.status = JOB_QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def wait(self, timeout=None):
+        """Attend la fin du travail. Retourne True s'il est termine, False si le delai expire."""
+        return self._done.wait(timeout)
+
+    def report_progress(self, sent, total):
+        """Rappel de progression de l'envoi (octets ecrits sur le lien)."""
+        self.bytes_sent = sent
+
+    def to_dict(self):
+        """Representation JSON du travail (sans les donnees binaires)."""
+        result = {
+            'job_id': self.id,
+            'status': self.status,
+            'printer_name': self.printer_info.get('name'),
+            'connection_type': self.printer_info.get('connection_type', 'usb'),
+            'bytes': len(self.data),
+            'error': self.error,
+            'created_at': _iso(self.created_at),
+            'started_at': _iso(self.started_at),
+            'finished_at': _iso(self.finished_at),
+            **self.meta,
+        }
+        if self.bytes_sent is not None:
+            result['bytes_sent'] = self.bytes_sent
+        if self.group:
+            result['printer_group'] = self.group
+            result['attempts'] = list(self.attempts)
+        if self.callback_url:
+            result['callback_url'] = self.callback_url
+            result['callback_status'] = self.callback_status
+        return result
+
+
+def _iso(timestamp):
+    if timestamp is None:
+        return None
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+def printer_key(printer_info):
+    """Cle identifiant le peripherique physique d'une entree get_printers()."""
+    conn = printer_info.get('connection_type', 'usb')
+    if conn == 'bluetooth_com':
+        return f"com:{(printer_info.get('com_port') or printer_info.get('port') or '').upper()}"
+    if conn == 'network':
+        ip = printer_info.get('ip') or printer_info.get('network_ip')
+        return f"tcp:{ip}:{printer_info.get('tcp_port', 9100)}"
+    if conn == 'bluetooth_socket':
+        return f"rfcomm:{(printer_info.get('address') or '').upper()}"
+    return f"spooler:{printer_info.get('name')}"
+
+
+class JobManager:
+    """Distribue les travaux dans une file par imprimante, chacune videe par son thread."""
+
+    def __init__(self, sender=None, history_size=None, spooler=None):
+        """
+        Args:
+            sender (callable): fonction d'envoi (printer_info, data) -> bool
+                               (defaut: print_smart ; pas de regroupement des travaux)
+            history_size (int): nombre de travaux termines conserves pour /jobs/<id>
+                                (defaut: config 'job_history_size')
+            spooler (SpoolerPool): handles du spouleur utilises par print_smart et les
+                                   documents groupes (defaut: printer.spooler.spooler_pool)
+        """
+        self._sender = sender
+        self._spooler = spooler
+        self._history_size = history_size
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._jobs = OrderedDict()
+        self._callbacks = None
+        self._spool = None
+        self._busy = set()  # cles des imprimantes en cours d'envoi
+
+    # -- Soumission -----------------------------------------------------------
+
+    def submit(self, printer_info, data, meta=None, callback_url=None, group=None):
+        """
+        Place un travail dans la file de son imprimante et le retourne immediatement.
+
+        Args:
+            callback_url (str): URL appelee en POST (JSON du travail) a la fin du travail
+            group (str): groupe d'imprimantes de printer_info ; en cas d'echec le
+                         travail est reporte sur un autre membre (printer.groups)
+        """
+        job = PrintJob(printer_info, data, meta, callback_url=callback_url, group=group)
+        if self._spool is not None:
+            self._spool.append(job)
+        return self._enqueue(job)
+
+    def start_spool(self, spool=None):
+        """
+        Active le journal durable (printer.spool) et remet en file les travaux
+        acceptes mais non termines avant le dernier arret du service.
+
+        Returns:
+            int: nombre de travaux rejoues
+        """
+        from printer.spool import PrintSpool
+        spool = spool or PrintSpool()
+        records = spool.open()
+        self._spool = spool
+        for record in records:
+            job = PrintJob(record['printer_info'], record['data'], record.get('meta'),
+                           callback_url=record.get('callback_url'), job_id=record['id'],
+                           group=record.get('group'))
+            job.created_at = record.get('created_at') or job.created_at
+            job.attempts = record.get('attempts') or []
+            job.meta['recovered'] = True
+            self._enqueue(job)
+        return len(records)
+
+    def _enqueue(self, job):
+        key = printer_key(job.printer_info)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim_history()
+            job_queue = self._get_queue(key)
+        job_queue.put(job)
+        logger.info(f"Travail {job.id} en file pour {key} ({len(job.data)} bytes, "
+                    f"{job_queue.qsize()} en attente)")
+        return job
+
+    def get(self, job_id):
+        """Retourne le travail `job_id`, ou None s'il est inconnu (ou trop ancien)."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_sizes(self):
+        """Nombre de travaux en attente par imprimante."""
+        with self._lock:
+            return {key: q.qsize() for key, q in self._queues.items()}
+
+    def load(self, printer_info):
+        """Charge d'une imprimante : travaux en attente + travail en cours d'envoi."""
+        key = printer_key(printer_info)
+        with self._lock:
+            job_queue = self._queues.get(key)
+            return (job_queue.qsize() if job_queue else 0) + (1 if key in self._busy else 0)
+
+    # -- Interne --------------------------------------------------------------
+
+    def _trim_history(self):
+        limit = self._history_size or config.get('job_history_size', 1000)
+        if len(self._jobs) <= limit:
+            return
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= limit:
+                break
+            if self._jobs[job_id].finished:
+                del self._jobs[job_id]
+
+    def _get_queue(self, key):
+        job_queue = self._queues.get(key)
+        if job_queue is None:
+            job_queue = queue.Queue()
+            self._queues[key] = job_queue
+            worker = threading.Thread(target=self._worker, args=(key, job_queue),
+                                      name=f'print-{key}', daemon=True)
+            worker.start()
+        return job_queue
+
+    def _send(self, job):
+        printer_info, data = job.printer_info, job.data
+        if self._sender is None:
+            from printer.printer_utils import print_smart
+            return print_smart(printer_info, data, progress=job.report_progress,
+                               spooler=self._spooler)
+        return self._sender(printer_info, data)
+
+    def _take_batch(self, key, job, job_queue):
+        """
+        Travaux deja en attente a joindre au document RAW de `job` (spouleur
+        uniquement, hors travaux de groupe).
+
+        Returns:
+            tuple: (travaux du document, travail de groupe retire de la file
+                    et a envoyer seul ensuite, ou None)
+        """
+        batch = [job]
+        batch_max = config.get('spooler_batch_max', 8)
+        if self._sender is not None or not key.startswith('spooler:') or job.group:
+            return batch, None
+        while len(batch) < batch_max:
+            try:
+                next_job = job_queue.get_nowait()
+            except queue.Empty:
+                break
+            if next_job.group:
+                return batch, next_job
+            batch.append(next_job)
+        return batch, None
+
+    def _worker(self, key, job_queue):
+        while True:
+            jobs, held = self._take_batch(key, job_queue.get(), job_queue)
+            with self._lock:
+                self._busy.add(key)
+            try:
+                if len(jobs) == 1:
+                    self._run_job(jobs[0])
+                else:
+                    self._run_batch(jobs)
+                if held is not None:
+                    self._run_job(held)
+            finally:
+                with self._lock:
+                    self._busy.discard(key)
+                for _ in range(len(jobs) + (held is not None)):
+                    job_queue.task_done()
+
+    def _start_job(self, job):
+        """Passe le travail a l'etat 'printing' et retourne ses etiquettes de metriques."""
+        job.status = JOB_PRINTING
+        job.started_at = time.time()
+        job.error = None
+        job.bytes_sent = None
+        labels = {
+            'printer': job.printer_info.get('name'),
+            'connection_type': job.printer_info.get('connection_type', 'usb'),
+        }
+        metrics.observe('thermal_stage_duration_seconds', job.started_at - job.created_at,
+                        stage='queue_wait', **labels)
+        return labels
+
+    def _run_batch(self, jobs):
+        """Envoie plusieurs travaux d'une meme imprimante du spouleur en un seul document RAW."""
+        labels = [self._start_job(job) for job in jobs]
+        printer_name = jobs[0].printer_info.get('name')
+        error = None
+        started = time.perf_counter()
+        try:
+            from printer.printer_utils import print_raw_documents
+            try:
+                success = print_raw_documents(printer_name, [job.data for job in jobs], self._spooler)
+            finally:
+                # Chaque travail du document a attendu tout l'envoi
+                elapsed = time.perf_counter() - started
+                for job_labels in labels:
+                    metrics.observe('thermal_stage_duration_seconds', elapsed,
+                                    stage='transport', **job_labels)
+            if not success:
+                error = f"Échec de l'impression sur {printer_name}"
+        except Exception as e:
+            success = False
+            error = str(e)
+            logger.error(f"Erreur lot de {len(jobs)} travaux sur {printer_name}: {e}")
+        if success:
+            logger.info(f"{len(jobs)} travaux envoyes en un document sur {printer_name}")
+        for job, job_labels in zip(jobs, labels):
+            job.error = error
+            self._finish_job(job, success, job_labels)
+
+    def _run_job(self, job):
+        labels = self._start_job(job)
+        try:
+            success = self._printer_ready(job)
+            if success:
+                with metrics.timer('thermal_stage_duration_seconds', stage='transport', **labels):
+                    success = self._send(job)
+                if not success:
+                    job.error = f"Échec de l'impression sur {job.printer_info.get('name')}"
+        except Exception as e:
+            success = False
+            job.error = str(e)
+            logger.error(f"Erreur travail {job.id}: {e}")
+        self._finish_job(job, success, labels)
+
+    def _finish_job(self, job, success, labels):
+        """Termine le travail (ou le reporte sur un autre membre de son groupe)."""
+        if job.group:
+            job.attempts.append(job.printer_info.get('name'))
+            if not success and self._failover(job):
+                metrics.inc('thermal_errors_total', stage='transport', **labels)
+                return
+
+        job.finished_at = time.time()
+        job.status = JOB_DONE if success else JOB_FAILED
+        logger.info(f"Travail {job.id} {job.status} en "
+                    f"{(job.finished_at - job.started_at) * 1000:.0f} ms")
+
+        metrics.inc('thermal_jobs_total', result=job.status, **labels)
+        if success:
+            metrics.inc('thermal_bytes_sent_total', len(job.data), **labels)
+        else:
+            metrics.inc('thermal_errors_total', stage='transport', **labels)
+
+        if self._spool is not None:
+            self._spool.mark_finished(job)
+        job._done.set()
+        if job.callback_url:
+            self._notify(job)
+
+    def _printer_ready(self, job):
+        """
+        Verifie le dernier etat connu de l'imprimante avant l'envoi. En defaut,
+        un travail de groupe echoue aussitot (bascule) ; les autres sont mis en
+        pause jusqu'au retour de l'imprimante, au plus 'status_pause_timeout' s.
+        """
+        from printer.status import printer_status, is_blocking
+        status = printer_status.get(job.printer_info)
+        if not is_blocking(status):
+            return True
+        name = job.printer_info.get('name')
+        if not job.group:
+            pause_timeout = config.get('status_pause_timeout', 60)
+            logger.warning(f"Travail {job.id} en pause: imprimante {name} {status['state']}")
+            job.status = JOB_PAUSED
+            status = printer_status.wait_ready(job.printer_info, pause_timeout)
+            job.status = JOB_PRINTING
+            if not is_blocking(status):
+                logger.info(f"Travail {job.id}: imprimante {name} disponible, reprise")
+                return True
+        job.error = f"Imprimante {name} indisponible ({status['state']})"
+        return False
+
+    def _failover(self, job):
+        """Reporte un travail de groupe en echec sur un membre non encore essaye."""
+        from printer.groups import printer_groups
+        printer_groups.mark_failed(job.printer_info)
+        next_printer = printer_groups.choose(job.group, load=self.load, exclude=job.attempts)
+        if next_printer is None:
+            return False
+        logger.warning(f"Travail {job.id}: echec sur {job.printer_info.get('name')}, "
+                       f"bascule vers {next_printer['name']} (groupe {job.group})")
+        job.printer_info = next_printer
+        job.status = JOB_QUEUED
+        if self._spool is not None:
+            # Rejoue apres un arret sur le nouveau membre, sans revenir aux precedents
+            self._spool.append(job)
+        self._enqueue(job)
+        return True
+
+    def _notify(self, job):
+        """Envoie le resultat au webhook du travail, hors du thread d'impression."""
+        with self._lock:
+            if self._callbacks is None:
+                self._callbacks = ThreadPoolExecutor(
+                    max_workers=config.get('job_callback_workers', 4),
+                    thread_name_prefix='job-callback')
+        self._callbacks.submit(self._post_callback, job)
+
+    def _post_callback(self, job):
+        import requests
+        try:
+            response = requests.post(job.callback_url, json={'job': job.to_dict()},
+                                     timeout=config.get('job_callback_timeout', 5))
+            job.callback_status = f"HTTP {response.status_code}"
+            logger.info(f"Rappel travail {job.id} -> {job.callback_url}: {job.callback_status}")
+        except Exception as e:
+            job.callback_status = f"error: {e}"
+            logger.warning(f"Rappel travail {job.id} vers {job.callback_url} echoue: {e}")
+
+
+# Instance partagee par l'API
+job_manager = JobManager()
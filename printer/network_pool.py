@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Pool de connexions TCP persistantes vers les imprimantes reseau (port 9100).
+
+Une connexion est conservee ouverte par (hote, port) et reutilisee d'un ticket
+a l'autre, au lieu d'ouvrir une socket, attendre 0.8 s puis la fermer a chaque
+impression :
+  - verification de l'etat de la socket avant chaque envoi (fermeture distante)
+  - reconnexion automatique en cas d'echec d'envoi
+  - apres l'envoi, requete d'etat temps reel DLE EOT 1 : la reponse de
+    l'imprimante confirme la reception des donnees (remplace l'attente fixe)
+  - fermeture des connexions inactives (la plupart des imprimantes n'acceptent
+    qu'un seul client a la fois sur le port 9100)
+"""
+
+import select
+import socket
+import threading
+import time
+from utils.config import logger, config
+
+
+DLE_EOT_PRINTER_STATUS = b'\x10\x04\x01'  # DLE EOT 1 - etat de l'imprimante (temps reel)
+
+
+class _PooledConnection:
+    """Socket persistante vers une imprimante, protegee par son propre verrou."""
+
+    def __init__(self, host, tcp_port):
+        self.host = host
+        self.tcp_port = tcp_port
+        self.sock = None
+        self.last_used = 0.0
+        # Reponse a DLE EOT sur cette connexion : None (inconnu), True (deja
+        # repondu), False (jamais repondu : plus d'attente apres envoi)
+        self.answers_status = None
+        self.lock = threading.Lock()
+
+    def connect(self, timeout):
+        sock = socket.create_connection((self.host, self.tcp_port), timeout=timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self.answers_status = None  # imprimante redemarree ou remplacee : a reverifier
+        logger.info(f"Connexion TCP ouverte vers {self.host}:{self.tcp_port}")
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def discard_pending(self):
+        """
+        Verifie la socket sans bloquer : retourne False si l'imprimante a ferme
+        la connexion. Les octets en attente (reponses d'etat tardives) sont ignores.
+        """
+        try:
+            while True:
+                readable, _, _ = select.select([self.sock], [], [], 0)
+                if not readable:
+                    return True
+                if not self.sock.recv(1024):
+                    return False  # fermeture cote imprimante
+        except OSError:
+            return False
+
+
+class NetworkConnectionPool:
+    """Connexions TCP persistantes indexees par (hote, port)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._reaper = None
+
+    def _get(self, host, tcp_port):
+        key = (host, int(tcp_port))
+        with self._lock:
+            conn = self._connections.get(key)
+            if conn is None:
+                conn = _PooledConnection(host, int(tcp_port))
+                self._connections[key] = conn
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_idle,
+                                                name='network-pool-reaper', daemon=True)
+                self._reaper.start()
+        return conn
+
+    def send(self, host, data, tcp_port=9100, timeout=10):
+        """
+        Envoie les donnees sur la connexion persistante (reconnexion si besoin).
+        Leve OSError si l'envoi echoue apres reconnexion, ou si une imprimante
+        qui repondait a DLE EOT ne confirme pas la reception (voir _drain).
+        """
+        conn = self._get(host, tcp_port)
+        with conn.lock:
+            if conn.sock is not None and not conn.discard_pending():
+                logger.info(f"Connexion TCP {host}:{tcp_port} fermee par l'imprimante, reconnexion")
+                conn.close()
+
+            # Une seule nouvelle tentative, et seulement si la socket reutilisee
+            # etait morte : une imprimante injoignable ne coute qu'un timeout
+            retry = conn.sock is not None
+            while True:
+                try:
+                    if conn.sock is None:
+                        conn.connect(timeout)
+                    conn.sock.settimeout(timeout)
+                    conn.sock.sendall(data)
+                    break
+                except OSError as e:
+                    conn.close()
+                    if not retry:
+                        raise
+                    retry = False
+                    logger.warning(f"Envoi TCP {host}:{tcp_port} echoue ({e}), reconnexion")
+
+            self._drain(conn)
+            conn.last_used = time.time()
+
+    def query(self, host, requests, tcp_port=9100, timeout=1.0):
+        """
+        Requetes d'etat temps reel (DLE EOT n) sur la connexion de l'imprimante.
+        Une connexion ouverte pour l'occasion est refermee aussitot (le port
+        9100 n'accepte souvent qu'un client). Les requetes s'arretent a la
+        premiere restee sans reponse.
+
+        Returns:
+            list: octet de reponse par requete envoyee (None si absent ou invalide),
+                  ou None si un envoi est en cours sur la connexion
+        Leve OSError si l'imprimante est injoignable.
+        """
+        conn = self._get(host, tcp_port)
+        if not conn.lock.acquire(blocking=False):
+            return None
+        try:
+            if conn.sock is not None and not conn.discard_pending():
+                conn.close()
+            opened = conn.sock is None
+            try:
+                if opened:
+                    conn.connect(timeout)
+                replies = []
+                for status_request in requests:
+                    conn.sock.sendall(status_request)
+                    readable, _, _ = select.select([conn.sock], [], [], timeout)
+                    if not readable:
+                        # Requetes non supportees : inutile d'attendre les suivantes
+                        replies.append(None)
+                        break
+                    reply = conn.sock.recv(1)
+                    if not reply:
+                        raise ConnectionError("connexion fermee par l'imprimante")
+                    # Bits fixes d'un octet d'etat : 1 et 4 a 1, 0 et 7 a 0
+                    replies.append(reply[0] if reply[0] & 0x93 == 0x12 else None)
+                return replies
+            except OSError:
+                conn.close()
+                raise
+            finally:
+                if opened:
+                    conn.close()
+        finally:
+            conn.lock.release()
+
+    def _drain(self, conn):
+        """
+        Attend que l'imprimante reponde a DLE EOT 1 (donnees recues).
+        Sans reponse dans le delai :
+          - si elle n'a jamais repondu sur cette connexion, elle ne gere pas
+            les requetes d'etat : les envois suivants n'attendent plus
+          - si elle repondait, elle est bloquee (bourrage, tampon plein,
+            socket a moitie morte) : la connexion est fermee et TimeoutError
+            est levee pour que le travail echoue (ou bascule)
+        """
+        drain_timeout = config.get('network_drain_timeout', 0.8)
+        if drain_timeout <= 0 or conn.answers_status is False:
+            return
+        try:
+            conn.sock.sendall(DLE_EOT_PRINTER_STATUS)
+            readable, _, _ = select.select([conn.sock], [], [], drain_timeout)
+            if readable:
+                conn.answers_status = True
+                if not conn.sock.recv(1):
+                    conn.close()  # fermee apres reception, le prochain envoi reconnectera
+                return
+        except OSError as e:
+            logger.debug(f"Drain DLE EOT {conn.host}:{conn.tcp_port} interrompu: {e}")
+            conn.close()
+            return
+
+        if conn.answers_status:
+            conn.close()
+            raise TimeoutError(f"{conn.host}:{conn.tcp_port} ne repond plus a DLE EOT "
+                               f"apres envoi, ticket non confirme")
+        logger.info(f"Pas de reponse DLE EOT de {conn.host}:{conn.tcp_port}, "
+                    f"plus d'attente apres les prochains envois")
+        conn.answers_status = False
+
+    def _reap_idle(self):
+        while True:
+            idle_timeout = config.get('network_idle_timeout', 15)
+            time.sleep(max(1.0, idle_timeout / 2))
+            now = time.time()
+            with self._lock:
+                connections = list(self._connections.values())
+            for conn in connections:
+                if conn.sock is None or now - conn.last_used < idle_timeout:
+                    continue
+                if conn.lock.acquire(blocking=False):
+                    try:
+                        logger.info(f"Fermeture connexion TCP inactive {conn.host}:{conn.tcp_port}")
+                        conn.close()
+                    finally:
+                        conn.lock.release()
+
+    def close_all(self):
+        """Ferme toutes les connexions ouvertes."""
+        with self._lock:
+            connections = list(self._connections.values())
+        for conn in connections:
+            with conn.lock:
+                conn.close()
+
+
+# Instance partagee par print_via_network
+network_pool = NetworkConnectionPool()
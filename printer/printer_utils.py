@@ -1,19 +1,112 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import win32print
+try:
+    import win32print
+except ImportError:
+    # Hors Windows (benchmarks, imprimante simulee) : pas de spouleur disponible
+    win32print = None
 import unicodedata
 import base64
+import codecs
+import encodings.cp858
+import hashlib
 import io
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from utils.config import logger
+from utils.config import logger, config, WIDTH_CACHE_FILE
+from printer.raster import fit_width, rasterize, raster_commands, DITHER_FLOYD_STEINBERG, RASTER_GS_V_0
 
 
 # ---------------------------------------------------------------------------
 # Conversion image → ESC/POS raster (GS v 0)
 # ---------------------------------------------------------------------------
 
-def image_to_escpos(image_source, max_width_px=384, align='center'):
+# Cache LRU des logos convertis : les boutiques envoient le meme logo a chaque
+# ticket, la conversion (decodage, redimensionnement, 1-bit) n'est faite qu'une fois
+_logo_cache = OrderedDict()
+_logo_cache_lock = threading.Lock()
+_logo_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def _logo_cache_key(image_source, max_width_px, align, dither):
+    """Cle du cache : empreinte du contenu de l'image + parametres de rendu."""
+    digest = hashlib.sha1()
+    if isinstance(image_source, str):
+        digest.update(image_source.encode('utf-8', errors='surrogatepass'))
+        # Chemin fichier : un fichier modifie doit etre reconverti
+        if len(image_source) < 1024 and os.path.isfile(image_source):
+            digest.update(str(os.path.getmtime(image_source)).encode('ascii'))
+    else:
+        digest.update(image_source)
+    return (digest.hexdigest(), max_width_px, align, dither)
+
+
+def get_logo_cache_stats():
+    """Compteurs du cache des logos (hits, misses, taille)."""
+    with _logo_cache_lock:
+        return {
+            'hits': _logo_cache_stats['hits'],
+            'misses': _logo_cache_stats['misses'],
+            'size': len(_logo_cache),
+            'max_size': config.get('logo_cache_size', 32),
+        }
+
+
+def clear_logo_cache():
+    """Vide le cache des logos (et remet les compteurs a zero)."""
+    with _logo_cache_lock:
+        _logo_cache.clear()
+        _logo_cache_stats['hits'] = 0
+        _logo_cache_stats['misses'] = 0
+
+
+def image_to_escpos(image_source, max_width_px=384, align='center', dither=None):
+    """
+    Convertit une image en commandes ESC/POS raster (GS v 0), avec cache LRU.
+    Le resultat est memorise par empreinte de l'image + max_width_px + align + dither
+    (taille du cache : config 'logo_cache_size', 0 = desactive).
+
+    Args:
+        image_source: chemin fichier (str), bytes bruts, ou base64 (str)
+        max_width_px (int): largeur maximale en pixels
+        align (str): 'left', 'center', 'right'
+        dither (str): methode de tramage (voir printer/raster.py), defaut config 'logo_dither'
+
+    Returns:
+        bytes: commandes ESC/POS prete a envoyer
+        None : si la conversion echoue
+    """
+    dither = dither or config.get('logo_dither', DITHER_FLOYD_STEINBERG)
+    max_size = config.get('logo_cache_size', 32)
+    if max_size <= 0 or not isinstance(image_source, (str, bytes)):
+        return _image_to_escpos_uncached(image_source, max_width_px, align, dither)
+
+    key = _logo_cache_key(image_source, max_width_px, align, dither) + (
+        config.get('raster_band_height', 128), config.get('raster_mode', RASTER_GS_V_0))
+    with _logo_cache_lock:
+        cached = _logo_cache.get(key)
+        if cached is not None:
+            _logo_cache.move_to_end(key)
+            _logo_cache_stats['hits'] += 1
+            return cached
+        _logo_cache_stats['misses'] += 1
+
+    result = _image_to_escpos_uncached(image_source, max_width_px, align, dither)
+    if result is not None:
+        with _logo_cache_lock:
+            _logo_cache[key] = result
+            _logo_cache.move_to_end(key)
+            while len(_logo_cache) > max_size:
+                _logo_cache.popitem(last=False)
+    return result
+
+
+def _image_to_escpos_uncached(image_source, max_width_px=384, align='center', dither=None):
     """
     Convertit une image en commandes ESC/POS raster (GS v 0).
     Compatible avec toutes les imprimantes thermiques ESC/POS.
@@ -26,13 +119,14 @@ def image_to_escpos(image_source, max_width_px=384, align='center'):
         image_source: chemin fichier (str), bytes bruts, ou base64 (str)
         max_width_px (int): largeur maximale en pixels
         align (str): 'left', 'center', 'right'
+        dither (str): methode de tramage (defaut config 'logo_dither')
 
     Returns:
         bytes: commandes ESC/POS prete a envoyer
         None : si la conversion echoue
     """
     try:
-        from PIL import Image, ImageOps
+        from PIL import Image
     except ImportError:
         logger.error("Pillow non installe: pip install pillow")
         return None
@@ -80,23 +174,10 @@ def image_to_escpos(image_source, max_width_px=384, align='center'):
         else:
             img = img.convert('L')
 
-        img = ImageOps.invert(img)  # blanc=vide, noir=encre
-        img = img.convert('1')      # 1-bit
-
-        # --- Redimensionner si necessaire ---
-        w, h = img.size
-        if w > max_width_px:
-            ratio = max_width_px / w
-            img = img.resize((max_width_px, int(h * ratio)), Image.LANCZOS)
-            w, h = img.size
-
-        # La largeur doit etre un multiple de 8 (requis ESC/POS)
-        if w % 8 != 0:
-            new_w = ((w // 8) + 1) * 8
-            padded = Image.new('1', (new_w, h), 0)
-            padded.paste(img, (0, 0))
-            img = padded
-            w = new_w
+        # --- Redimensionner en niveaux de gris, puis tramer (1-bit) ---
+        img = fit_width(img, max_width_px)
+        dither = dither or config.get('logo_dither', DITHER_FLOYD_STEINBERG)
+        raster, bytes_per_row, h = rasterize(img, dither)
 
         # --- Construire les commandes ESC/POS ---
         commands = bytearray()
@@ -109,22 +190,17 @@ def image_to_escpos(image_source, max_width_px=384, align='center'):
         else:
             commands.extend(b'\x1b\x61\x00')
 
-        # GS v 0 : impression raster
-        bytes_per_row = w // 8
-        xL = bytes_per_row & 0xFF
-        xH = (bytes_per_row >> 8) & 0xFF
-        yL = h & 0xFF
-        yH = (h >> 8) & 0xFF
-
-        commands.extend(b'\x1d\x76\x30\x00')
-        commands.extend(bytes([xL, xH, yL, yH]))
-        commands.extend(img.tobytes())
+        # Impression raster par bandes (tampon de l'imprimante borné)
+        band_height = config.get('raster_band_height', 128)
+        commands.extend(raster_commands(raster, bytes_per_row, h, band_height,
+                                        config.get('raster_mode', RASTER_GS_V_0)))
 
         # Retour alignement gauche + saut de ligne
         commands.extend(b'\x1b\x61\x00')
         commands.extend(b'\n')
 
-        logger.info(f"Logo converti: {w}x{h}px, {bytes_per_row * h} bytes raster")
+        logger.info(f"Logo converti: {bytes_per_row * 8}x{h}px ({dither}), {bytes_per_row * h} bytes raster, "
+                    f"bandes de {band_height or h} lignes")
         return bytes(commands)
 
     except Exception as e:
@@ -147,6 +223,25 @@ ESC_CUT_PARTIAL = b'\x1d\x56\x01'  # Coupe partielle (méthode 3)
 ESC_FEED_CUT = b'\x1b\x64\x03\x1d\x56\x41'  # Avance + Coupe (solution robuste)
 ESC_FEED = b'\x1b\x64'  # Avancer le papier
 
+# Commandes ESC/POS de page de codes
+ESC_SET_CODEPAGE_PC437 = b'\x1b\x74\x00'      # ESC t 0  - PC437 USA
+ESC_SET_CODEPAGE_PC858 = b'\x1b\x74\x0e'      # ESC t 14 - PC858 avec € (index sur POS-58)
+ESC_SET_CODEPAGE_PC850 = b'\x1b\x74\x02'      # ESC t 2  - PC850 Europe
+ESC_SET_CODEPAGE_LATIN1 = b'\x1b\x74\x03'     # ESC t 3  - ISO 8859-1
+
+# Table de correspondance encodage → commande ESC/POS
+# PC858 par défaut : couvre les accents français ET le symbole € (0xD5)
+_CODEPAGE_COMMANDS = {
+    'ascii':   ESC_SET_CODEPAGE_PC858,      # ASCII → PC858 (safe_encode_french encode en cp858)
+    'cp437':   ESC_SET_CODEPAGE_PC437,      # PC437 natif
+    'cp1252':  ESC_SET_CODEPAGE_PC858,      # CP1252 → utiliser PC858 (€ supporté)
+    'cp850':   ESC_SET_CODEPAGE_PC850,      # PC850 Europe
+    'cp858':   ESC_SET_CODEPAGE_PC858,      # PC858 avec €
+    'latin1':  ESC_SET_CODEPAGE_LATIN1,     # ISO 8859-1
+    'auto':    ESC_SET_CODEPAGE_PC858,      # Auto → PC858
+    'utf-8':   ESC_SET_CODEPAGE_PC858       # UTF-8 → PC858 avec conversion
+}
+
 def get_codepage_command(encoding):
     """
     Retourne la commande ESC/POS pour définir la page de codes selon l'encodage
@@ -156,32 +251,9 @@ def get_codepage_command(encoding):
         encoding (str): Encodage souhaité
         
     Returns:
-        bytes: Commande ESC/POS pour la page de codes
-    """
-    # Commandes ESC/POS pour changer les pages de codes
-    ESC_SET_CODEPAGE_PC437 = b'\x1b\x74\x00'      # ESC t 0  - PC437 USA
-    ESC_SET_CODEPAGE_PC858 = b'\x1b\x74\x0e'      # ESC t 14 - PC858 avec € (index sur POS-58)
-    ESC_SET_CODEPAGE_PC850 = b'\x1b\x74\x02'      # ESC t 2  - PC850 Europe
-    ESC_SET_CODEPAGE_LATIN1 = b'\x1b\x74\x03'     # ESC t 3  - ISO 8859-1
-
-    # Table de correspondance encodage → commande ESC/POS
-    # PC858 par défaut : couvre les accents français ET le symbole € (0xD5)
-    codepage_commands = {
-        'ascii':   ESC_SET_CODEPAGE_PC858,      # ASCII → PC858 (safe_encode_french encode en cp858)
-        'cp437':   ESC_SET_CODEPAGE_PC437,      # PC437 natif
-        'cp1252':  ESC_SET_CODEPAGE_PC858,      # CP1252 → utiliser PC858 (€ supporté)
-        'cp850':   ESC_SET_CODEPAGE_PC850,      # PC850 Europe
-        'cp858':   ESC_SET_CODEPAGE_PC858,      # PC858 avec €
-        'latin1':  ESC_SET_CODEPAGE_LATIN1,     # ISO 8859-1
-        'auto':    ESC_SET_CODEPAGE_PC858,      # Auto → PC858
-        'utf-8':   ESC_SET_CODEPAGE_PC858       # UTF-8 → PC858 avec conversion
-    }
-    
-    # Retourner la commande appropriée (PC437 par défaut pour ASCII)
-    command = codepage_commands.get(encoding.lower(), ESC_SET_CODEPAGE_PC437)
-    
-    logger.debug(f"Page de codes pour encodage '{encoding}': {command.hex()}")
-    return command
+        bytes: Commande ESC/POS pour la page de codes (PC437 si encodage inconnu)
+    """
+    return _CODEPAGE_COMMANDS.get(encoding.lower(), ESC_SET_CODEPAGE_PC437)
 
 def is_pos58_printer(printer_name):
     """
@@ -194,75 +266,92 @@ def is_pos58_printer(printer_name):
     printer_name_lower = printer_name.lower()
     return any(keyword.lower() in printer_name_lower for keyword in pos58_keywords)
 
+# Table de conversion française → ASCII optimisée pour la lisibilité
+_FRENCH_ASCII_CONVERSIONS = {
+    # Voyelles avec accents - préservation maximale de la lisibilité
+    'à': 'a', 'á': 'a', 'â': 'a', 'ã': 'a', 'ä': 'a', 'å': 'a',
+    'è': 'e', 'é': 'e', 'ê': 'e', 'ë': 'e', 
+    'ì': 'i', 'í': 'i', 'î': 'i', 'ï': 'i',
+    'ò': 'o', 'ó': 'o', 'ô': 'o', 'õ': 'o', 'ö': 'o',
+    'ù': 'u', 'ú': 'u', 'û': 'u', 'ü': 'u', 'ū': 'u',
+    
+    # Majuscules
+    'À': 'A', 'Á': 'A', 'Â': 'A', 'Ã': 'A', 'Ä': 'A', 'Å': 'A',
+    'È': 'E', 'É': 'E', 'Ê': 'E', 'Ë': 'E',
+    'Ì': 'I', 'Í': 'I', 'Î': 'I', 'Ï': 'I',
+    'Ò': 'O', 'Ó': 'O', 'Ô': 'O', 'Õ': 'O', 'Ö': 'O',
+    'Ù': 'U', 'Ú': 'U', 'Û': 'U', 'Ü': 'U', 'Ū': 'U',
+    
+    # Caractères spéciaux français - TRÈS IMPORTANT
+    'ç': 'c', 'Ç': 'C',          # Cédille
+    'ñ': 'n', 'Ñ': 'N',          # Eñe espagnol
+    'ÿ': 'y', 'Ý': 'Y',          # Y tréma
+    
+    # Ligatures françaises
+    'œ': 'oe', 'Œ': 'OE',        # Très fréquent en français
+    'æ': 'ae', 'Æ': 'AE',        # Moins fréquent mais important
+    
+    # Symboles monétaires et spéciaux
+    # € géré par cp858 (0xD5), ici en fallback ASCII uniquement
+    # NOTE: $ est ASCII standard, pas de conversion nécessaire
+    '€': 'EUR', '£': 'GBP', '¢': 'c',
+    '°': 'deg', '²': '2', '³': '3',
+    '½': '1/2', '¼': '1/4', '¾': '3/4',
+    '±': '+/-', '×': 'x', '÷': '/',
+    
+    # Guillemets et apostrophes (typographie française)
+    '\u201c': '"', '\u201d': '"', '„': '"',
+    '\u2018': "'", '\u2019': "'", '‚': "'",
+    '«': '"', '»': '"',            # Guillemets français
+    
+    # Tirets et ponctuation
+    '–': '-', '—': '-', '―': '-',  # Tirets longs
+    '…': '...',                    # Points de suspension
+    '•': '*', '◦': '-',           # Puces
+    
+    # Flèches
+    '→': '->', '←': '<-', '↑': '^', '↓': 'v',
+    '⇒': '=>', '⇐': '<=', '⟶': '->', '⟵': '<-',
+
+    # Caractères mathématiques
+    '∞': 'infini', '≤': '<=', '≥': '>=',
+    '≠': '!=', '≈': '~=',
+    
+    # Symboles divers
+    '™': 'TM', '®': '(R)', '©': '(C)',
+    '§': 'sect.', '¶': 'par.',
+    '†': '+', '‡': '++',
+}
+
+# Précompilée une seule fois : un seul passage str.translate au lieu d'un
+# str.replace par entrée de la table
+_FRENCH_ASCII_TABLE = str.maketrans(_FRENCH_ASCII_CONVERSIONS)
+
+# Symboles monétaires → texte ASCII lisible, et espaces insécables
+# (\u202f de toLocaleString('fr-FR'), \u00a0) → espace simple
+_CURRENCY_ASCII = {
+    '€': 'EUR', '£': 'GBP', '¥': 'JPY', '¤': '', '₦': 'NGN',
+    '₣': 'CHF', '₹': 'INR', '₩': 'KRW', '₪': 'ILS',
+    '\u202f': ' ', '\u00a0': ' ',
+}
+_CURRENCY_ASCII_RE = re.compile('[' + ''.join(_CURRENCY_ASCII) + ']')
+
+# Le module encodings.cp858 fournit une table d'encodage sous forme de dict,
+# lente avec charmap_encode ; la version compilée (EncodingMap) est ~5x plus rapide
+_CP858_ENCODING_MAP = codecs.charmap_build(encodings.cp858.decoding_table)
+
 def convert_french_to_ascii_smart(text):
     """
     Convertit intelligemment le français vers ASCII en préservant la lisibilité
     FONCTION PRINCIPALE pour toutes les imprimantes maintenant
     """
-    if not text:
+    if not text or text.isascii():
         return text
     
-    # Table de conversion française → ASCII optimisée pour la lisibilité
-    french_conversions = {
-        # Voyelles avec accents - préservation maximale de la lisibilité
-        'à': 'a', 'á': 'a', 'â': 'a', 'ã': 'a', 'ä': 'a', 'å': 'a',
-        'è': 'e', 'é': 'e', 'ê': 'e', 'ë': 'e', 
-        'ì': 'i', 'í': 'i', 'î': 'i', 'ï': 'i',
-        'ò': 'o', 'ó': 'o', 'ô': 'o', 'õ': 'o', 'ö': 'o',
-        'ù': 'u', 'ú': 'u', 'û': 'u', 'ü': 'u', 'ū': 'u',
-        
-        # Majuscules
-        'À': 'A', 'Á': 'A', 'Â': 'A', 'Ã': 'A', 'Ä': 'A', 'Å': 'A',
-        'È': 'E', 'É': 'E', 'Ê': 'E', 'Ë': 'E',
-        'Ì': 'I', 'Í': 'I', 'Î': 'I', 'Ï': 'I',
-        'Ò': 'O', 'Ó': 'O', 'Ô': 'O', 'Õ': 'O', 'Ö': 'O',
-        'Ù': 'U', 'Ú': 'U', 'Û': 'U', 'Ü': 'U', 'Ū': 'U',
-        
-        # Caractères spéciaux français - TRÈS IMPORTANT
-        'ç': 'c', 'Ç': 'C',          # Cédille
-        'ñ': 'n', 'Ñ': 'N',          # Eñe espagnol
-        'ÿ': 'y', 'Ý': 'Y',          # Y tréma
-        
-        # Ligatures françaises
-        'œ': 'oe', 'Œ': 'OE',        # Très fréquent en français
-        'æ': 'ae', 'Æ': 'AE',        # Moins fréquent mais important
-        
-        # Symboles monétaires et spéciaux
-        # € géré par cp858 (0xD5), ici en fallback ASCII uniquement
-        # NOTE: $ est ASCII standard, pas de conversion nécessaire
-        '€': 'EUR', '£': 'GBP', '¢': 'c',
-        '°': 'deg', '²': '2', '³': '3',
-        '½': '1/2', '¼': '1/4', '¾': '3/4',
-        '±': '+/-', '×': 'x', '÷': '/',
-        
-        # Guillemets et apostrophes (typographie française)
-        '"': '"', '"': '"', '„': '"',
-        ''': "'", ''': "'", '‚': "'",
-        '«': '"', '»': '"',            # Guillemets français
-        
-        # Tirets et ponctuation
-        '–': '-', '—': '-', '―': '-',  # Tirets longs
-        '…': '...',                    # Points de suspension
-        '•': '*', '◦': '-',           # Puces
-        
-        # Flèches
-        '→': '->', '←': '<-', '↑': '^', '↓': 'v',
-        '⇒': '=>', '⇐': '<=', '⟶': '->', '⟵': '<-',
-
-        # Caractères mathématiques
-        '∞': 'infini', '≤': '<=', '≥': '>=',
-        '≠': '!=', '≈': '~=',
-        
-        # Symboles divers
-        '™': 'TM', '®': '(R)', '©': '(C)',
-        '§': 'sect.', '¶': 'par.',
-        '†': '+', '‡': '++',
-    }
-    
     # Appliquer les conversions manuelles
-    result = text
-    for french_char, ascii_replacement in french_conversions.items():
-        result = result.replace(french_char, ascii_replacement)
+    result = text.translate(_FRENCH_ASCII_TABLE)
+    if result.isascii():
+        return result
     
     # Utiliser unicodedata pour les caractères restants (fallback)
     try:
@@ -278,9 +367,85 @@ def convert_french_to_ascii_smart(text):
         # Si unicodedata échoue, retourner le résultat des conversions manuelles
         return result
 
-def detect_printer_width(printer_name):
+# ---------------------------------------------------------------------------
+# Détection de la largeur papier, mémorisée sur disque
+# ---------------------------------------------------------------------------
+
+# Largeur détectée par imprimante : {nom: {'width', 'source', 'driver', 'port'}}.
+# Chargé depuis WIDTH_CACHE_FILE au premier appel ; une entrée n'est recalculée
+# que si le pilote ou le port de l'imprimante change.
+_width_cache = None
+_width_cache_lock = threading.Lock()
+
+
+def _load_width_cache():
+    global _width_cache
+    if _width_cache is None:
+        _width_cache = {}
+        try:
+            if os.path.exists(WIDTH_CACHE_FILE):
+                with open(WIDTH_CACHE_FILE, 'r', encoding='utf-8') as f:
+                    _width_cache = json.load(f)
+        except Exception as e:
+            logger.warning(f"Cache des largeurs illisible, il sera reconstruit: {e}")
+    return _width_cache
+
+
+def _save_width_cache():
+    try:
+        tmp_file = WIDTH_CACHE_FILE + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(_width_cache, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, WIDTH_CACHE_FILE)
+    except Exception as e:
+        logger.warning(f"Impossible d'enregistrer le cache des largeurs: {e}")
+
+
+def clear_printer_width_cache():
+    """Oublie toutes les largeurs détectées (nouvelle détection au prochain appel)."""
+    global _width_cache
+    with _width_cache_lock:
+        _width_cache = {}
+        _save_width_cache()
+
+
+def detect_printer_width(printer_name, driver=None, port=None):
     """
-    Tente de détecter automatiquement si l'imprimante est 58mm ou 80mm
+    Tente de détecter automatiquement si l'imprimante est 58mm ou 80mm.
+
+    Le résultat est mémorisé par nom d'imprimante dans le dossier de données
+    (config 'printer_width_cache'). Si `driver` et `port` sont fournis (entrée
+    d'énumération), une entrée dont le pilote ou le port diffère est recalculée.
+    """
+    if not config.get('printer_width_cache', True):
+        return _detect_printer_width_uncached(printer_name)[0]
+
+    with _width_cache_lock:
+        entry = _load_width_cache().get(printer_name)
+        if (entry and (driver is None or entry.get('driver') == driver)
+                and (port is None or entry.get('port') == port)):
+            return entry['width']
+
+    width, source = _detect_printer_width_uncached(printer_name)
+    if source != 'error':  # une erreur (imprimante hors ligne...) n'est pas mémorisée
+        with _width_cache_lock:
+            _load_width_cache()[printer_name] = {
+                'width': width,
+                'source': source,
+                'driver': driver if driver is not None else (entry or {}).get('driver'),
+                'port': port if port is not None else (entry or {}).get('port'),
+                'detected_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            _save_width_cache()
+    return width
+
+
+def _detect_printer_width_uncached(printer_name):
+    """
+    Détection effective (pilote, port, capacités du pilote).
+
+    Returns:
+        tuple: (largeur, source) avec source 'keyword', 'driver_caps', 'default' ou 'error'
     """
     try:
         hPrinter = win32print.OpenPrinter(printer_name)
@@ -305,12 +470,12 @@ def detect_printer_width(printer_name):
             for keyword in keywords_80mm:
                 if keyword in text_to_check:
                     logger.info(f"Détection: {printer_name} identifiée comme imprimante 80mm")
-                    return "80mm"
+                    return "80mm", 'keyword'
                     
             for keyword in keywords_58mm:
                 if keyword in text_to_check:
                     logger.info(f"Détection: {printer_name} identifiée comme imprimante 58mm")
-                    return "58mm"
+                    return "58mm", 'keyword'
             
             # Essayer de détecter via les capacités du pilote
             try:
@@ -319,20 +484,20 @@ def detect_printer_width(printer_name):
                 if printer_caps:
                     widths = [size[0] for size in printer_caps]
                     if any(w > 700 for w in widths):  # Probablement 80mm
-                        return "80mm"
+                        return "80mm", 'driver_caps'
                     elif any(500 <= w <= 700 for w in widths):  # Probablement 58mm
-                        return "58mm"
+                        return "58mm", 'driver_caps'
             except:
                 pass
             
             logger.info(f"Impossible de détecter la largeur pour {printer_name}, utilisation de 58mm par défaut")
-            return "58mm"
+            return "58mm", 'default'
             
         finally:
             win32print.ClosePrinter(hPrinter)
     except Exception as e:
         logger.error(f"Erreur lors de la détection de la largeur pour {printer_name}: {e}")
-        return "58mm"
+        return "58mm", 'error'
 
 def detect_printer_encoding(printer_name):
     """
@@ -369,6 +534,8 @@ def get_printers():
 
     # --- 1. Imprimantes Windows (spouleur) ---
     try:
+        if win32print is None:
+            raise RuntimeError("pywin32 (win32print) non disponible")
         printer_info = win32print.EnumPrinters(
             win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS
         )
@@ -387,7 +554,7 @@ def get_printers():
                 conn_type = 'bluetooth_spooler'
                 spooler_com_ports.add(port.upper())
 
-            printer_width = detect_printer_width(printer_name)
+            printer_width = detect_printer_width(printer_name, driver=printer[3], port=port)
 
             printers.append({
                 'id': i,
@@ -435,58 +602,47 @@ def get_printers():
     logger.info(f"{len(printers)} imprimantes totales (USB + Bluetooth + reseau)")
     return printers
 
+# Séquences fixes, construites une seule fois (voir printer/profiles.py)
+ROBUST_INIT = (
+    b'\x1b\x40'          # ESC @ - Reset complet
+    # Activer le code page PC858 :
+    # - € = 0xD5, accents français (é, è, à, ç, ô, ù...) supportés
+    # - Sur cette imprimante POS-58 : PC858 = index 14 (lu depuis le ticket test interne)
+    b'\x1b\x74\x0e'      # ESC t 14 - Code page PC858 (€ = 0xD5)
+    b'\x1b\x64\x01'      # ESC d 1 - Avancer une ligne pour s'assurer que l'imprimante est prête
+)
+
+ROBUST_CUT = (
+    b'\x1b\x64\x05'      # ESC d 5 - Avancer 5 lignes : texte au-dessus de la lame
+    # GS V 65 0 : coupe complète avec n=0 (forme 2-octets, universelle ESC/POS)
+    b'\x1d\x56\x41\x00'  # GS V 65 0 - Coupe complète
+    # GS V 66 0 : coupe partielle avec n=0 (fallback pour imprimantes sans coupe complète)
+    b'\x1d\x56\x42\x00'  # GS V 66 0 - Coupe partielle
+)
+
 def get_robust_init_command(printer_name=None):
     """
     Retourne une séquence d'initialisation robuste pour l'imprimante
     
     Args:
-        printer_name (str): Nom de l'imprimante
+        printer_name (str): Nom de l'imprimante (conservé pour compatibilité)
         
     Returns:
         bytes: Commande d'initialisation robuste
     """
-    robust_init = bytearray()
-
-    # Réinitialisation complète
-    robust_init.extend(b'\x1b\x40')          # ESC @ - Reset complet
-
-    # Activer le code page PC858 :
-    # - € = 0xD5, accents français (é, è, à, ç, ô, ù...) supportés
-    # - Sur cette imprimante POS-58 : PC858 = index 14 (lu depuis le ticket test interne)
-    robust_init.extend(b'\x1b\x74\x0e')      # ESC t 14 - Code page PC858 (€ = 0xD5)
-
-    # Avancer une ligne pour s'assurer que l'imprimante est prête
-    robust_init.extend(b'\x1b\x64\x01')      # ESC d 1 - Avancer une ligne
-    
-    if printer_name:
-        logger.debug(f"Initialisation robuste générée pour {printer_name}")
-    
-    return bytes(robust_init)
+    return ROBUST_INIT
 
 def get_robust_cut_command(printer_name=None):
     """
     Retourne une commande de coupe IMMÉDIATE qui force la coupe du premier reçu
     
     Args:
-        printer_name (str): Nom de l'imprimante pour détecter le type
+        printer_name (str): Nom de l'imprimante (conservé pour compatibilité)
         
     Returns:
         bytes: Commande de coupe immédiate
     """
-    robust_cut = bytearray()
-
-    # Avancer suffisamment pour que le texte soit au-dessus de la lame
-    robust_cut.extend(b'\x1b\x64\x05')      # ESC d 5 - Avancer 5 lignes
-
-    # GS V 65 0 : coupe complète avec n=0 (forme 2-octets, universelle ESC/POS)
-    robust_cut.extend(b'\x1d\x56\x41\x00')  # GS V 65 0 - Coupe complète
-    # GS V 66 0 : coupe partielle avec n=0 (fallback pour imprimantes sans coupe complète)
-    robust_cut.extend(b'\x1d\x56\x42\x00')  # GS V 66 0 - Coupe partielle
-    
-    if printer_name:
-        logger.debug(f"Commande de coupe IMMÉDIATE générée pour {printer_name}")
-    
-    return bytes(robust_cut)
+    return ROBUST_CUT
 
 def safe_encode_french(text, encoding='ascii', printer_name=None):
     """
@@ -504,21 +660,19 @@ def safe_encode_french(text, encoding='ascii', printer_name=None):
     if not text:
         return b''
 
-    # Normaliser les espaces insécables (\u202f de toLocaleString('fr-FR'), \u00a0)
-    text = text.replace('\u202f', ' ').replace('\u00a0', ' ')
+    # Chemin rapide : texte déjà ASCII (cas de la majorité des lignes d'un reçu)
+    if text.isascii():
+        return text.encode('ascii')
 
     # Convertir les symboles monétaires en texte ASCII lisible (même comportement que Tester ASCII)
-    # Cela garantit un affichage cohérent sur toutes les imprimantes sans dépendre du code page
-    currency_ascii = {
-        '€': 'EUR', '£': 'GBP', '¥': 'JPY', '¤': '', '₦': 'NGN',
-        '₣': 'CHF', '₹': 'INR', '₩': 'KRW', '₪': 'ILS',
-    }
-    for sym, code in currency_ascii.items():
-        text = text.replace(sym, code)
+    # Cela garantit un affichage cohérent sur toutes les imprimantes sans dépendre du code page.
+    # Seuls les caractères réellement présents sont remplacés.
+    for sym in set(_CURRENCY_ASCII_RE.findall(text)):
+        text = text.replace(sym, _CURRENCY_ASCII[sym])
 
     try:
-        return text.encode('cp858')
-    except (UnicodeEncodeError, LookupError):
+        return codecs.charmap_encode(text, 'strict', _CP858_ENCODING_MAP)[0]
+    except UnicodeEncodeError:
         # Fallback ASCII avec conversion française pour les caractères hors CP858
         ascii_text = convert_french_to_ascii_smart(text)
         try:
@@ -527,37 +681,74 @@ def safe_encode_french(text, encoding='ascii', printer_name=None):
             logger.warning(f"Caractères non encodables dans: '{text[:30]}...', remplacement forcé")
             return ascii_text.encode('ascii', errors='replace')
 
-def print_raw(printer_name, data):
-    """Imprime des donnees brutes via le spouleur Windows (USB, reseau, BT avec driver)."""
+def safe_encode_french_run(parts, encoding='ascii', printer_name=None):
+    """
+    Encode une suite de fragments de texte en un seul appel.
+    Résultat identique à safe_encode_french appliqué fragment par fragment.
+
+    Args:
+        parts (list): Fragments de texte (lignes, fins de ligne...)
+        encoding (str): Encodage souhaité (voir safe_encode_french)
+        printer_name (str): Nom de l'imprimante (pour log)
+
+    Returns:
+        bytes: Texte encodé
+    """
+    text = ''.join(parts)
+    if text.isascii():
+        return text.encode('ascii')
+
+    # Substitutions caractère par caractère : même effet sur le texte concaténé
+    for sym in set(_CURRENCY_ASCII_RE.findall(text)):
+        text = text.replace(sym, _CURRENCY_ASCII[sym])
+
     try:
-        hPrinter = win32print.OpenPrinter(printer_name)
-        try:
-            hJob = win32print.StartDocPrinter(hPrinter, 1, ("Impression Hotelia", None, "RAW"))
-            try:
-                win32print.StartPagePrinter(hPrinter)
-                win32print.WritePrinter(hPrinter, data)
-                win32print.EndPagePrinter(hPrinter)
-            finally:
-                win32print.EndDocPrinter(hPrinter)
-        finally:
-            win32print.ClosePrinter(hPrinter)
+        return codecs.charmap_encode(text, 'strict', _CP858_ENCODING_MAP)[0]
+    except UnicodeEncodeError:
+        # Caractère hors CP858 : la conversion ASCII ne doit toucher que son fragment
+        return b''.join(safe_encode_french(part, encoding, printer_name) for part in parts)
+
+def print_raw(printer_name, data, pool=None):
+    """
+    Imprime des donnees brutes via le spouleur Windows (USB, reseau, BT avec driver).
+    Le handle de l'imprimante reste ouvert entre deux tickets (voir printer.spooler)
+    sauf si 'spooler_keep_handle' est desactive dans la configuration.
+    """
+    return print_raw_documents(printer_name, [data], pool)
+
+
+def print_raw_documents(printer_name, documents, pool=None):
+    """
+    Imprime plusieurs recus dans un seul document RAW du spouleur (un seul travail Windows).
 
-        import time
-        time.sleep(0.1)
-        logger.info(f"Impression reussie (spouleur) sur {printer_name}")
+    Args:
+        pool (SpoolerPool): handles du spouleur (defaut: printer.spooler.spooler_pool)
+    """
+    if pool is None:
+        from printer.spooler import spooler_pool as pool
+    try:
+        pool.send(printer_name, [bytes(data) for data in documents])
+        logger.info(f"Impression reussie (spouleur) sur {printer_name}"
+                    + (f" ({len(documents)} recus)" if len(documents) > 1 else ""))
         return True
     except Exception as e:
         logger.error(f"Erreur impression spouleur {printer_name}: {e}")
         return False
 
 
-def print_raw_com(com_port, data, baudrate=9600):
-    """Imprime des donnees brutes via un port COM (Bluetooth SPP, serie)."""
+def print_raw_com(com_port, data, baudrate=None, flow_control=None, progress=None):
+    """
+    Imprime des donnees brutes via un port COM (Bluetooth SPP, serie).
+    Le port reste ouvert entre deux tickets (voir printer.serial_pool) sauf si
+    'serial_keepalive' est desactive dans la configuration. Les donnees sont
+    ecrites par blocs, au rythme du lien (progress(octets_envoyes, total)).
+    Sans baudrate, le debit memorise (ou recherche) pour le port est utilise.
+    """
     try:
-        import serial
-        with serial.Serial(com_port, baudrate=baudrate, timeout=5) as ser:
-            ser.write(data)
-            ser.flush()
+        import serial  # pyserial requis (ImportError traitee ci-dessous)
+        from printer.serial_pool import serial_pool
+        serial_pool.send(com_port, bytes(data), baudrate=baudrate, timeout=5,
+                         flow_control=flow_control, progress=progress)
         logger.info(f"Impression reussie (COM) sur {com_port}")
         return True
     except ImportError:
@@ -569,7 +760,21 @@ def print_raw_com(com_port, data, baudrate=9600):
 
 
 def print_via_network(host, data, tcp_port=9100, timeout=10):
-    """Imprime des donnees brutes via TCP/IP directement sur le port 9100 (imprimantes WiFi/Ethernet)."""
+    """
+    Imprime des donnees brutes via TCP/IP directement sur le port 9100 (imprimantes WiFi/Ethernet).
+    Utilise une connexion persistante (voir printer.network_pool) sauf si
+    'network_keepalive' est desactive dans la configuration.
+    """
+    if config.get('network_keepalive', True):
+        from printer.network_pool import network_pool
+        try:
+            network_pool.send(host, bytes(data), tcp_port=tcp_port, timeout=timeout)
+            logger.info(f"Impression reussie (reseau TCP) sur {host}:{tcp_port}")
+            return True
+        except Exception as e:
+            logger.error(f"Erreur impression reseau {host}:{tcp_port}: {e}")
+            return False
+
     import socket
     import time
     try:
@@ -589,16 +794,19 @@ def print_via_network(host, data, tcp_port=9100, timeout=10):
         return False
 
 
-def print_smart(printer_info, data):
+def print_smart(printer_info, data, progress=None, spooler=None):
     """
     Route l'impression vers le bon canal selon connection_type :
-      - 'bluetooth_com' : envoie via port COM (pyserial)
-      - 'network'       : envoie via TCP/IP direct sur port 9100
-      - tous les autres  : envoie via le spouleur Windows (win32print)
+      - 'bluetooth_com'    : envoie via port COM (pyserial)
+      - 'bluetooth_socket' : envoie via socket RFCOMM (adresse MAC)
+      - 'network'          : envoie via TCP/IP direct sur port 9100
+      - tous les autres    : envoie via le spouleur Windows (win32print)
 
     Args:
         printer_info (dict): Entree retournee par get_printers()
         data (bytes): Donnees ESC/POS
+        progress (callable): progression de l'envoi COM, progress(octets_envoyes, total)
+        spooler (SpoolerPool): handles du spouleur (defaut: printer.spooler.spooler_pool)
 
     Returns:
         bool: True si succes
@@ -607,7 +815,13 @@ def print_smart(printer_info, data):
     if conn == 'bluetooth_com':
         com_port = printer_info.get('com_port') or printer_info.get('port')
         logger.info(f"Routage impression → Bluetooth COM {com_port}")
-        return print_raw_com(com_port, data)
+        return print_raw_com(com_port, data, baudrate=printer_info.get('baudrate'),
+                             flow_control=printer_info.get('flow_control'), progress=progress)
+    elif conn == 'bluetooth_socket':
+        from printer.bluetooth_utils import print_via_bluetooth_socket
+        address = printer_info.get('address')
+        logger.info(f"Routage impression → Bluetooth RFCOMM {address}")
+        return print_via_bluetooth_socket(address, data, rfcomm_port=printer_info.get('rfcomm_port', 1))
     elif conn == 'network':
         ip = printer_info.get('ip') or printer_info.get('network_ip')
         tcp_port = printer_info.get('tcp_port', 9100)
@@ -618,7 +832,7 @@ def print_smart(printer_info, data):
         return print_via_network(ip, data, tcp_port=tcp_port)
     else:
         logger.info(f"Routage impression → spouleur Windows ({conn}): {printer_info['name']}")
-        return print_raw(printer_info['name'], data)
+        return print_raw(printer_info['name'], data, spooler)
 
 def print_test(printer_name):
     """Imprime un ticket de test optimisé avec conversion ASCII pour toutes les imprimantes"""
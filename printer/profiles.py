@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Profils d'impression : fragments ESC/POS fixes pré-calculés.
+
+L'initialisation, la page de codes et la coupe ne dépendent que de l'encodage
+et de la largeur papier. Elles sont assemblées une seule fois par profil en
+octets immuables ; le rendu d'un reçu se résume alors à concaténer ces
+fragments autour du corps variable.
+"""
+
+import threading
+from printer.printer_utils import ROBUST_INIT, ROBUST_CUT, get_codepage_command
+
+
+class PrinterProfile:
+    """Fragments fixes d'un couple (encodage, largeur papier). Immuable."""
+
+    __slots__ = ('encoding', 'printer_width', 'line_width', 'init', 'codepage',
+                 'prologue', 'cut', 'final_cut')
+
+    def __init__(self, encoding='ascii', printer_width='58mm'):
+        set_attr = object.__setattr__
+        set_attr(self, 'encoding', encoding)
+        set_attr(self, 'printer_width', printer_width)
+        # Caractères par ligne (police A)
+        set_attr(self, 'line_width', 48 if printer_width == "80mm" else 32)
+        set_attr(self, 'init', ROBUST_INIT)
+        set_attr(self, 'codepage', get_codepage_command(encoding))
+        # Début de tout reçu : initialisation + page de codes
+        set_attr(self, 'prologue', ROBUST_INIT + self.codepage)
+        set_attr(self, 'cut', ROBUST_CUT)
+        # Fin d'un reçu sans section 'cut' explicite
+        set_attr(self, 'final_cut', b'\n\n\n' + ROBUST_CUT)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PrinterProfile est immuable")
+
+    def __repr__(self):
+        return f"PrinterProfile(encoding={self.encoding!r}, printer_width={self.printer_width!r})"
+
+
+_profiles = {}
+_profiles_lock = threading.Lock()
+
+
+def get_printer_profile(encoding='ascii', printer_width='58mm'):
+    """Profil partagé (créé au premier appel) pour un encodage et une largeur papier."""
+    key = ((encoding or 'ascii').lower(), printer_width or '58mm')
+    profile = _profiles.get(key)
+    if profile is None:
+        with _profiles_lock:
+            profile = _profiles.setdefault(key, PrinterProfile(*key))
+    return profile
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tramage et rasterisation des images pour l'impression ESC/POS (GS v 0).
+
+Une tête thermique n'imprime que des points noirs : les niveaux de gris d'une
+photo ou d'un logo dégradé sont simulés par tramage, après redimensionnement
+à la largeur imprimable (le redimensionnement d'une image déjà 1-bit détruit
+la trame).
+
+Méthodes ('dither' d'une section logo, ou config 'logo_dither') :
+  - threshold        : seuil simple, logos noir et blanc nets
+  - floyd_steinberg  : diffusion d'erreur (Pillow, en C), photos
+  - atkinson         : diffusion partielle, contraste plus marqué (NumPy)
+  - bayer            : trame ordonnée 8x8, rendu régulier et très rapide (NumPy)
+
+NumPy est optionnel : sans lui, atkinson et bayer se replient sur floyd_steinberg.
+
+L'image tramée est envoyée par bandes de 'raster_band_height' lignes : une
+petite imprimante 58mm n'a que quelques Ko de tampon, un bloc unique de
+plusieurs dizaines de Ko la sature (et bloque les liaisons COM / Bluetooth).
+"""
+
+from utils.config import logger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DITHER_THRESHOLD = 'threshold'
+DITHER_FLOYD_STEINBERG = 'floyd_steinberg'
+DITHER_ATKINSON = 'atkinson'
+DITHER_BAYER = 'bayer'
+DITHER_METHODS = (DITHER_THRESHOLD, DITHER_FLOYD_STEINBERG, DITHER_ATKINSON, DITHER_BAYER)
+
+RASTER_GS_V_0 = 'gs_v_0'  # GS v 0 : commande raster historique, universelle
+RASTER_GS_L = 'gs_l'      # GS ( L / GS 8 L : mémorisation puis impression (TM-T88V et récentes)
+RASTER_MODES = (RASTER_GS_V_0, RASTER_GS_L)
+
+_bayer_cache = {}
+
+
+def fit_width(img, max_width_px):
+    """
+    Réduit une image en niveaux de gris à max_width_px (multiple de 8 : pas de
+    colonne de remplissage), sans l'agrandir.
+    """
+    from PIL import Image
+
+    w, h = img.size
+    if w <= max_width_px:
+        return img
+    new_w = max(8, max_width_px - max_width_px % 8)
+    new_h = max(1, round(h * new_w / w))
+    return img.resize((new_w, new_h), Image.LANCZOS)
+
+
+def _bayer_thresholds(size=8):
+    """Matrice de seuils de Bayer (uint8) de taille size x size."""
+    matrix = _bayer_cache.get(size)
+    if matrix is None:
+        m = np.zeros((1, 1), dtype=np.int32)
+        while m.shape[0] < size:
+            m = np.block([[4 * m, 4 * m + 2], [4 * m + 3, 4 * m + 1]])
+        matrix = ((m + 0.5) * 256 / m.size).astype(np.uint8)
+        _bayer_cache[size] = matrix
+    return matrix
+
+
+def _atkinson(gray):
+    """
+    Tramage d'Atkinson : 6/8 de l'erreur diffusée vers (x+1, y), (x+2, y),
+    (x-1, y+1), (x, y+1), (x+1, y+1), (x, y+2).
+
+    Chaque pixel ne dépend que de voisins de rang x + 2y inférieur : l'image est
+    cisaillée (ligne t du tampon = diagonale x + 2y = t) et chaque diagonale est
+    traitée d'un bloc, soit W + 2H étapes vectorisées au lieu de W x H itérations.
+    """
+    h, w = gray.shape
+    ys, xs = np.indices((h, w))
+    diag = xs + 2 * ys
+    steps = w + 2 * h
+    # Tampon cisaillé : skew[x + 2y, y] = pixel (x, y) ; 4 lignes de marge pour la diffusion
+    skew = np.zeros((steps + 4, h), dtype=np.float32)
+    skew[diag, ys] = gray
+    # 1/8 de l'erreur par voisin ; les cases hors image ne diffusent rien
+    weight = np.zeros((steps, h), dtype=np.float32)
+    weight[diag, ys] = 0.125
+    dots = np.zeros((steps, h), dtype=bool)
+    near = np.empty(h, dtype=np.float32)
+
+    for t in range(steps):
+        row = skew[t]
+        on = np.less(row, 128, out=dots[t])
+        np.subtract(row, 255.0, out=row, where=~on)  # erreur = valeur - niveau imprimé
+        err = np.multiply(row, weight[t], out=row)
+        # (x+1, y) et (x-1, y+1) tombent sur la diagonale t+1, (x+2, y) et (x, y+1) sur t+2
+        near[:] = err
+        near[1:] += err[:-1]
+        skew[t + 1] += near
+        skew[t + 2] += near
+        skew[t + 3, 1:] += err[:-1]        # (x+1, y+1)
+        skew[t + 4, 2:] += err[:-2]        # (x, y+2)
+    return dots[diag, ys]
+
+
+def _dither_pil(img, method):
+    """Repli sans NumPy : image '1' où 1 = point noir (lignes complétées à l'octet par Pillow)."""
+    from PIL import Image, ImageOps
+
+    inverted = ImageOps.invert(img)  # blanc=vide, noir=encre
+    if method == DITHER_THRESHOLD:
+        return inverted.point(lambda p: 255 if p > 127 else 0).convert('1', dither=Image.NONE)
+    return inverted.convert('1', dither=Image.FLOYDSTEINBERG)
+
+
+def rasterize(img, method=DITHER_FLOYD_STEINBERG):
+    """
+    Trame une image en niveaux de gris (mode 'L') et l'empaquette au format
+    raster ESC/POS : 1 bit par point, bit de poids fort à gauche, 1 = noir.
+
+    Returns:
+        tuple: (données raster (bytes), octets par ligne, hauteur en points)
+    """
+    from PIL import Image
+
+    if method not in DITHER_METHODS:
+        logger.warning(f"Tramage '{method}' inconnu, floyd_steinberg utilisé")
+        method = DITHER_FLOYD_STEINBERG
+    w, h = img.size
+
+    if np is None:
+        if method in (DITHER_ATKINSON, DITHER_BAYER):
+            logger.warning(f"NumPy non installé: tramage '{method}' remplacé par floyd_steinberg")
+        return _dither_pil(img, method).tobytes(), (w + 7) // 8, h
+
+    if method == DITHER_FLOYD_STEINBERG:
+        # Diffusion d'erreur séquentielle : l'implémentation C de Pillow est la plus rapide
+        ink = ~np.asarray(img.convert('1', dither=Image.FLOYDSTEINBERG), dtype=bool)
+    else:
+        gray = np.asarray(img, dtype=np.uint8)
+        if method == DITHER_THRESHOLD:
+            ink = gray < 128
+        elif method == DITHER_BAYER:
+            thresholds = _bayer_thresholds()
+            reps = (-(-h // thresholds.shape[0]), -(-w // thresholds.shape[1]))
+            ink = gray < np.tile(thresholds, reps)[:h, :w]
+        else:
+            ink = _atkinson(gray.astype(np.float32))
+
+    # packbits complète chaque ligne à l'octet avec des bits à 0 (pas d'encre)
+    packed = np.packbits(ink, axis=1)
+    return packed.tobytes(), packed.shape[1], h
+
+
+def _gs_l_band(band, bytes_per_row, rows):
+    """Bande au format GS ( L / GS 8 L : fonction 112 (mémoriser) puis 50 (imprimer)."""
+    params = (b'\x30\x70\x30\x01\x01\x31'  # m=48 fn=112 a=48 (monochrome) bx=1 by=1 c=49
+              + (bytes_per_row * 8).to_bytes(2, 'little') + rows.to_bytes(2, 'little'))
+    size = len(params) + len(band)
+    if size <= 0xFFFF:
+        store = b'\x1d\x28\x4c' + size.to_bytes(2, 'little')
+    else:
+        store = b'\x1d\x38\x4c' + size.to_bytes(4, 'little')
+    return [store, params, band, b'\x1d\x28\x4c\x02\x00\x30\x32']
+
+
+def raster_commands(raster, bytes_per_row, height, band_height=0, mode=RASTER_GS_V_0):
+    """
+    Commandes d'impression d'une image tramée, découpée en bandes.
+
+    Args:
+        raster (bytes): données empaquetées (voir rasterize)
+        bytes_per_row (int): octets par ligne
+        height (int): nombre de lignes
+        band_height (int): lignes par bande (0 = un seul bloc)
+        mode (str): RASTER_GS_V_0 ou RASTER_GS_L
+
+    Returns:
+        bytes: commandes ESC/POS (sans alignement)
+    """
+    if mode not in RASTER_MODES:
+        logger.warning(f"Mode raster '{mode}' inconnu, gs_v_0 utilisé")
+        mode = RASTER_GS_V_0
+    band_height = band_height if band_height > 0 else height
+    view = memoryview(raster)
+    parts = []
+    for top in range(0, height, band_height):
+        rows = min(band_height, height - top)
+        band = view[top * bytes_per_row:(top + rows) * bytes_per_row]
+        if mode == RASTER_GS_L:
+            parts.extend(_gs_l_band(band, bytes_per_row, rows))
+        else:
+            parts.append(b'\x1d\x76\x30\x00' + bytes_per_row.to_bytes(2, 'little')
+                         + rows.to_bytes(2, 'little'))
+            parts.append(band)
+    return b''.join(parts)
@@ -5,9 +5,10 @@ from utils.config import logger, config
 from printer.printer_utils import (
     ESC_INIT, ESC_BOLD_ON, ESC_BOLD_OFF, ESC_DOUBLE_HEIGHT_ON,
     ESC_DOUBLE_HEIGHT_OFF, ESC_CENTER, ESC_LEFT, ESC_RIGHT, ESC_CUT,
-    get_codepage_command, safe_encode_french, detect_printer_encoding, is_pos58_printer,
-    get_robust_cut_command, get_robust_init_command, image_to_escpos
+    safe_encode_french_run, detect_printer_encoding, is_pos58_printer,
+    get_robust_cut_command, image_to_escpos
 )
+from printer.profiles import get_printer_profile
 
 
 def _sanitize_price(value):
@@ -58,11 +59,72 @@ def _fmt(value, decimals=2):
     return int_part
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# CONSTRUCTION DU FLUX ESC/POS
+# ─────────────────────────────────────────────────────────────────────────────
+
+_rules = {}  # (caractère, largeur) -> ligne de séparation
+
+
+class ReceiptBuilder:
+    """
+    Accumule le contenu d'un reçu en une seule passe.
+
+    Le texte (lignes, sauts de ligne, séparateurs) est mis en attente et encodé
+    en un seul appel par suite contiguë, au prochain code de contrôle ou à la
+    fin ; le flux final est assemblé par une seule concaténation.
+
+      - extend(bytes) : codes de contrôle ESC/POS, images raster
+      - text(str)     : texte sans fin de ligne
+      - line(str)     : texte + fin de ligne
+      - rule(char)    : ligne de séparation sur toute la largeur
+    """
+
+    __slots__ = ('line_width', 'encoding', 'printer_name', '_parts', '_run')
+
+    def __init__(self, profile, printer_name=None, prologue=True):
+        self.line_width = profile.line_width
+        self.encoding = profile.encoding
+        self.printer_name = printer_name
+        self._parts = [profile.prologue] if prologue else []
+        self._run = []
+
+    def extend(self, data):
+        if self._run:
+            self._flush()
+        self._parts.append(data)
+
+    def text(self, text):
+        self._run.append(text)
+
+    def line(self, text='', end='\n'):
+        self._run.append(text)
+        self._run.append(end)
+
+    def rule(self, char='-', end='\n'):
+        key = (char, self.line_width)
+        rule = _rules.get(key)
+        if rule is None:
+            rule = _rules.setdefault(key, char * self.line_width)
+        self._run.append(rule)
+        self._run.append(end)
+
+    def _flush(self):
+        self._parts.append(safe_encode_french_run(self._run, self.encoding, self.printer_name))
+        self._run = []
+
+    def getvalue(self):
+        """Flux ESC/POS complet (bytes)."""
+        if self._run:
+            self._flush()
+        return b''.join(self._parts)
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # MOTEUR DYNAMIQUE — sections
 # ─────────────────────────────────────────────────────────────────────────────
 
-def _render_text_section(commands, section, max_width, encode_text):
+def _render_text_section(commands, section, max_width):
     """Rend une section 'text' ou 'header'"""
     sec_type = section.get('type', 'text')
     text     = str(section.get('text', ''))
@@ -85,8 +147,7 @@ def _render_text_section(commands, section, max_width, encode_text):
     for line in (text.splitlines() or [text]):
         if len(line) > max_width:
             line = line[:max_width - 3] + '...'
-        commands.extend(encode_text(line))
-        commands.extend(b'\n')
+        commands.line(line)
 
     if size == 'double':
         commands.extend(ESC_DOUBLE_HEIGHT_OFF)
@@ -95,7 +156,7 @@ def _render_text_section(commands, section, max_width, encode_text):
     commands.extend(ESC_LEFT)
 
 
-def _render_keyvalue_section(commands, section, max_width, encode_text):
+def _render_keyvalue_section(commands, section, max_width):
     """Rend une section 'keyvalue' : clé alignée à gauche, valeur à droite"""
     rows      = section.get('rows', [])
     bold      = section.get('bold', False)
@@ -111,13 +172,12 @@ def _render_keyvalue_section(commands, section, max_width, encode_text):
 
         if bold:
             commands.extend(ESC_BOLD_ON)
-        commands.extend(encode_text(key + ' ' + value))
-        commands.extend(b'\n')
+        commands.line(key + ' ' + value)
         if bold:
             commands.extend(ESC_BOLD_OFF)
 
 
-def _render_table_section(commands, section, max_width, encode_text, currency, decimals,
+def _render_table_section(commands, section, max_width, currency, decimals,
                           printer_width='58mm'):
     """
     Rend une section 'table' avec colonnes définies dynamiquement.
@@ -227,11 +287,9 @@ def _render_table_section(commands, section, max_width, encode_text, currency, d
             for col in columns
         )
         commands.extend(ESC_BOLD_ON)
-        commands.extend(encode_text(header_line))
-        commands.extend(b'\n')
+        commands.line(header_line)
         commands.extend(ESC_BOLD_OFF)
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
+        commands.rule('-')
 
     # Lignes de données
     for row in rows:
@@ -239,12 +297,10 @@ def _render_table_section(commands, section, max_width, encode_text, currency, d
             format_cell(row[i] if i < len(row) else '', col)
             for i, col in enumerate(columns)
         )
-        commands.extend(encode_text(line))
-        commands.extend(b'\n')
+        commands.line(line)
 
     if separator:
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
+        commands.rule('-')
 
 
 def _render_logo_section(commands, section, max_width, printer_width):
@@ -255,6 +311,8 @@ def _render_logo_section(commands, section, max_width, printer_width):
       image  (str) : image en base64 OU chemin vers un fichier sur le serveur
       align  (str) : 'left' | 'center' | 'right'  (defaut: 'center')
       width  (int) : largeur cible en pixels (defaut: adapte au papier)
+      dither (str) : tramage 'threshold' | 'floyd_steinberg' | 'atkinson' | 'bayer'
+                     (defaut: config 'logo_dither')
     """
     image_source = section.get('image') or section.get('path')
     if not image_source:
@@ -271,50 +329,50 @@ def _render_logo_section(commands, section, max_width, printer_width):
 
     max_px = int(section.get('width', default_max_px))
 
-    logo_bytes = image_to_escpos(image_source, max_width_px=max_px, align=align)
+    logo_bytes = image_to_escpos(image_source, max_width_px=max_px, align=align,
+                                 dither=section.get('dither'))
     if logo_bytes:
         commands.extend(logo_bytes)
     else:
         logger.warning("Conversion logo echouee — section ignoree")
 
 
-def _render_section(commands, section, max_width, encode_text, currency, decimals,
+def _render_section(commands, section, max_width, currency, decimals,
                     printer_width='58mm'):
     """Dispatch vers le bon renderer selon le type de section"""
     sec_type = section.get('type', 'text')
 
     if sec_type in ('header', 'text'):
-        _render_text_section(commands, section, max_width, encode_text)
+        _render_text_section(commands, section, max_width)
 
     elif sec_type == 'logo':
         _render_logo_section(commands, section, max_width, printer_width)
 
     elif sec_type == 'separator':
         char = str(section.get('char', '-'))
-        commands.extend(encode_text(char * max_width))
-        commands.extend(b'\n')
+        commands.line(char * max_width)
 
     elif sec_type == 'keyvalue':
-        _render_keyvalue_section(commands, section, max_width, encode_text)
+        _render_keyvalue_section(commands, section, max_width)
 
     elif sec_type == 'table':
-        _render_table_section(commands, section, max_width, encode_text, currency, decimals,
+        _render_table_section(commands, section, max_width, currency, decimals,
                               printer_width)
 
     elif sec_type == 'feed':
         lines = max(1, int(section.get('lines', 1)))
-        commands.extend(b'\n' * lines)
+        commands.text('\n' * lines)
 
     elif sec_type == 'cut':
         lines = max(1, int(section.get('lines', 3)))
-        commands.extend(b'\n' * lines)
+        commands.text('\n' * lines)
         commands.extend(get_robust_cut_command())
 
     else:
         logger.warning(f"Type de section inconnu: {sec_type}")
 
 
-def format_dynamic_content(commands, receipt_data, max_width, encode_text, currency, decimals,
+def format_dynamic_content(commands, receipt_data, max_width, currency, decimals,
                            printer_name, printer_width='58mm'):
     """
     Moteur de rendu dynamique.
@@ -323,12 +381,21 @@ def format_dynamic_content(commands, receipt_data, max_width, encode_text, curre
     sections = receipt_data.get('sections', [])
     for section in sections:
         try:
-            _render_section(commands, section, max_width, encode_text, currency, decimals,
+            _render_section(commands, section, max_width, currency, decimals,
                             printer_width)
         except Exception as e:
             logger.error(f"Erreur section '{section.get('type', '?')}': {e}")
 
 
+def get_dynamic_epilogue(sections, profile):
+    """Fin d'un reçu dynamique : coupe finale si aucune section 'cut' n'est présente."""
+    has_explicit_cut = any(s.get('type') == 'cut' for s in sections)
+    if not has_explicit_cut:
+        return profile.final_cut
+    # Même avec une section 'cut' explicite, s'assurer que le dernier feed est présent
+    return b'\n'
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # POINT D'ENTRÉE PRINCIPAL
 # ─────────────────────────────────────────────────────────────────────────────
@@ -367,34 +434,22 @@ def format_receipt(receipt_data, receipt_type="standard", printer_width=None, en
         currency = receipt_data.get('currency') or config.get('currency', 'FCFA')
         decimals = int(receipt_data.get('currency_decimals', config.get('currency_decimals', 0)))
 
+        # Fragments fixes (init, page de codes, coupe) pré-calculés pour ce profil
+        profile = get_printer_profile(encoding, printer_width)
+        MAX_WIDTH = profile.line_width
         if printer_width == "80mm":
-            MAX_WIDTH    = 48
             ARTICLE_WIDTH = 24
         else:
-            MAX_WIDTH    = 32
             ARTICLE_WIDTH = 14
 
-        commands = bytearray()
-        commands.extend(get_robust_init_command(printer_name))
-        commands.extend(get_codepage_command(encoding))
-
-        def encode_text(text):
-            return safe_encode_french(text, encoding, printer_name)
+        commands = ReceiptBuilder(profile, printer_name)
 
         # ── Mode dynamique ──────────────────────────────────────────────────
         if 'sections' in receipt_data:
-            format_dynamic_content(commands, receipt_data, MAX_WIDTH, encode_text, currency, decimals,
+            format_dynamic_content(commands, receipt_data, MAX_WIDTH, currency, decimals,
                                    printer_name, printer_width)
-
-            # Coupe finale : si aucune section 'cut' n'est présente, ajouter la coupe ici
-            has_explicit_cut = any(s.get('type') == 'cut' for s in receipt_data.get('sections', []))
-            if not has_explicit_cut:
-                commands.extend(b'\n\n\n')
-                commands.extend(get_robust_cut_command(printer_name))
-            else:
-                # Même avec une section 'cut' explicite, s'assurer que le dernier feed est présent
-                commands.extend(b'\n')
-            return commands
+            commands.extend(get_dynamic_epilogue(receipt_data.get('sections', []), profile))
+            return commands.getvalue()
 
         # ── Mode classique : en-tête ────────────────────────────────────────
         if header:
@@ -405,8 +460,7 @@ def format_receipt(receipt_data, receipt_type="standard", printer_width=None, en
                 business_name = header['business_name']
                 if len(business_name) > MAX_WIDTH:
                     business_name = business_name[:MAX_WIDTH - 3] + '...'
-                commands.extend(encode_text(business_name))
-                commands.extend(b'\n')
+                commands.line(business_name)
                 commands.extend(ESC_DOUBLE_HEIGHT_OFF)
                 commands.extend(ESC_BOLD_OFF)
 
@@ -415,16 +469,14 @@ def format_receipt(receipt_data, receipt_type="standard", printer_width=None, en
                 address = header['address']
                 if len(address) > MAX_WIDTH:
                     address = address[:MAX_WIDTH - 3] + '...'
-                commands.extend(encode_text(address))
-                commands.extend(b'\n')
+                commands.line(address)
 
             if header.get('phone'):
                 commands.extend(ESC_CENTER)
                 phone_text = f"Tél: {header['phone']}"
                 if len(phone_text) > MAX_WIDTH:
                     phone_text = phone_text[:MAX_WIDTH - 3] + '...'
-                commands.extend(encode_text(phone_text))
-                commands.extend(b'\n')
+                commands.line(phone_text)
 
             commands.extend(ESC_CENTER)
             commands.extend(ESC_BOLD_ON)
@@ -444,8 +496,7 @@ def format_receipt(receipt_data, receipt_type="standard", printer_width=None, en
                 elif header['receipt_number'].startswith('HTL-'):
                     type_text = "HÔTEL"
 
-            commands.extend(encode_text(type_text))
-            commands.extend(b'\n')
+            commands.line(type_text)
             commands.extend(ESC_BOLD_OFF)
             commands.extend(ESC_LEFT)
 
@@ -453,38 +504,33 @@ def format_receipt(receipt_data, receipt_type="standard", printer_width=None, en
                 receipt_text = f"Reçu #: {header['receipt_number']}"
                 if len(receipt_text) > MAX_WIDTH:
                     receipt_text = receipt_text[:MAX_WIDTH - 3] + '...'
-                commands.extend(encode_text(receipt_text))
-                commands.extend(b'\n')
+                commands.line(receipt_text)
 
             if header.get('date'):
-                commands.extend(encode_text(f"Date: {header['date']}"))
-                commands.extend(b'\n')
+                commands.line(f"Date: {header['date']}")
 
             if receipt_data.get('client_info'):
                 client_info = receipt_data['client_info']
                 if len(client_info) > MAX_WIDTH:
                     client_info = client_info[:MAX_WIDTH - 3] + '...'
-                commands.extend(encode_text(client_info))
-                commands.extend(b'\n')
+                commands.line(client_info)
 
         if receipt_data.get('room_info'):
             for line in receipt_data['room_info'].splitlines():
                 if line.strip():
-                    commands.extend(encode_text(line.strip()))
-                    commands.extend(b'\r\n')
-            commands.extend(b'-' * MAX_WIDTH)
-            commands.extend(b'\r\n')
+                    commands.line(line.strip(), '\r\n')
+            commands.rule('-', '\r\n')
 
         # ── Contenu selon le type ───────────────────────────────────────────
         if receipt_type in ("standard", "food", "drink"):
-            format_standard_content(commands, receipt_data, MAX_WIDTH, ARTICLE_WIDTH, currency, encode_text, decimals)
+            format_standard_content(commands, receipt_data, MAX_WIDTH, ARTICLE_WIDTH, currency, decimals)
         elif receipt_type == "hotel":
-            format_hotel_content(commands, receipt_data, MAX_WIDTH, ARTICLE_WIDTH, currency, encode_text, decimals)
+            format_hotel_content(commands, receipt_data, MAX_WIDTH, ARTICLE_WIDTH, currency, decimals)
         elif receipt_type == "mixed":
-            format_mixed_content(commands, receipt_data, MAX_WIDTH, ARTICLE_WIDTH, currency, encode_text, decimals)
+            format_mixed_content(commands, receipt_data, MAX_WIDTH, ARTICLE_WIDTH, currency, decimals)
         else:
             logger.warning(f"Type de reçu inconnu: {receipt_type}, utilisation du format standard")
-            format_standard_content(commands, receipt_data, MAX_WIDTH, ARTICLE_WIDTH, currency, encode_text, decimals)
+            format_standard_content(commands, receipt_data, MAX_WIDTH, ARTICLE_WIDTH, currency, decimals)
 
         # ── Pied de page ────────────────────────────────────────────────────
         if footer:
@@ -492,86 +538,71 @@ def format_receipt(receipt_data, receipt_type="standard", printer_width=None, en
                 payment_line = f"Mode: {footer['payment_method']}"
                 if len(payment_line) > MAX_WIDTH:
                     payment_line = payment_line[:MAX_WIDTH - 3] + '...'
-                commands.extend(encode_text(payment_line))
-                commands.extend(b'\n')
+                commands.line(payment_line)
 
             if footer.get('payment_status'):
                 status_line = footer['payment_status']
                 if len(status_line) > MAX_WIDTH:
                     status_line = status_line[:MAX_WIDTH - 3] + '...'
-                commands.extend(encode_text(status_line))
-                commands.extend(b'\n')
+                commands.line(status_line)
 
         if change_info:
-            commands.extend(b'\n')
-            commands.extend(b'=' * MAX_WIDTH)
-            commands.extend(b'\n')
+            commands.text('\n')
+            commands.rule('=')
             commands.extend(ESC_BOLD_ON)
             commands.extend(ESC_CENTER)
-            commands.extend(encode_text("INFORMATION MONNAIE"))
-            commands.extend(b'\n')
+            commands.line("INFORMATION MONNAIE")
             commands.extend(ESC_BOLD_OFF)
             commands.extend(ESC_LEFT)
-            commands.extend(b'=' * MAX_WIDTH)
-            commands.extend(b'\n')
+            commands.rule('=')
 
             if change_info.get('formatted_amount'):
-                commands.extend(encode_text(f"Montant: {change_info['formatted_amount']}"))
-                commands.extend(b'\n')
+                commands.line(f"Montant: {change_info['formatted_amount']}")
 
             if change_info.get('status_text'):
                 commands.extend(ESC_BOLD_ON)
-                commands.extend(encode_text(f"Statut: {change_info['status_text']}"))
-                commands.extend(b'\n')
+                commands.line(f"Statut: {change_info['status_text']}")
                 commands.extend(ESC_BOLD_OFF)
 
             if change_info.get('change_given') and change_info.get('change_given_at'):
-                commands.extend(encode_text(f"Rendue le: {change_info['change_given_at']}"))
-                commands.extend(b'\n')
+                commands.line(f"Rendue le: {change_info['change_given_at']}")
 
             if change_info.get('status') == 'pending':
-                commands.extend(b'\n')
+                commands.text('\n')
                 commands.extend(ESC_CENTER)
                 commands.extend(ESC_BOLD_ON)
-                commands.extend(encode_text("!!! ATTENTION !!!"))
-                commands.extend(b'\n')
-                commands.extend(encode_text("MONNAIE À RENDRE"))
-                commands.extend(b'\n')
+                commands.line("!!! ATTENTION !!!")
+                commands.line("MONNAIE À RENDRE")
                 commands.extend(ESC_BOLD_OFF)
                 commands.extend(ESC_LEFT)
 
-            commands.extend(b'=' * MAX_WIDTH)
-            commands.extend(b'\n')
+            commands.rule('=')
 
         if footer:
-            commands.extend(b'\n')
+            commands.text('\n')
             commands.extend(ESC_CENTER)
 
             if footer.get('thank_you_message'):
                 thank_you = footer['thank_you_message']
                 if len(thank_you) > MAX_WIDTH:
                     thank_you = thank_you[:MAX_WIDTH - 3] + '...'
-                commands.extend(encode_text(thank_you))
-                commands.extend(b'\n')
+                commands.line(thank_you)
 
             if footer.get('additional_message'):
                 add_msg = footer['additional_message']
                 if len(add_msg) > MAX_WIDTH:
                     add_msg = add_msg[:MAX_WIDTH - 3] + '...'
-                commands.extend(encode_text(add_msg))
-                commands.extend(b'\n')
+                commands.line(add_msg)
 
             if footer.get('website'):
                 website = footer['website']
                 if len(website) > MAX_WIDTH:
                     website = website[:MAX_WIDTH - 3] + '...'
-                commands.extend(encode_text(website))
-                commands.extend(b'\n')
+                commands.line(website)
 
-        commands.extend(b'\n\n\n')
-        commands.extend(get_robust_cut_command(printer_name))
+        commands.extend(profile.final_cut)
 
-        return commands
+        return commands.getvalue()
     except Exception as e:
         logger.error(f"Erreur lors du formatage du reçu: {e}")
         raise
@@ -581,18 +612,16 @@ def format_receipt(receipt_data, receipt_type="standard", printer_width=None, en
 # FORMATS CLASSIQUES (rétrocompatibilité)
 # ─────────────────────────────────────────────────────────────────────────────
 
-def format_standard_content(commands, receipt_data, max_width, article_width, currency, encode_text, decimals=0):
+def format_standard_content(commands, receipt_data, max_width, article_width, currency, decimals=0):
     """Format pour commande restaurant/bar"""
     items = receipt_data.get('items', [])
     eff_art_width = article_width - decimals
 
     if items:
         commands.extend(ESC_BOLD_ON)
-        commands.extend(encode_text("Art.  Qté Px    Total"))
-        commands.extend(b'\n')
+        commands.line("Art.  Qté Px    Total")
         commands.extend(ESC_BOLD_OFF)
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
+        commands.rule('-')
 
         total = 0
         for item in items:
@@ -608,18 +637,15 @@ def format_standard_content(commands, receipt_data, max_width, article_width, cu
             total     += item_total
 
             line = f"{name} {qty:2d} {_fmt(price, decimals):>7} {_fmt(item_total, decimals):>{7+decimals}}"
-            commands.extend(encode_text(line))
-            commands.extend(b'\n')
+            commands.line(line)
 
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
+        commands.rule('-')
         commands.extend(ESC_BOLD_ON)
-        commands.extend(encode_text(f"TOTAL:      {_fmt(total, decimals):>12} {currency}"))
-        commands.extend(b'\n')
+        commands.line(f"TOTAL:      {_fmt(total, decimals):>12} {currency}")
         commands.extend(ESC_BOLD_OFF)
 
 
-def format_hotel_content(commands, receipt_data, max_width, article_width, currency, encode_text, decimals=0):
+def format_hotel_content(commands, receipt_data, max_width, article_width, currency, decimals=0):
     """Format pour réservation hôtel"""
     stats  = receipt_data.get('stats', {})
     items  = receipt_data.get('items', [])
@@ -638,11 +664,9 @@ def format_hotel_content(commands, receipt_data, max_width, article_width, curre
 
     if accommodation_items:
         commands.extend(ESC_BOLD_ON)
-        commands.extend(encode_text("DÉTAILS HÉBERGEMENT"))
-        commands.extend(b'\n')
+        commands.line("DÉTAILS HÉBERGEMENT")
         commands.extend(ESC_BOLD_OFF)
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
+        commands.rule('-')
 
         room_total = 0
         for item in accommodation_items:
@@ -664,28 +688,22 @@ def format_hotel_content(commands, receipt_data, max_width, article_width, curre
                 if current_part:
                     name_parts.append(current_part.strip())
                 for idx, part in enumerate(name_parts):
-                    commands.extend(encode_text(("  " if idx > 0 else "") + part))
-                    commands.extend(b'\n')
+                    commands.line(("  " if idx > 0 else "") + part)
             else:
-                commands.extend(encode_text(name))
-                commands.extend(b'\n')
+                commands.line(name)
 
             price_line = f"  {qty} {item.get('quantity_unit', 'nuit(s)')} x {_fmt(price, decimals)} {currency}/nuit"
-            commands.extend(encode_text(price_line))
-            commands.extend(b'\n')
+            commands.line(price_line)
 
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
-        commands.extend(encode_text(f"Sous-total:  {_fmt(room_total, decimals):>12} {currency}"))
-        commands.extend(b'\n\n')
+        commands.rule('-')
+        commands.text(f"Sous-total:  {_fmt(room_total, decimals):>12} {currency}")
+        commands.text('\n\n')
 
     if food_items:
         commands.extend(ESC_BOLD_ON)
-        commands.extend(encode_text("RESTAURATION"))
-        commands.extend(b'\n')
+        commands.line("RESTAURATION")
         commands.extend(ESC_BOLD_OFF)
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
+        commands.rule('-')
 
         food_total = 0
         for item in food_items:
@@ -699,21 +717,17 @@ def format_hotel_content(commands, receipt_data, max_width, article_width, curre
             if len(line) > max_width:
                 name = name[:max_width - 20] + "..."
                 line = f"{name} ({qty}) {_fmt(item_total, decimals)} {currency}"
-            commands.extend(encode_text(line))
-            commands.extend(b'\n')
+            commands.line(line)
 
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
-        commands.extend(encode_text(f"Sous-total:  {_fmt(food_total, decimals):>12} {currency}"))
-        commands.extend(b'\n\n')
+        commands.rule('-')
+        commands.text(f"Sous-total:  {_fmt(food_total, decimals):>12} {currency}")
+        commands.text('\n\n')
 
     if other_items:
         commands.extend(ESC_BOLD_ON)
-        commands.extend(encode_text("EXTRAS"))
-        commands.extend(b'\n')
+        commands.line("EXTRAS")
         commands.extend(ESC_BOLD_OFF)
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
+        commands.rule('-')
 
         extras_total = 0
         for item in other_items:
@@ -727,29 +741,24 @@ def format_hotel_content(commands, receipt_data, max_width, article_width, curre
             if len(line) > max_width:
                 name = name[:max_width - 15] + "..."
                 line = f"{name}: {_fmt(item_total, decimals)} {currency}"
-            commands.extend(encode_text(line))
-            commands.extend(b'\n')
+            commands.line(line)
 
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
-        commands.extend(encode_text(f"Sous-total:  {_fmt(extras_total, decimals):>12} {currency}"))
-        commands.extend(b'\n\n')
+        commands.rule('-')
+        commands.text(f"Sous-total:  {_fmt(extras_total, decimals):>12} {currency}")
+        commands.text('\n\n')
 
     discount = stats.get('discount_amount', 0)
     if discount > 0:
-        commands.extend(encode_text(f"Remise:     -{_fmt(_sanitize_price(discount), decimals):>12} {currency}"))
-        commands.extend(b'\n')
+        commands.line(f"Remise:     -{_fmt(_sanitize_price(discount), decimals):>12} {currency}")
 
     total = sum(item.get('quantity', 1) * _sanitize_price(item.get('price', 0)) for item in items)
-    commands.extend(b'-' * max_width)
-    commands.extend(b'\n')
+    commands.rule('-')
     commands.extend(ESC_BOLD_ON)
-    commands.extend(encode_text(f"TOTAL:      {_fmt(total, decimals):>12} {currency}"))
-    commands.extend(b'\n')
+    commands.line(f"TOTAL:      {_fmt(total, decimals):>12} {currency}")
     commands.extend(ESC_BOLD_OFF)
 
 
-def format_mixed_content(commands, receipt_data, max_width, article_width, currency, encode_text, decimals=0):
+def format_mixed_content(commands, receipt_data, max_width, article_width, currency, decimals=0):
     """Format pour réservation hôtel + consommation restaurant/bar"""
     items = receipt_data.get('items', [])
 
@@ -774,11 +783,9 @@ def format_mixed_content(commands, receipt_data, max_width, article_width, curre
 
     if accommodation_items:
         commands.extend(ESC_BOLD_ON)
-        commands.extend(encode_text("HÉBERGEMENT"))
-        commands.extend(b'\n')
+        commands.line("HÉBERGEMENT")
         commands.extend(ESC_BOLD_OFF)
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
+        commands.rule('-')
 
         room_total = 0
         for item in accommodation_items:
@@ -800,34 +807,26 @@ def format_mixed_content(commands, receipt_data, max_width, article_width, curre
                 if current_part:
                     name_parts.append(current_part.strip())
                 for idx, part in enumerate(name_parts):
-                    commands.extend(encode_text(("  " if idx > 0 else "") + part))
-                    commands.extend(b'\n')
+                    commands.line(("  " if idx > 0 else "") + part)
             else:
-                commands.extend(encode_text(name))
-                commands.extend(b'\n')
+                commands.line(name)
 
             price_line = f"  {qty} {item.get('quantity_unit', 'nuit(s)')} x {_fmt(price, decimals)} {currency}/nuit"
-            commands.extend(encode_text(price_line))
-            commands.extend(b'\n')
+            commands.line(price_line)
 
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
-        commands.extend(encode_text(f"Hébergement: {_fmt(room_total, decimals):>12} {currency}"))
-        commands.extend(b'\n\n')
+        commands.rule('-')
+        commands.text(f"Hébergement: {_fmt(room_total, decimals):>12} {currency}")
+        commands.text('\n\n')
 
     if food_items or drink_items:
         commands.extend(ESC_BOLD_ON)
-        commands.extend(encode_text("CONSOMMATIONS"))
-        commands.extend(b'\n')
+        commands.line("CONSOMMATIONS")
         commands.extend(ESC_BOLD_OFF)
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
+        commands.rule('-')
         commands.extend(ESC_BOLD_ON)
-        commands.extend(encode_text("Art.  Qté Px    Total"))
-        commands.extend(b'\n')
+        commands.line("Art.  Qté Px    Total")
         commands.extend(ESC_BOLD_OFF)
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
+        commands.rule('-')
 
         food_total = 0
         for item in food_items:
@@ -837,8 +836,7 @@ def format_mixed_content(commands, receipt_data, max_width, article_width, curre
             price      = _sanitize_price(item.get('price', 0))
             item_total = qty * price
             food_total += item_total
-            commands.extend(encode_text(f"{name} {qty:2d} {_fmt(price, decimals):>7} {_fmt(item_total, decimals):>{7+decimals}}"))
-            commands.extend(b'\n')
+            commands.line(f"{name} {qty:2d} {_fmt(price, decimals):>7} {_fmt(item_total, decimals):>{7+decimals}}")
 
         drink_total = 0
         for item in drink_items:
@@ -848,22 +846,18 @@ def format_mixed_content(commands, receipt_data, max_width, article_width, curre
             price       = _sanitize_price(item.get('price', 0))
             item_total  = qty * price
             drink_total += item_total
-            commands.extend(encode_text(f"{name} {qty:2d} {_fmt(price, decimals):>7} {_fmt(item_total, decimals):>{7+decimals}}"))
-            commands.extend(b'\n')
+            commands.line(f"{name} {qty:2d} {_fmt(price, decimals):>7} {_fmt(item_total, decimals):>{7+decimals}}")
 
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
+        commands.rule('-')
         consumption_total = food_total + drink_total
-        commands.extend(encode_text(f"Consommation:{_fmt(consumption_total, decimals):>12} {currency}"))
-        commands.extend(b'\n\n')
+        commands.text(f"Consommation:{_fmt(consumption_total, decimals):>12} {currency}")
+        commands.text('\n\n')
 
     if other_items:
         commands.extend(ESC_BOLD_ON)
-        commands.extend(encode_text("EXTRAS"))
-        commands.extend(b'\n')
+        commands.line("EXTRAS")
         commands.extend(ESC_BOLD_OFF)
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
+        commands.rule('-')
 
         extras_total = 0
         for item in other_items:
@@ -876,19 +870,16 @@ def format_mixed_content(commands, receipt_data, max_width, article_width, curre
             if len(line) > max_width:
                 name = name[:max_width - 15] + "..."
                 line = f"{name}: {_fmt(item_total, decimals)} {currency}"
-            commands.extend(encode_text(line))
-            commands.extend(b'\n')
+            commands.line(line)
 
-        commands.extend(b'-' * max_width)
-        commands.extend(b'\n')
-        commands.extend(encode_text(f"Extras:      {_fmt(extras_total, decimals):>12} {currency}"))
-        commands.extend(b'\n\n')
+        commands.rule('-')
+        commands.text(f"Extras:      {_fmt(extras_total, decimals):>12} {currency}")
+        commands.text('\n\n')
 
     discount_items = [item for item in items if item.get('type') == 'discount']
     discount_total = sum(_sanitize_price(item.get('price', 0)) for item in discount_items)
     if discount_total != 0:
-        commands.extend(encode_text(f"Remise:     {_fmt(discount_total, decimals):>12} {currency}"))
-        commands.extend(b'\n')
+        commands.line(f"Remise:     {_fmt(discount_total, decimals):>12} {currency}")
 
     room_total        = sum(i.get('quantity', 1) * _sanitize_price(i.get('price', 0)) for i in accommodation_items)
     food_total        = sum(i.get('quantity', 1) * _sanitize_price(i.get('price', 0)) for i in food_items)
@@ -897,28 +888,20 @@ def format_mixed_content(commands, receipt_data, max_width, article_width, curre
     grand_total       = room_total + food_total + drink_total + extras_total + discount_total
 
     commands.extend(ESC_BOLD_ON)
-    commands.extend(encode_text("RÉCAPITULATIF"))
-    commands.extend(b'\n')
+    commands.line("RÉCAPITULATIF")
     commands.extend(ESC_BOLD_OFF)
-    commands.extend(b'-' * max_width)
-    commands.extend(b'\n')
+    commands.rule('-')
 
     if room_total > 0:
-        commands.extend(encode_text(f"Hébergement: {_fmt(room_total, decimals):>12} {currency}"))
-        commands.extend(b'\n')
+        commands.line(f"Hébergement: {_fmt(room_total, decimals):>12} {currency}")
     if food_total > 0 or drink_total > 0:
-        commands.extend(encode_text(f"Consommation:{_fmt(food_total+drink_total, decimals):>12} {currency}"))
-        commands.extend(b'\n')
+        commands.line(f"Consommation:{_fmt(food_total+drink_total, decimals):>12} {currency}")
     if extras_total > 0:
-        commands.extend(encode_text(f"Extras:      {_fmt(extras_total, decimals):>12} {currency}"))
-        commands.extend(b'\n')
+        commands.line(f"Extras:      {_fmt(extras_total, decimals):>12} {currency}")
     if discount_total != 0:
-        commands.extend(encode_text(f"Remise:      {_fmt(discount_total, decimals):>12} {currency}"))
-        commands.extend(b'\n')
+        commands.line(f"Remise:      {_fmt(discount_total, decimals):>12} {currency}")
 
-    commands.extend(b'-' * max_width)
-    commands.extend(b'\n')
+    commands.rule('-')
     commands.extend(ESC_BOLD_ON)
-    commands.extend(encode_text(f"TOTAL:      {_fmt(grand_total, decimals):>12} {currency}"))
-    commands.extend(b'\n')
+    commands.line(f"TOTAL:      {_fmt(grand_total, decimals):>12} {currency}")
     commands.extend(ESC_BOLD_OFF)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Registre des imprimantes en memoire.
+
+L'enumeration complete (spouleur Windows + detection de largeur + scan des
+ports COM) est couteuse : elle n'est plus executee a chaque impression mais
+uniquement au demarrage, periodiquement en arriere-plan, ou a la demande
+(GET /printers?refresh=1). Les recherches par id ou par nom sont en O(1).
+"""
+
+import threading
+import time
+from utils.config import logger, config
+
+
+class PrinterRegistry:
+    """Cache thread-safe de la liste retournee par get_printers()."""
+
+    def __init__(self, loader=None, refresh_interval=None):
+        """
+        Args:
+            loader (callable): fonction d'enumeration (defaut: get_printers)
+            refresh_interval (int): intervalle de rafraichissement en secondes
+                                    (defaut: config 'printer_refresh_interval')
+        """
+        self._loader = loader
+        self._refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # une seule enumeration a la fois
+        self._printers = []
+        self._by_id = {}
+        self._by_name = {}
+        self._loaded_at = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # -- Chargement -----------------------------------------------------------
+
+    def _load(self):
+        if self._loader is None:
+            from printer.printer_utils import get_printers
+            return get_printers()
+        return self._loader()
+
+    def refresh(self):
+        """Re-enumere les imprimantes et remplace le cache. Retourne la nouvelle liste."""
+        with self._refresh_lock:
+            return self._refresh_locked()
+
+    def _refresh_locked(self):
+        """Enumeration effective, appelee avec _refresh_lock."""
+        started = time.time()
+        printers = self._load()
+        by_id = {p['id']: p for p in printers}
+        by_name = {p['name']: p for p in printers}
+        with self._lock:
+            self._printers = printers
+            self._by_id = by_id
+            self._by_name = by_name
+            self._loaded_at = time.time()
+        logger.info(f"Registre imprimantes rafraichi: {len(printers)} imprimantes "
+                    f"en {(time.time() - started) * 1000:.0f} ms")
+        return printers
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None:
+            with self._refresh_lock:
+                # Les appelants concurrents attendent la premiere enumeration
+                # au lieu de la relancer chacun
+                if self._loaded_at is None:
+                    self._refresh_locked()
+
+    # -- Consultation ---------------------------------------------------------
+
+    def get_all(self, refresh=False):
+        """Retourne la liste des imprimantes (copie de la liste, entrees partagees)."""
+        if refresh:
+            return list(self.refresh())
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._printers)
+
+    def get_by_id(self, printer_id):
+        """Retourne l'entree de l'imprimante `printer_id`, ou None si inconnue."""
+        self._ensure_loaded()
+        with self._lock:
+            return self._by_id.get(printer_id)
+
+    def get_by_name(self, printer_name):
+        """Retourne l'entree de l'imprimante nommee `printer_name`, ou None si inconnue."""
+        self._ensure_loaded()
+        with self._lock:
+            return self._by_name.get(printer_name)
+
+    @property
+    def loaded_at(self):
+        return self._loaded_at
+
+    # -- Rafraichissement en arriere-plan -------------------------------------
+
+    def _interval(self):
+        if self._refresh_interval is not None:
+            return self._refresh_interval
+        return config.get('printer_refresh_interval', 60)
+
+    def start_background_refresh(self):
+        """Demarre le thread de rafraichissement periodique (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        if self._interval() <= 0:
+            logger.info("Rafraichissement automatique des imprimantes desactive")
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._refresh_loop,
+                                        name='printer-registry', daemon=True)
+        self._thread.start()
+
+    def stop_background_refresh(self):
+        self._stop_event.set()
+
+    def _refresh_loop(self):
+        while not self._stop_event.wait(self._interval()):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Erreur rafraichissement registre imprimantes: {e}")
+
+
+# Instance partagee par l'API
+printer_registry = PrinterRegistry()
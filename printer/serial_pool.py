@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Ports COM persistants vers les imprimantes serie / Bluetooth SPP.
+
+Sous Windows, ouvrir le port COM virtuel d'une imprimante Bluetooth declenche
+une connexion RFCOMM complete (plusieurs secondes). Le port est donc conserve
+ouvert d'un ticket a l'autre (sauf si 'serial_keepalive' est desactive),
+comme les connexions TCP de network_pool :
+  - verification du port avant chaque envoi (imprimante eteinte, hors de portee)
+  - reouverture automatique si le port reutilise s'est deconnecte pendant
+    l'envoi (un delai d'ecriture depasse sur un port vivant n'est pas renvoye)
+  - fermeture des ports inactifs apres 'serial_idle_timeout' secondes : un port
+    COM ouvert est exclusif, les autres applications y ont de nouveau acces
+
+Les gros travaux (logos) sont ecrits par blocs de 'serial_chunk_size' octets,
+au rythme du debit du lien ('serial_pacing' : 10 bits par octet en 8N1) pour ne
+pas saturer le tampon des petites imprimantes ; le delai d'ecriture s'applique
+a chaque bloc et non au travail entier. Controle de flux optionnel
+('serial_flow_control' : xonxoff, dsrdtr ou rtscts).
+
+Debit : sans 'baudrate' configure pour l'imprimante, le debit le plus rapide
+auquel elle repond a DLE EOT 1 ('serial_baud_candidates') est recherche une
+fois puis memorise par port dans SERIAL_PORTS_FILE ('serial_baud_probe').
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from utils.config import logger, config, SERIAL_PORTS_FILE
+from printer.network_pool import DLE_EOT_PRINTER_STATUS
+
+
+FLOW_CONTROL_NONE = 'none'
+FLOW_CONTROL_XONXOFF = 'xonxoff'
+FLOW_CONTROL_DSRDTR = 'dsrdtr'
+FLOW_CONTROL_RTSCTS = 'rtscts'
+FLOW_CONTROLS = (FLOW_CONTROL_NONE, FLOW_CONTROL_XONXOFF, FLOW_CONTROL_DSRDTR, FLOW_CONTROL_RTSCTS)
+
+DEFAULT_BAUDRATE = 9600  # standard des imprimantes thermiques serie / BT
+DEFAULT_BAUD_CANDIDATES = (115200, 57600, 38400, 19200, 9600)
+
+
+def _flow_control_settings(flow_control):
+    """Parametres pyserial d'un mode de controle de flux."""
+    if flow_control not in FLOW_CONTROLS:
+        logger.warning(f"Controle de flux '{flow_control}' inconnu, desactive")
+        flow_control = FLOW_CONTROL_NONE
+    return {
+        'xonxoff': flow_control == FLOW_CONTROL_XONXOFF,
+        'dsrdtr': flow_control == FLOW_CONTROL_DSRDTR,
+        'rtscts': flow_control == FLOW_CONTROL_RTSCTS,
+    }
+
+
+def _is_write_timeout(error):
+    """True pour un delai d'ecriture depasse (serial.SerialTimeoutException)."""
+    import serial
+    return isinstance(error, serial.SerialTimeoutException)
+
+
+class _PooledPort:
+    """Port serie persistant, protege par son propre verrou."""
+
+    def __init__(self, port):
+        self.port = port
+        self.ser = None
+        self.last_used = 0.0
+        self.lock = threading.Lock()
+
+    def open(self, baudrate, timeout, flow_settings):
+        import serial
+        self.ser = serial.Serial(self.port, baudrate=baudrate, timeout=timeout, write_timeout=timeout,
+                                 **flow_settings)
+        logger.info(f"Port COM {self.port} ouvert ({baudrate} bauds)")
+
+    def configure(self, baudrate, timeout, flow_settings):
+        """Applique debit, delai et controle de flux au port deja ouvert (sans le rouvrir)."""
+        if self.ser.baudrate != baudrate:
+            self.ser.baudrate = baudrate
+        for name, value in flow_settings.items():
+            if getattr(self.ser, name) != value:
+                setattr(self.ser, name, value)
+        self.ser.write_timeout = timeout
+
+    def write_chunked(self, view, baudrate, progress):
+        """Ecrit view par blocs, au rythme du lien si 'serial_pacing'."""
+        total = len(view)
+        chunk_size = config.get('serial_chunk_size', 1024) or total
+        pacing = config.get('serial_pacing', True)
+        seconds_per_byte = 10.0 / baudrate  # 8N1 : bit de start + 8 bits + bit de stop
+        offset, started = 0, time.monotonic()
+        while offset < total:
+            end = min(offset + chunk_size, total)
+            self.ser.write(view[offset:end])
+            offset = end
+            if progress is not None:
+                progress(offset, total)
+            if pacing and offset < total:
+                delay = started + offset * seconds_per_byte - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        self.ser.flush()
+
+    def query_status(self, timeout, status_request=DLE_EOT_PRINTER_STATUS):
+        """
+        Envoie une requete DLE EOT n et retourne l'octet d'etat, ou None si la
+        reponse est absente ou invalide (bits fixes : 1 et 4 a 1, 0 et 7 a 0 ;
+        un debit errone donne des octets parasites).
+        """
+        self.ser.reset_input_buffer()
+        self.ser.timeout = timeout
+        self.ser.write(status_request)
+        self.ser.flush()
+        reply = self.ser.read(1)
+        if len(reply) == 1 and reply[0] & 0x93 == 0x12:
+            return reply[0]
+        return None
+
+    def close(self):
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except (OSError, ValueError):
+                pass
+            self.ser = None
+
+    def is_alive(self):
+        """
+        Verifie le port sans bloquer : False si le peripherique a disparu
+        (connexion Bluetooth perdue). Les octets recus (etats tardifs) sont ignores.
+        """
+        try:
+            if not self.ser.is_open:
+                return False
+            if self.ser.in_waiting:
+                self.ser.reset_input_buffer()
+            return True
+        except (OSError, ValueError):
+            return False
+
+
+class SerialPortPool:
+    """Ports COM persistants indexes par nom de port."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ports = {}
+        self._reaper = None
+        # Debits negocies : {port: {'baudrate', 'probed_at'}}, charge au premier appel
+        self._baudrates = None
+        # Ports sans reponse a la recherche de debit (pas de nouvel essai avant redemarrage)
+        self._probe_failed = set()
+
+    def _get(self, port):
+        with self._lock:
+            pooled = self._ports.get(port)
+            if pooled is None:
+                pooled = _PooledPort(port)
+                self._ports[port] = pooled
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_idle,
+                                                name='serial-pool-reaper', daemon=True)
+                self._reaper.start()
+        return pooled
+
+    def _load_baudrates(self):
+        if self._baudrates is None:
+            self._baudrates = {}
+            try:
+                if os.path.exists(SERIAL_PORTS_FILE):
+                    with open(SERIAL_PORTS_FILE, 'r', encoding='utf-8') as f:
+                        self._baudrates = json.load(f)
+            except Exception as e:
+                logger.warning(f"Cache des debits COM illisible, il sera reconstruit: {e}")
+        return self._baudrates
+
+    def _save_baudrates(self):
+        try:
+            tmp_file = SERIAL_PORTS_FILE + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._baudrates, f, indent=2)
+            os.replace(tmp_file, SERIAL_PORTS_FILE)
+        except Exception as e:
+            logger.warning(f"Impossible d'enregistrer le cache des debits COM: {e}")
+
+    def get_baudrate(self, port):
+        """Debit memorise pour un port, ou None s'il n'a pas ete recherche."""
+        with self._lock:
+            entry = self._load_baudrates().get(port)
+        return entry['baudrate'] if entry else None
+
+    def probe_baudrate(self, port, candidates=None, timeout=0.5):
+        """
+        Essaie les debits du plus rapide au plus lent avec une requete DLE EOT 1
+        et memorise le premier auquel l'imprimante repond.
+
+        Returns:
+            int: debit trouve, ou None si l'imprimante ne repond a aucun
+        """
+        candidates = sorted(candidates or config.get('serial_baud_candidates', DEFAULT_BAUD_CANDIDATES),
+                            reverse=True)
+        flow_settings = _flow_control_settings(config.get('serial_flow_control', FLOW_CONTROL_NONE))
+        found = None
+        pooled = self._get(port)
+        with pooled.lock:
+            try:
+                for baudrate in candidates:
+                    if pooled.ser is None:
+                        pooled.open(baudrate, timeout, flow_settings)
+                    else:
+                        pooled.configure(baudrate, timeout, flow_settings)
+                    if pooled.query_status(timeout) is not None:
+                        found = baudrate
+                        break
+            except OSError as e:
+                logger.warning(f"Recherche du debit COM {port} interrompue: {e}")
+                pooled.close()
+            pooled.last_used = time.time()
+            if not config.get('serial_keepalive', True):
+                pooled.close()
+
+        with self._lock:
+            if found is None:
+                self._probe_failed.add(port)
+                logger.warning(f"Port COM {port}: aucune reponse DLE EOT ({candidates}), "
+                               f"{DEFAULT_BAUDRATE} bauds utilises")
+                return None
+            self._probe_failed.discard(port)
+            self._load_baudrates()[port] = {
+                'baudrate': found,
+                'probed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            self._save_baudrates()
+        logger.info(f"Port COM {port}: debit {found} bauds memorise")
+        return found
+
+    def resolve_baudrate(self, port):
+        """
+        Debit d'un port sans debit configure : debit memorise, sinon recherche
+        (une seule fois par port si l'imprimante ne repond pas), sinon 9600.
+        """
+        baudrate = self.get_baudrate(port)
+        if baudrate is None and config.get('serial_baud_probe', True):
+            with self._lock:
+                failed = port in self._probe_failed
+            if not failed:
+                baudrate = self.probe_baudrate(port)
+        return baudrate or DEFAULT_BAUDRATE
+
+    def query(self, port, requests, timeout=1.0):
+        """
+        Requetes d'etat temps reel (DLE EOT n) sur le port deja ouvert de
+        l'imprimante. Le port n'est jamais ouvert pour l'occasion : sur un port
+        Bluetooth, l'ouverture est une connexion RFCOMM de plusieurs secondes.
+        Les requetes s'arretent a la premiere restee sans reponse.
+
+        Returns:
+            list: octet de reponse par requete envoyee (None si absent ou invalide),
+                  ou None si le port est ferme ou si un envoi est en cours
+        Leve OSError si le port est deconnecte.
+        """
+        pooled = self._get(port)
+        if not pooled.lock.acquire(blocking=False):
+            return None
+        try:
+            if pooled.ser is None:
+                return None
+            if not pooled.is_alive():
+                pooled.close()
+                raise ConnectionError(f"port {port} deconnecte")
+            replies = []
+            try:
+                for status_request in requests:
+                    replies.append(pooled.query_status(timeout, status_request))
+                    if replies[-1] is None:
+                        break
+            except OSError:
+                pooled.close()
+                raise
+            return replies
+        finally:
+            pooled.lock.release()
+
+    def is_open(self, port):
+        """True si le port est actuellement ouvert par le pool."""
+        with self._lock:
+            pooled = self._ports.get(port)
+        return pooled is not None and pooled.ser is not None
+
+    def send(self, port, data, baudrate=None, timeout=5, flow_control=None, progress=None):
+        """
+        Envoie les donnees sur le port persistant (reouverture si besoin).
+        Leve OSError (serial.SerialException) si l'envoi echoue apres reouverture,
+        ou sans renvoi si le port est toujours present (delai d'ecriture depasse).
+
+        Args:
+            baudrate (int): debit du port (defaut: resolve_baudrate)
+            flow_control (str): 'none', 'xonxoff', 'dsrdtr' ou 'rtscts'
+                                (defaut: config 'serial_flow_control')
+            progress (callable): progress(octets_envoyes, total) apres chaque bloc
+        """
+        baudrate = baudrate or self.resolve_baudrate(port)
+        flow_settings = _flow_control_settings(
+            flow_control or config.get('serial_flow_control', FLOW_CONTROL_NONE))
+        view = memoryview(data)
+        pooled = self._get(port)
+        with pooled.lock:
+            if pooled.ser is not None and not pooled.is_alive():
+                logger.info(f"Port COM {port} deconnecte, reouverture")
+                pooled.close()
+
+            # Une seule nouvelle tentative, et seulement si le port reutilise
+            # s'est deconnecte : une imprimante injoignable ne coute qu'une ouverture
+            retry = pooled.ser is not None
+            while True:
+                try:
+                    if pooled.ser is None:
+                        pooled.open(baudrate, timeout, flow_settings)
+                    else:
+                        pooled.configure(baudrate, timeout, flow_settings)
+                    pooled.write_chunked(view, baudrate, progress)
+                    break
+                except OSError as e:
+                    # Delai d'ecriture depasse (controle de flux bloque, tampon plein,
+                    # bourrage) ou autre erreur sur un port toujours present : ce qui
+                    # a atteint l'imprimante serait imprime deux fois, pas de renvoi
+                    disconnected = (retry and pooled.ser is not None
+                                    and not _is_write_timeout(e) and not pooled.is_alive())
+                    pooled.close()
+                    if not disconnected:
+                        raise
+                    retry = False
+                    # Travail renvoye en entier : write() rend la main des que les octets
+                    # sont dans le tampon du systeme, les blocs "ecrits" avant la coupure
+                    # ont pu etre perdus, et une reprise en cours de route pourrait tomber
+                    # au milieu d'une bande raster (imprimee comme du texte)
+                    logger.warning(f"Envoi COM {port} echoue ({e}), reouverture et renvoi complet")
+
+            pooled.last_used = time.time()
+            if not config.get('serial_keepalive', True):
+                pooled.close()
+
+    def _reap_idle(self):
+        while True:
+            idle_timeout = config.get('serial_idle_timeout', 30)
+            time.sleep(max(1.0, idle_timeout / 2))
+            now = time.time()
+            with self._lock:
+                ports = list(self._ports.values())
+            for pooled in ports:
+                if pooled.ser is None or now - pooled.last_used < idle_timeout:
+                    continue
+                if pooled.lock.acquire(blocking=False):
+                    try:
+                        logger.info(f"Fermeture du port COM inactif {pooled.port}")
+                        pooled.close()
+                    finally:
+                        pooled.lock.release()
+
+    def close_all(self):
+        """Ferme tous les ports ouverts."""
+        with self._lock:
+            ports = list(self._ports.values())
+        for pooled in ports:
+            with pooled.lock:
+                pooled.close()
+
+
+# Instance partagee par print_raw_com et print_via_com_port
+serial_pool = SerialPortPool()
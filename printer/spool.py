@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Journal durable des travaux d'impression (spool sur disque).
+
+Chaque travail accepte par l'API est ajoute en fin de journal (une ligne JSON,
+une seule ecriture sequentielle) avant d'etre place en file ; sa fin est
+notee par une seconde ligne. Au redemarrage du service, les travaux sans
+ligne de fin sont rejoues : aucun ticket de commande n'est perdu.
+
+  - ecriture : write() + flush() a chaque travail (survit a un arret du processus)
+  - fsync groupe : un thread synchronise le fichier toutes les
+    'spool_fsync_interval' secondes (survit a une coupure de courant, a
+    l'intervalle pres)
+  - compaction : quand 'spool_compact_threshold' travaux sont termines, le
+    journal est reecrit avec les seuls travaux en attente
+
+Un travail interrompu pendant l'envoi est rejoue en entier (au moins une fois).
+Un travail de groupe reporte sur un autre membre est reenregistre avec sa
+nouvelle imprimante : la derniere ligne 'add' d'un travail fait foi.
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+from utils.config import logger, config, SPOOL_FILE
+
+
+class PrintSpool:
+    """Journal en ajout seul des travaux acceptes et termines."""
+
+    def __init__(self, path=None):
+        self.path = path or SPOOL_FILE
+        self._lock = threading.Lock()
+        self._file = None
+        self._pending = {}      # job_id -> ligne 'add' du journal
+        self._finished = 0      # lignes 'end' depuis la derniere compaction
+        self._dirty = False
+        self._syncer = None
+
+    # -- Ouverture et relecture ----------------------------------------------
+
+    def open(self):
+        """
+        Relit le journal et l'ouvre en ajout.
+
+        Returns:
+            list: travaux non termines, dans l'ordre d'acceptation (dicts 'id',
+                  'printer_info', 'data' (bytes), 'meta', 'callback_url', 'group',
+                  'attempts', 'created_at')
+        """
+        with self._lock:
+            if self._file is not None:
+                return []
+            self._pending = self._read_pending()
+            # Repartir d'un journal compact : seuls les travaux a rejouer
+            self._rewrite()
+            if self._syncer is None:
+                self._syncer = threading.Thread(target=self._sync_loop, name='spool-sync', daemon=True)
+                self._syncer.start()
+            records = [self._decode(line) for line in self._pending.values()]
+        if records:
+            logger.info(f"Journal d'impression: {len(records)} travail(aux) non termine(s) a rejouer")
+        return records
+
+    @staticmethod
+    def _decode(line):
+        record = json.loads(line)
+        record['data'] = base64.b64decode(record['data'])
+        return record
+
+    def _read_pending(self):
+        pending = {}
+        if not os.path.exists(self.path):
+            return pending
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Derniere ligne tronquee par un arret brutal
+                    logger.warning(f"Journal d'impression: ligne {number} illisible ignoree")
+                    continue
+                if record.get('op') == 'add':
+                    pending[record['id']] = line.rstrip('\n')
+                elif record.get('op') == 'end':
+                    pending.pop(record.get('id'), None)
+        return pending
+
+    # -- Ecriture ------------------------------------------------------------
+
+    def append(self, job):
+        """
+        Enregistre un travail accepte (avant sa mise en file), ou le reenregistre
+        apres une bascule (nouvelle imprimante, membres deja essayes).
+        """
+        line = json.dumps({
+            'op': 'add',
+            'id': job.id,
+            'printer_info': job.printer_info,
+            'data': base64.b64encode(job.data).decode('ascii'),
+            'meta': job.meta,
+            'callback_url': job.callback_url,
+            'group': job.group,
+            'attempts': job.attempts,
+            'created_at': job.created_at,
+        }, ensure_ascii=False)
+        with self._lock:
+            self._write(line)
+            self._pending[job.id] = line
+
+    def mark_finished(self, job):
+        """Note la fin d'un travail (imprime ou en echec) : il ne sera pas rejoue."""
+        line = json.dumps({'op': 'end', 'id': job.id, 'status': job.status})
+        with self._lock:
+            if self._pending.pop(job.id, None) is None:
+                return
+            self._write(line)
+            self._finished += 1
+
+    def _write(self, line):
+        if self._file is None:
+            return
+        self._file.write(line + '\n')
+        self._file.flush()
+        self._dirty = True
+
+    # -- Synchronisation et compaction --------------------------------------
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(max(0.005, config.get('spool_fsync_interval', 0.05)))
+            with self._lock:
+                journal, dirty = self._file, self._dirty
+                self._dirty = False
+                compact = self._finished >= config.get('spool_compact_threshold', 200)
+            if journal is None:
+                continue
+            try:
+                # fsync hors verrou : les ajouts concurrents ne sont pas bloques
+                if dirty:
+                    os.fsync(journal.fileno())
+                if compact:
+                    with self._lock:
+                        if self._file is not None:
+                            self._rewrite()
+            except (OSError, ValueError) as e:
+                logger.error(f"Journal d'impression: erreur de synchronisation: {e}")
+
+    def _rewrite(self):
+        """Reecrit le journal avec les seuls travaux en attente (verrou tenu)."""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for line in self._pending.values():
+                f.write(line + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        if self._file is not None:
+            self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._finished = 0
+        self._dirty = False
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        """Synchronise et ferme le journal."""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
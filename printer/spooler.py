@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Handles persistants vers le spouleur Windows (imprimantes USB, BT avec pilote).
+
+OpenPrinter / ClosePrinter ne sont plus appeles a chaque ticket : le handle
+d'une imprimante est conserve ('spooler_keep_handle') et referme apres
+'spooler_idle_timeout' secondes d'inactivite, comme les connexions de
+network_pool et serial_pool. Plusieurs recus en attente pour une meme
+imprimante sont ecrits dans un seul document RAW (voir JobManager).
+
+Les appels au spouleur passent par un backend interchangeable (Win32Spooler
+par defaut) : SpoolerPool(backend=...) accepte tout objet fournissant
+open_printer(nom) -> handle, close_printer(handle), start_doc(handle, titre),
+end_doc(handle) et write(handle, donnees), par exemple un faux spouleur hors
+Windows.
+"""
+
+import threading
+import time
+from utils.config import logger, config
+
+
+DOC_TITLE = "Impression Hotelia"
+
+
+class Win32Spooler:
+    """Backend win32print (pywin32)."""
+
+    def __init__(self):
+        import win32print
+        self._win32print = win32print
+
+    def open_printer(self, printer_name):
+        return self._win32print.OpenPrinter(printer_name)
+
+    def close_printer(self, handle):
+        self._win32print.ClosePrinter(handle)
+
+    def start_doc(self, handle, title):
+        self._win32print.StartDocPrinter(handle, 1, (title, None, "RAW"))
+        self._win32print.StartPagePrinter(handle)
+
+    def end_doc(self, handle):
+        try:
+            self._win32print.EndPagePrinter(handle)
+        finally:
+            self._win32print.EndDocPrinter(handle)
+
+    def write(self, handle, data):
+        self._win32print.WritePrinter(handle, data)
+
+
+class _PooledHandle:
+    """Handle d'imprimante persistant, protege par son propre verrou."""
+
+    def __init__(self, printer_name):
+        self.printer_name = printer_name
+        self.handle = None
+        self.last_used = 0.0
+        self.lock = threading.Lock()
+
+
+class SpoolerPool:
+    """Handles du spouleur indexes par nom d'imprimante."""
+
+    def __init__(self, backend=None):
+        """
+        Args:
+            backend: acces au spouleur (defaut: Win32Spooler, cree au premier envoi)
+        """
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._handles = {}
+        self._reaper = None
+
+    def _get_backend(self):
+        if self._backend is None:
+            self._backend = Win32Spooler()
+        return self._backend
+
+    def _get(self, printer_name):
+        with self._lock:
+            pooled = self._handles.get(printer_name)
+            if pooled is None:
+                pooled = _PooledHandle(printer_name)
+                self._handles[printer_name] = pooled
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_idle,
+                                                name='spooler-pool-reaper', daemon=True)
+                self._reaper.start()
+        return pooled
+
+    def _close(self, pooled):
+        if pooled.handle is not None:
+            try:
+                self._get_backend().close_printer(pooled.handle)
+            except Exception as e:
+                logger.debug(f"Fermeture du handle {pooled.printer_name}: {e}")
+            pooled.handle = None
+
+    def send(self, printer_name, documents, title=DOC_TITLE):
+        """
+        Ecrit un ou plusieurs recus dans un seul document RAW.
+        Leve l'exception du spouleur si l'envoi echoue apres reouverture du handle.
+
+        Args:
+            documents (list): donnees ESC/POS de chaque recu, dans l'ordre
+        """
+        backend = self._get_backend()
+        pooled = self._get(printer_name)
+        with pooled.lock:
+            # Une seule nouvelle tentative, et seulement si le handle reutilise est
+            # refuse a l'ouverture du document (imprimante renommee, spouleur
+            # redemarre...) : un document deja commence n'est jamais reimprime
+            retry = pooled.handle is not None
+            while True:
+                started = False
+                try:
+                    if pooled.handle is None:
+                        pooled.handle = backend.open_printer(printer_name)
+                    backend.start_doc(pooled.handle, title)
+                    started = True
+                    try:
+                        for data in documents:
+                            backend.write(pooled.handle, data)
+                    finally:
+                        backend.end_doc(pooled.handle)
+                    break
+                except Exception as e:
+                    self._close(pooled)
+                    if not retry or started:
+                        raise
+                    retry = False
+                    logger.warning(f"Envoi spouleur {printer_name} echoue ({e}), reouverture du handle")
+
+            pooled.last_used = time.time()
+            if not config.get('spooler_keep_handle', True):
+                self._close(pooled)
+
+    def _reap_idle(self):
+        while True:
+            idle_timeout = config.get('spooler_idle_timeout', 60)
+            time.sleep(max(1.0, idle_timeout / 2))
+            now = time.time()
+            with self._lock:
+                handles = list(self._handles.values())
+            for pooled in handles:
+                if pooled.handle is None or now - pooled.last_used < idle_timeout:
+                    continue
+                if pooled.lock.acquire(blocking=False):
+                    try:
+                        logger.info(f"Fermeture du handle inactif {pooled.printer_name}")
+                        self._close(pooled)
+                    finally:
+                        pooled.lock.release()
+
+    def close_all(self):
+        """Ferme tous les handles ouverts."""
+        with self._lock:
+            handles = list(self._handles.values())
+        for pooled in handles:
+            with pooled.lock:
+                self._close(pooled)
+
+
+# Instance partagee par print_raw et les files d'impression
+spooler_pool = SpoolerPool()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Etat temps reel des imprimantes reseau et COM (DLE EOT n).
+
+Un thread interroge periodiquement ('status_poll_interval' secondes) les
+imprimantes du registre joignables directement (connection_type 'network' et
+'bluetooth_com') ; les imprimantes du spouleur Windows ne sont pas interrogees.
+Les requetes passent par les connexions des pools : une imprimante en cours
+d'impression n'est pas interrompue (son etat precedent est conserve).
+
+  - DLE EOT 1 : en ligne / hors ligne
+  - DLE EOT 2 : cause de la mise hors ligne (capot ouvert, fin de papier, erreur)
+  - DLE EOT 3 : cause de l'erreur (massicot, erreur irrecuperable...)
+  - DLE EOT 4 : capteurs de papier (fin proche, fin de rouleau)
+
+Les travaux destines a une imprimante en defaut sont mis en pause (ou bascules
+vers un autre membre du groupe) au lieu d'epuiser les delais d'envoi.
+"""
+
+import threading
+import time
+from datetime import datetime
+from utils.config import logger, config
+
+
+DLE_EOT_OFFLINE_CAUSE = b'\x10\x04\x02'  # DLE EOT 2 - cause de la mise hors ligne
+DLE_EOT_ERROR_CAUSE = b'\x10\x04\x03'    # DLE EOT 3 - cause de l'erreur
+DLE_EOT_PAPER_SENSOR = b'\x10\x04\x04'   # DLE EOT 4 - capteurs de papier
+
+STATE_READY = 'ready'
+STATE_OFFLINE = 'offline'
+STATE_COVER_OPEN = 'cover_open'
+STATE_PAPER_OUT = 'paper_out'
+STATE_ERROR = 'error'
+STATE_UNREACHABLE = 'unreachable'  # requete impossible (port occupe...) : ne bloque pas les travaux
+STATE_UNKNOWN = 'unknown'  # pas de reponse DLE EOT (non supporte par l'imprimante)
+
+# Connexions interrogeables directement (sans passer par le spouleur)
+POLLED_CONNECTIONS = ('network', 'bluetooth_com')
+
+_PAUSE_POLL_STEP = 2.0  # intervalle des verifications d'une imprimante en pause (secondes)
+
+
+def decode_status(replies):
+    """
+    Interprete les reponses a DLE EOT 1, 2, 3 et 4 (None si absente ; les
+    requetes non envoyees apres une absence de reponse peuvent manquer).
+
+    Returns:
+        dict: 'state', 'ready', 'online', 'cover_open', 'paper' ('ok', 'near_end',
+              'out'), 'error' ; None pour une information non disponible
+    """
+    printer, offline, error, paper = (list(replies) + [None] * 4)[:4]
+    status = {'online': None, 'cover_open': None, 'paper': None, 'error': None}
+    if printer is None:
+        status.update(state=STATE_UNKNOWN, ready=True)
+        return status
+
+    status['online'] = not printer & 0x08
+    if offline is not None:
+        status['cover_open'] = bool(offline & 0x04)
+        status['error'] = bool(offline & 0x40)
+        if offline & 0x20:  # impression arretee par la fin du papier
+            status['paper'] = 'out'
+    if error is not None:
+        # Massicot (bit 3), erreur irrecuperable (bit 5), erreur recuperable (bit 6)
+        status['error'] = bool(status['error']) or bool(error & 0x68)
+    if paper is not None and status['paper'] is None:
+        status['paper'] = 'out' if paper & 0x60 else 'near_end' if paper & 0x0C else 'ok'
+
+    if status['cover_open']:
+        state = STATE_COVER_OPEN
+    elif status['paper'] == 'out':
+        state = STATE_PAPER_OUT
+    elif status['error']:
+        state = STATE_ERROR
+    elif not status['online']:
+        state = STATE_OFFLINE
+    else:
+        state = STATE_READY
+    status.update(state=state, ready=state == STATE_READY)
+    return status
+
+
+def is_blocking(status):
+    """
+    True si l'etat signale un defaut de l'imprimante elle-meme (papier, capot,
+    erreur, hors ligne). Un etat inconnu ou une requete impossible (port 9100
+    tenu par un autre client, port COM occupe...) ne retient pas les travaux.
+    """
+    return status is not None and not status['ready'] and status['state'] != STATE_UNREACHABLE
+
+
+class PrinterStatusMonitor:
+    """Cache de l'etat des imprimantes, rafraichi en arriere-plan."""
+
+    def __init__(self, registry=None):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._states = {}  # printer_key -> etat (voir decode_status)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _get_registry(self):
+        if self._registry is None:
+            from printer.registry import printer_registry
+            return printer_registry
+        return self._registry
+
+    @staticmethod
+    def supports(printer_info):
+        return printer_info.get('connection_type', 'usb') in POLLED_CONNECTIONS
+
+    @staticmethod
+    def _query(printer_info, timeout):
+        """Reponses brutes a DLE EOT 1..4, ou None si un envoi est en cours."""
+        from printer.network_pool import DLE_EOT_PRINTER_STATUS
+        requests = (DLE_EOT_PRINTER_STATUS, DLE_EOT_OFFLINE_CAUSE,
+                    DLE_EOT_ERROR_CAUSE, DLE_EOT_PAPER_SENSOR)
+        if printer_info.get('connection_type') == 'network':
+            from printer.network_pool import network_pool
+            ip = printer_info.get('ip') or printer_info.get('network_ip')
+            return network_pool.query(ip, requests, tcp_port=printer_info.get('tcp_port', 9100),
+                                      timeout=timeout)
+        from printer.serial_pool import serial_pool
+        com_port = printer_info.get('com_port') or printer_info.get('port')
+        return serial_pool.query(com_port, requests, timeout=timeout)
+
+    @staticmethod
+    def _com_port_open(printer_info):
+        from printer.serial_pool import serial_pool
+        return serial_pool.is_open(printer_info.get('com_port') or printer_info.get('port'))
+
+    def poll(self, printer_info):
+        """
+        Interroge l'imprimante et met a jour le cache.
+
+        Returns:
+            dict: etat de l'imprimante, ou None si elle n'est pas interrogeable
+        """
+        if not self.supports(printer_info):
+            return None
+        from printer.jobs import printer_key
+        key = printer_key(printer_info)
+        if printer_info.get('connection_type') == 'bluetooth_com' and not self._com_port_open(printer_info):
+            # Port ferme : pas de connexion RFCOMM pour une simple requete d'etat,
+            # l'etat sera de nouveau connu apres le prochain envoi
+            with self._lock:
+                self._states.pop(key, None)
+            return None
+        try:
+            replies = self._query(printer_info, config.get('status_poll_timeout', 1.0))
+        except ImportError:
+            return None  # pyserial absent
+        except OSError as e:
+            replies = ()
+            logger.debug(f"Etat de {printer_info.get('name')} indisponible: {e}")
+        if replies is None:
+            return self.get(printer_info)  # impression en cours : etat precedent conserve
+
+        if replies:
+            status = decode_status(replies)
+        else:
+            status = {'state': STATE_UNREACHABLE, 'ready': False, 'online': False,
+                      'cover_open': None, 'paper': None, 'error': None}
+        status['printer'] = printer_info.get('name')
+        status['checked_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            previous = self._states.get(key)
+            self._states[key] = status
+        if previous is None or previous['state'] != status['state']:
+            log = logger.info if status['ready'] else logger.warning
+            log(f"Etat de l'imprimante {status['printer']}: {status['state']}")
+        return status
+
+    def get(self, printer_info):
+        """Dernier etat connu de l'imprimante, ou None (jamais interrogee)."""
+        from printer.jobs import printer_key
+        with self._lock:
+            return self._states.get(printer_key(printer_info))
+
+    def is_ready(self, printer_info):
+        """False seulement si le dernier etat connu signale un defaut (voir is_blocking)."""
+        return not is_blocking(self.get(printer_info))
+
+    def wait_ready(self, printer_info, timeout):
+        """
+        Interroge l'imprimante jusqu'a son retour (ou expiration du delai).
+
+        Returns:
+            dict: dernier etat obtenu (None si non interrogeable)
+        """
+        deadline = time.time() + timeout
+        status = self.poll(printer_info)
+        while is_blocking(status) and time.time() < deadline:
+            time.sleep(min(_PAUSE_POLL_STEP, max(0.0, deadline - time.time())))
+            status = self.poll(printer_info)
+        return status
+
+    def summary(self):
+        """Resume pour /health : nombre d'imprimantes interrogees et defauts en cours."""
+        with self._lock:
+            states = list(self._states.values())
+        return {
+            'polled': len(states),
+            'ready': sum(1 for status in states if status['ready']),
+            'not_ready': {status['printer']: status['state'] for status in states
+                          if not status['ready']},
+        }
+
+    # -- Interrogation en arriere-plan ----------------------------------------
+
+    def poll_all(self):
+        """Interroge toutes les imprimantes reseau / COM du registre."""
+        for printer_info in self._get_registry().get_all():
+            if self.supports(printer_info):
+                try:
+                    self.poll(printer_info)
+                except Exception as e:
+                    logger.error(f"Erreur interrogation de {printer_info.get('name')}: {e}")
+
+    def start_background_polling(self):
+        """Demarre le thread d'interrogation periodique (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        if config.get('status_poll_interval', 30) <= 0:
+            logger.info("Surveillance de l'etat des imprimantes desactivee")
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._poll_loop, name='printer-status', daemon=True)
+        self._thread.start()
+
+    def stop_background_polling(self):
+        self._stop_event.set()
+
+    def _poll_loop(self):
+        while True:
+            self.poll_all()
+            if self._stop_event.wait(config.get('status_poll_interval', 30)):
+                return
+
+
+# Instance partagee par l'API, les files d'impression et les groupes
+printer_status = PrinterStatusMonitor()
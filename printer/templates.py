@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Modèles de reçus compilés (POST /templates, puis /print avec 'template_id').
+
+Un modèle est une liste de sections du moteur dynamique dont certaines valeurs
+contiennent des variables "{{nom}}". À la première impression pour une largeur
+papier / un encodage / une devise donnés, toutes les sections sans variable
+(en-tête, adresse, logo, pied de page...) sont rendues une fois pour toutes en
+octets ESC/POS ; seules les sections à variables sont rendues à chaque requête.
+
+  - "{{nom}}" seul dans une valeur est remplacé par la variable telle quelle
+    (liste de lignes d'une table, nombre...)
+  - "Total: {{total}}" : substitution textuelle
+"""
+
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from utils.config import logger, config, TEMPLATES_FILE
+from printer.profiles import get_printer_profile
+from printer.receipt import ReceiptBuilder, format_dynamic_content, get_dynamic_epilogue
+
+
+_PLACEHOLDER = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+_TEMPLATE_ID = re.compile(r'^[\w-]{1,64}$')
+
+
+def find_placeholders(value):
+    """Noms des variables "{{nom}}" présentes dans une valeur (parcours récursif)."""
+    if isinstance(value, str):
+        return set(_PLACEHOLDER.findall(value))
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        names = set()
+        for item in value:
+            names |= find_placeholders(item)
+        return names
+    return set()
+
+
+def substitute(value, variables):
+    """Remplace les variables d'une valeur (copie récursive)."""
+    if isinstance(value, str):
+        match = _PLACEHOLDER.fullmatch(value.strip())
+        if match:
+            return variables[match.group(1)]
+        return _PLACEHOLDER.sub(lambda m: str(variables[m.group(1)]), value)
+    if isinstance(value, dict):
+        return {key: substitute(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [substitute(item, variables) for item in value]
+    return value
+
+
+class ReceiptTemplate:
+    """Modèle de reçu et ses versions compilées (segments statiques pré-rendus)."""
+
+    def __init__(self, template_id, sections, name=None, currency=None, currency_decimals=None,
+                 created_at=None):
+        self.id = template_id
+        self.name = name or template_id
+        self.sections = sections
+        self.currency = currency
+        self.currency_decimals = currency_decimals
+        self.created_at = created_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.section_variables = [find_placeholders(section) for section in sections]
+        self.variables = set().union(*self.section_variables) if sections else set()
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def _compile(self, printer_width, encoding, currency, decimals):
+        """
+        Segments du reçu : bytes (sections statiques consécutives, déjà rendues)
+        ou dict (section à variables, rendue à chaque impression).
+        """
+        profile = get_printer_profile(encoding, printer_width)
+        segments = []
+        static = ReceiptBuilder(profile)
+        for section, names in zip(self.sections, self.section_variables):
+            if names:
+                segments.append(static.getvalue())
+                segments.append(section)
+                static = ReceiptBuilder(profile, prologue=False)
+            else:
+                format_dynamic_content(static, {'sections': [section]}, profile.line_width,
+                                       currency, decimals, None, printer_width)
+        static.extend(get_dynamic_epilogue(self.sections, profile))
+        segments.append(static.getvalue())
+        return [segment for segment in segments if len(segment)]
+
+    def render(self, variables, printer_width='58mm', encoding='ascii', printer_name=None):
+        """
+        Rend le reçu complet avec les variables données.
+        Leve KeyError si une variable du modèle est absente.
+        """
+        currency = variables.get('currency') or self.currency or config.get('currency', 'FCFA')
+        decimals = int(variables.get('currency_decimals',
+                                     self.currency_decimals if self.currency_decimals is not None
+                                     else config.get('currency_decimals', 0)))
+        key = (printer_width, encoding, currency, decimals)
+        with self._lock:
+            segments = self._compiled.get(key)
+        if segments is None:
+            segments = self._compile(printer_width, encoding, currency, decimals)
+            with self._lock:
+                self._compiled[key] = segments
+            logger.info(f"Modèle {self.id} compilé pour {printer_width}/{encoding}: "
+                        f"{sum(1 for s in segments if isinstance(s, dict))} section(s) dynamique(s)")
+
+        profile = get_printer_profile(encoding, printer_width)
+        commands = ReceiptBuilder(profile, printer_name, prologue=False)
+        for segment in segments:
+            if isinstance(segment, bytes):
+                commands.extend(segment)
+            else:
+                format_dynamic_content(commands, {'sections': [substitute(segment, variables)]},
+                                       profile.line_width, currency, decimals,
+                                       printer_name, printer_width)
+        return commands.getvalue()
+
+    def to_dict(self, with_sections=False):
+        result = {
+            'template_id': self.id,
+            'name': self.name,
+            'variables': sorted(self.variables),
+            'sections': len(self.sections),
+            'static_sections': sum(1 for names in self.section_variables if not names),
+            'created_at': self.created_at,
+        }
+        if with_sections:
+            result['sections'] = self.sections
+            result['currency'] = self.currency
+            result['currency_decimals'] = self.currency_decimals
+        return result
+
+
+class TemplateRegistry:
+    """Modèles enregistrés, persistés dans TEMPLATES_FILE (dossier de données)."""
+
+    def __init__(self, path=None):
+        self.path = path or TEMPLATES_FILE
+        self._lock = threading.Lock()
+        self._templates = None
+
+    def _ensure_loaded(self):
+        if self._templates is not None:
+            return
+        self._templates = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            for template_id, item in stored.items():
+                self._templates[template_id] = ReceiptTemplate(
+                    template_id, item['sections'], item.get('name'), item.get('currency'),
+                    item.get('currency_decimals'), item.get('created_at'))
+            logger.info(f"{len(self._templates)} modèle(s) de reçu chargé(s)")
+        except Exception as e:
+            logger.error(f"Erreur chargement des modèles de reçu: {e}")
+
+    def _save(self):
+        stored = {
+            template.id: {
+                'name': template.name,
+                'sections': template.sections,
+                'currency': template.currency,
+                'currency_decimals': template.currency_decimals,
+                'created_at': template.created_at,
+            }
+            for template in self._templates.values()
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(stored, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def create(self, sections, template_id=None, name=None, currency=None, currency_decimals=None):
+        """Enregistre (ou remplace) un modèle et le retourne."""
+        template_id = template_id or uuid.uuid4().hex[:12]
+        if not _TEMPLATE_ID.match(template_id):
+            raise ValueError("'template_id' : lettres, chiffres, '_' ou '-' (64 max)")
+        template = ReceiptTemplate(template_id, sections, name, currency, currency_decimals)
+        with self._lock:
+            self._ensure_loaded()
+            self._templates[template_id] = template
+            self._save()
+        logger.info(f"Modèle de reçu {template_id} enregistré ({len(sections)} sections, "
+                    f"variables: {sorted(template.variables)})")
+        return template
+
+    def get(self, template_id):
+        with self._lock:
+            self._ensure_loaded()
+            return self._templates.get(template_id)
+
+    def get_all(self):
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._templates.values())
+
+    def delete(self, template_id):
+        """Supprime un modèle. Retourne False s'il n'existe pas."""
+        with self._lock:
+            self._ensure_loaded()
+            if self._templates.pop(template_id, None) is None:
+                return False
+            self._save()
+        return True
+
+
+# Instance partagée par l'API
+receipt_templates = TemplateRegistry()
@@ -65,15 +65,14 @@ class ThermalPrinterService:
             load_config()
             logger.info(f"Service {SERVICE_NAME} demarre depuis {SERVICE_DIR}")
 
-            from api.server import create_app
+            from api.server import create_app, serve_app
             app = create_app()
 
             host = config.get('host', '0.0.0.0')
             port = config.get('port', 5789)
 
             logger.info(f"API en ecoute sur http://{host}:{port}")
-            # use_reloader=False obligatoire dans un service / thread
-            app.run(host=host, port=port, use_reloader=False, threaded=True)
+            serve_app(app, host, port)
         except Exception as e:
             # Ecrire l'erreur dans un fichier log de secours
             _log_error(f"Erreur critique dans le service: {e}")
@@ -191,11 +191,11 @@ def _run_flask():
         os.chdir(SERVICE_DIR)
         from utils.config import load_config, config
         load_config()
-        from api.server import create_app
+        from api.server import create_app, serve_app
         app = create_app()
         host = config.get('host', '0.0.0.0')
         port = config.get('port', 5789)
-        app.run(host=host, port=port, use_reloader=False, threaded=True)
+        serve_app(app, host, port)
     except Exception as e:
         _log_error(f"Erreur critique Flask : {e}")
 
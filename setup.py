@@ -8,6 +8,7 @@ setup(
     install_requires=[
         "flask>=2.0.0",
         "flask-cors>=3.0.0",
+        "waitress>=2.1.0",
         "python-escpos>=3.0.0",
         "pywin32;platform_system=='Windows'",
         "pillow>=8.0.0",
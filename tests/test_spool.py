@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests du journal durable des travaux (rejeu apres arret du service) :
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+# Dossier de donnees temporaire (utils.config le cree a l'import)
+os.environ.setdefault('PROGRAMDATA', tempfile.mkdtemp(prefix='thermal-tests-'))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from printer.groups import printer_groups
+from printer.jobs import JobManager, JOB_DONE
+from printer.spool import PrintSpool
+
+
+PRINTERS = [{'id': name, 'name': name, 'connection_type': 'network', 'ip': name}
+            for name in ('A', 'B', 'C')]
+
+
+def _choose(group_name, load=None, exclude=()):
+    return next((p for p in PRINTERS if p['name'] not in exclude), None)
+
+
+@mock.patch.object(printer_groups, 'mark_failed', lambda printer_info: None)
+@mock.patch.object(printer_groups, 'choose', _choose)
+class SpoolReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(prefix='thermal-spool-'), 'print_spool.journal')
+
+    def test_failover_is_recorded_in_journal(self):
+        sent = threading.Event()
+        crashed = threading.Event()
+
+        def sender(printer_info, data, progress=None):
+            if printer_info['name'] == 'A':
+                return False
+            sent.set()
+            crashed.wait(5)  # arret du service pendant l'envoi sur B
+            return False
+
+        spool = PrintSpool(self.path)
+        manager = JobManager(sender=sender)
+        manager.start_spool(spool)
+        job = manager.submit(dict(PRINTERS[0]), b'ticket', group='cuisine')
+        self.assertTrue(sent.wait(5))
+        spool.close()
+        crashed.set()
+
+        records = PrintSpool(self.path).open()
+        self.assertEqual([(r['printer_info']['name'], r['attempts']) for r in records],
+                         [('B', ['A'])])
+
+        # Rejeu : B echoue de nouveau, le travail passe sur C sans revenir a A
+        tried = []
+
+        def replay_sender(printer_info, data, progress=None):
+            tried.append(printer_info['name'])
+            return printer_info['name'] == 'C'
+
+        replay = JobManager(sender=replay_sender)
+        replay.start_spool(PrintSpool(self.path))
+        replayed = replay.get(job.id)
+        self.assertTrue(replayed.wait(5))
+        self.assertEqual(replayed.status, JOB_DONE)
+        self.assertEqual(tried, ['B', 'C'])
+        self.assertEqual(replayed.attempts, ['A', 'B', 'C'])
+
+
+if __name__ == '__main__':
+    unittest.main()
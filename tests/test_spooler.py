@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests du pool de handles du spouleur et du regroupement des travaux, avec un
+faux spouleur (executables hors Windows) :
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+# Dossier de donnees temporaire (utils.config le cree a l'import)
+os.environ.setdefault('PROGRAMDATA', tempfile.mkdtemp(prefix='thermal-tests-'))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.config import config
+from printer.jobs import JobManager, JOB_DONE, JOB_FAILED
+from printer.printer_utils import print_raw, print_raw_documents
+from printer.spooler import SpoolerPool
+
+
+class SpoolerError(Exception):
+    """Erreur du faux spouleur (pywintypes.error sous Windows)."""
+
+
+class FakeSpooler:
+    """
+    Backend de SpoolerPool en memoire : chaque document RAW est une liste des
+    recus ecrits. Pannes et blocages injectables.
+    """
+
+    def __init__(self):
+        self.opened = []
+        self.closed = 0
+        self.documents = []
+        self.fail_start_doc = 0  # nombre de start_doc a refuser
+        self.fail_write = 0      # nombre de write a refuser
+        self.write_gate = None   # threading.Event attendu avant chaque write
+        self.writing = threading.Event()  # leve des qu'une ecriture commence
+        self._next_handle = 0
+
+    def open_printer(self, printer_name):
+        self._next_handle += 1
+        self.opened.append(printer_name)
+        return self._next_handle
+
+    def close_printer(self, handle):
+        self.closed += 1
+
+    def start_doc(self, handle, title):
+        if self.fail_start_doc:
+            self.fail_start_doc -= 1
+            raise SpoolerError("handle invalide")
+        self.documents.append([])
+
+    def end_doc(self, handle):
+        pass
+
+    def write(self, handle, data):
+        self.writing.set()
+        if self.write_gate is not None:
+            self.write_gate.wait(5)
+        if self.fail_write:
+            self.fail_write -= 1
+            raise SpoolerError("ecriture refusee")
+        self.documents[-1].append(bytes(data))
+
+
+class SpoolerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = FakeSpooler()
+        self.pool = SpoolerPool(backend=self.backend)
+
+    def tearDown(self):
+        self.pool.close_all()
+
+    def test_handle_reused_across_receipts(self):
+        for i in range(3):
+            self.assertTrue(print_raw('POS-58', b'recu %d' % i, self.pool))
+        self.assertEqual(self.backend.opened, ['POS-58'])
+        self.assertEqual(self.backend.documents, [[b'recu 0'], [b'recu 1'], [b'recu 2']])
+
+    def test_handle_closed_after_each_receipt_without_keepalive(self):
+        config['spooler_keep_handle'] = False
+        try:
+            print_raw('POS-58', b'a', self.pool)
+            print_raw('POS-58', b'b', self.pool)
+        finally:
+            config['spooler_keep_handle'] = True
+        self.assertEqual(len(self.backend.opened), 2)
+        self.assertEqual(self.backend.closed, 2)
+
+    def test_several_receipts_in_one_document(self):
+        self.assertTrue(print_raw_documents('POS-58', [b'a', b'b', b'c'], self.pool))
+        self.assertEqual(self.backend.documents, [[b'a', b'b', b'c']])
+
+    def test_rejected_reused_handle_is_reopened_once(self):
+        print_raw('POS-58', b'a', self.pool)
+        self.backend.fail_start_doc = 1
+        self.assertTrue(print_raw('POS-58', b'b', self.pool))
+        self.assertEqual(len(self.backend.opened), 2)
+        self.assertEqual(self.backend.documents, [[b'a'], [b'b']])
+
+    def test_fresh_handle_rejected_is_not_retried(self):
+        self.backend.fail_start_doc = 1
+        self.assertFalse(print_raw('POS-58', b'a', self.pool))
+        self.assertEqual(len(self.backend.opened), 1)
+        self.assertEqual(self.backend.documents, [])
+
+    def test_started_document_is_never_resent(self):
+        print_raw('POS-58', b'a', self.pool)
+        self.backend.fail_write = 1
+        self.assertFalse(print_raw_documents('POS-58', [b'b', b'c'], self.pool))
+        # Une seule tentative du document en echec, handle referme
+        self.assertEqual(self.backend.documents, [[b'a'], []])
+        self.assertEqual(len(self.backend.opened), 1)
+        self.assertEqual(self.backend.closed, 1)
+
+
+class JobBatchingTest(unittest.TestCase):
+
+    PRINTER = {'name': 'POS-58', 'connection_type': 'usb'}
+
+    def setUp(self):
+        self.backend = FakeSpooler()
+        self.pool = SpoolerPool(backend=self.backend)
+        self.manager = JobManager(spooler=self.pool)
+
+    def tearDown(self):
+        self.pool.close_all()
+
+    def _block_first(self, data=b'0'):
+        """Soumet un travail et le bloque en cours d'ecriture. Retourne (travail, verrou)."""
+        gate = threading.Event()
+        self.backend.write_gate = gate
+        job = self.manager.submit(dict(self.PRINTER), data)
+        self.assertTrue(self.backend.writing.wait(5))
+        return job, gate
+
+    def _submit_while_blocked(self, items):
+        """Met les travaux en file pendant que le premier est en cours d'envoi."""
+        first, gate = self._block_first(items[0][0])
+        jobs = [first]
+        for data, group in items[1:]:
+            jobs.append(self.manager.submit(dict(self.PRINTER), data, group=group))
+        gate.set()
+        for job in jobs:
+            self.assertTrue(job.wait(5))
+        return jobs
+
+    def test_queued_jobs_share_one_document(self):
+        jobs = self._submit_while_blocked([(b'%d' % i, None) for i in range(6)])
+        self.assertEqual({job.status for job in jobs}, {JOB_DONE})
+        # Le premier travail part seul, les suivants (deja en file) ensemble
+        self.assertEqual(self.backend.documents, [[b'0'], [b'1', b'2', b'3', b'4', b'5']])
+        self.assertEqual(self.backend.opened, ['POS-58'])
+
+    def test_batch_size_is_bounded(self):
+        config['spooler_batch_max'] = 2
+        try:
+            self._submit_while_blocked([(b'%d' % i, None) for i in range(5)])
+        finally:
+            config['spooler_batch_max'] = 8
+        self.assertEqual([len(document) for document in self.backend.documents], [1, 2, 2])
+
+    def test_group_jobs_are_sent_alone(self):
+        self._submit_while_blocked([(b'0', None), (b'1', None), (b'g', 'cuisine'), (b'2', None)])
+        self.assertEqual(self.backend.documents, [[b'0'], [b'1'], [b'g'], [b'2']])
+
+    def test_failed_batch_fails_every_job(self):
+        first, gate = self._block_first()
+        queued = [self.manager.submit(dict(self.PRINTER), b'%d' % i) for i in (1, 2)]
+        self.backend.fail_start_doc = 2  # handle reutilise refuse, puis le nouveau aussi
+        gate.set()
+        for job in [first] + queued:
+            self.assertTrue(job.wait(5))
+        self.assertEqual(first.status, JOB_DONE)
+        self.assertEqual([job.status for job in queued], [JOB_FAILED, JOB_FAILED])
+        self.assertEqual(self.backend.documents, [[b'0']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tests de validation des impressions par modèle (variables substituées) :
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+# Dossier de donnees temporaire (utils.config le cree a l'import)
+os.environ.setdefault('PROGRAMDATA', tempfile.mkdtemp(prefix='thermal-tests-'))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.server import validate_print_request, validate_sections
+from printer.templates import receipt_templates
+
+
+SECTIONS = [
+    {'type': 'header', 'text': 'CAFE DU PORT'},
+    {'type': 'table',
+     'columns': [{'label': 'Article', 'width': 10}, {'label': 'Prix', 'width': 8, 'format': 'price'}],
+     'rows': '{{items}}'},
+    {'type': 'table',
+     'columns': [{'label': 'Article', 'width': 10}, {'label': 'Qte', 'width': 3, 'format': 'integer'}],
+     'rows': [['{{name}}', '{{qty}}']]},
+    {'type': 'feed', 'lines': '{{lines}}'},
+]
+
+VARIABLES = {'items': [['Cafe', 1500]], 'name': 'The', 'qty': 2, 'lines': 2}
+
+
+class TemplateValidationTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.template = receipt_templates.create(SECTIONS, template_id='test-cafe')
+
+    @classmethod
+    def tearDownClass(cls):
+        receipt_templates.delete(cls.template.id)
+
+    def _errors(self, **variables):
+        return validate_print_request({'template_id': self.template.id,
+                                       'variables': {**VARIABLES, **variables}})
+
+    def test_template_sections_accept_placeholders(self):
+        self.assertEqual(validate_sections(SECTIONS, templated=True), [])
+
+    def test_valid_variables(self):
+        self.assertEqual(self._errors(), [])
+
+    def test_rows_not_a_list_names_variable(self):
+        errors = self._errors(items='Cafe 1500')
+        self.assertEqual(len(errors), 1)
+        self.assertIn("'rows'", errors[0])
+        self.assertIn("['items']", errors[0])
+
+    def test_invalid_amount_names_variable(self):
+        errors = self._errors(items=[['Cafe', 'gratuit']])
+        self.assertEqual(len(errors), 1)
+        self.assertIn("['items']", errors[0])
+
+    def test_culprit_among_several_variables(self):
+        errors = self._errors(qty='deux')
+        self.assertEqual(len(errors), 1)
+        self.assertIn("['qty']", errors[0])
+
+    def test_invalid_line_count_names_variable(self):
+        errors = self._errors(lines='beaucoup')
+        self.assertEqual(len(errors), 1)
+        self.assertIn("['lines']", errors[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
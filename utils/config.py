@@ -23,6 +23,11 @@ _DATA_DIR = Path(os.environ.get('PROGRAMDATA', r'C:\ProgramData')) / 'ThermalPri
 _DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 CONFIG_FILE = str(_DATA_DIR / "printer_config.json")
+WIDTH_CACHE_FILE = str(_DATA_DIR / "printer_widths.json")  # Largeurs papier détectées
+SPOOL_FILE = str(_DATA_DIR / "print_spool.journal")       # Journal des travaux d'impression
+IDEMPOTENCY_FILE = str(_DATA_DIR / "idempotency_keys.log")  # Clés d'idempotence persistées
+TEMPLATES_FILE = str(_DATA_DIR / "receipt_templates.json")  # Modèles de reçus (POST /templates)
+SERIAL_PORTS_FILE = str(_DATA_DIR / "serial_ports.json")    # Débits COM négociés par port
 _LOG_DIR    = str(_DATA_DIR / "logs")
 
 # Configuration globale optimisée pour ASCII par défaut
@@ -69,6 +74,58 @@ config = {
     "api_key": "",                            # Clé API requise (vide = pas d'authentification)
     "allowed_origins": [],                    # Origines CORS autorisées (vide = valeurs par défaut)
 
+    # Serveur HTTP
+    "server_mode": "waitress",                # 'waitress' (production) ou 'flask' (développement)
+    "server_threads": 8,                      # Threads de traitement des requêtes (waitress)
+    "server_backlog": 1024,                   # File d'attente des connexions TCP entrantes
+    "server_connection_limit": 100,           # Connexions simultanées max
+    "server_keepalive_timeout": 120,          # Fermeture d'une connexion keep-alive inactive (secondes)
+
+    # Registre des imprimantes
+    "printer_refresh_interval": 60,           # Rafraîchissement auto de la liste (secondes, 0 = désactivé)
+    "printer_width_cache": True,              # Mémorise la largeur détectée (printer_widths.json)
+
+    # Logos
+    "logo_cache_size": 32,                    # Logos convertis gardés en cache LRU (0 = désactivé)
+    "logo_dither": "floyd_steinberg",         # Tramage des logos : threshold, floyd_steinberg, atkinson, bayer
+    "raster_band_height": 128,                # Lignes par bande raster envoyée (0 = image en un seul bloc)
+    "raster_mode": "gs_v_0",                  # Commande raster : gs_v_0 (universelle) ou gs_l (GS ( L / GS 8 L)
+
+    # Files d'attente d'impression
+    "job_history_size": 1000,                 # Travaux terminés conservés pour /jobs/<id>
+    "job_wait_timeout": 30,                   # Attente max d'un /print avec "async": false (secondes)
+    "job_wait_max_timeout": 60,               # Durée max d'un long-poll /jobs/<id>/wait (secondes)
+    "job_callback_timeout": 5,                # Délai des appels webhook 'callback_url' (secondes)
+    "job_callback_workers": 4,                # Threads d'envoi des webhooks
+    "idempotency_ttl": 3600,                  # Durée de validité d'une clé Idempotency-Key (secondes)
+    "idempotency_max_keys": 10000,            # Nombre max de clés mémorisées
+    "idempotency_persist": False,             # Conserve les clés après redémarrage (idempotency_keys.log)
+    "printer_groups": {},                     # Groupes d'imprimantes identiques {"nom": {"printers": [...], "strategy": ...}}
+    "printer_group_cooldown": 30,             # Mise à l'écart d'un membre en échec (secondes)
+    "spool_enabled": True,                    # Journal durable des travaux (rejoués après redémarrage)
+    "spool_fsync_interval": 0.05,             # Synchronisation groupée du journal sur disque (secondes)
+    "spool_compact_threshold": 200,           # Travaux terminés avant réécriture du journal
+    "batch_max_items": 500,                   # Nombre max d'éléments par POST /print/batch
+    "batch_render_workers": 4,                # Threads de rendu des reçus d'un lot
+
+    # Imprimantes réseau (TCP 9100)
+    "network_keepalive": True,                # Connexion persistante réutilisée entre les tickets
+    "network_idle_timeout": 15,               # Fermeture d'une connexion inactive (secondes)
+    "network_drain_timeout": 0.8,             # Attente max de la réponse DLE EOT après envoi (secondes)
+    "serial_keepalive": True,                 # Port COM (Bluetooth SPP) gardé ouvert entre les tickets
+    "serial_idle_timeout": 30,                # Fermeture d'un port COM inactif (secondes)
+    "serial_chunk_size": 1024,                # Octets écrits par bloc sur un port COM (0 = écriture unique)
+    "serial_pacing": True,                    # Rythme des blocs calé sur le débit (baudrate) du port
+    "serial_flow_control": "none",            # Contrôle de flux COM : none, xonxoff, dsrdtr, rtscts
+    "serial_baud_probe": True,                # Recherche du débit le plus rapide d'un port COM (DLE EOT)
+    "serial_baud_candidates": [115200, 57600, 38400, 19200, 9600],  # Débits essayés
+    "status_poll_interval": 30,               # Interrogation DLE EOT des imprimantes réseau / COM (0 = désactivé)
+    "status_poll_timeout": 1.0,               # Attente max d'une réponse d'état (secondes)
+    "status_pause_timeout": 60,               # Pause max d'un travail si l'imprimante est en défaut (secondes)
+    "spooler_keep_handle": True,              # Handle du spouleur Windows gardé ouvert entre les tickets
+    "spooler_idle_timeout": 60,               # Fermeture d'un handle inactif (secondes)
+    "spooler_batch_max": 8,                   # Reçus en attente regroupés dans un document RAW (1 = désactivé)
+
     # Logging et débogage
     "log_encoding_decisions": True,           # Log les décisions d'encodage
     "debug_encoding": False                   # Mode debug pour l'encodage
@@ -187,6 +244,48 @@ def migrate_config_if_needed():
         'currency_decimals': 0,
         'api_key': '',
         'allowed_origins': [],
+        'server_mode': 'waitress',
+        'server_threads': 8,
+        'server_backlog': 1024,
+        'server_connection_limit': 100,
+        'server_keepalive_timeout': 120,
+        'printer_refresh_interval': 60,
+        'printer_width_cache': True,
+        'logo_cache_size': 32,
+        'logo_dither': 'floyd_steinberg',
+        'raster_band_height': 128,
+        'raster_mode': 'gs_v_0',
+        'job_history_size': 1000,
+        'job_wait_timeout': 30,
+        'job_wait_max_timeout': 60,
+        'job_callback_timeout': 5,
+        'job_callback_workers': 4,
+        'idempotency_ttl': 3600,
+        'idempotency_max_keys': 10000,
+        'idempotency_persist': False,
+        'printer_groups': {},
+        'printer_group_cooldown': 30,
+        'spool_enabled': True,
+        'spool_fsync_interval': 0.05,
+        'spool_compact_threshold': 200,
+        'batch_max_items': 500,
+        'batch_render_workers': 4,
+        'network_keepalive': True,
+        'network_idle_timeout': 15,
+        'network_drain_timeout': 0.8,
+        'serial_keepalive': True,
+        'serial_idle_timeout': 30,
+        'serial_chunk_size': 1024,
+        'serial_pacing': True,
+        'serial_flow_control': 'none',
+        'serial_baud_probe': True,
+        'serial_baud_candidates': [115200, 57600, 38400, 19200, 9600],
+        'status_poll_interval': 30,
+        'status_poll_timeout': 1.0,
+        'status_pause_timeout': 60,
+        'spooler_keep_handle': True,
+        'spooler_idle_timeout': 60,
+        'spooler_batch_max': 8,
     }
     
     for prop, default_value in new_properties.items():
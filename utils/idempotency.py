@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cache des clés d'idempotence (en-tête Idempotency-Key de POST /print).
+
+Un client qui renvoie la même requête après un délai dépassé reçoit la réponse
+d'origine au lieu de déclencher une seconde impression :
+  - entrées bornées en nombre ('idempotency_max_keys') et en durée ('idempotency_ttl')
+  - une requête identique encore en cours de traitement est refusée (409)
+  - une clé réutilisée avec un corps différent est refusée (422)
+  - persistance optionnelle ('idempotency_persist') : journal en ajout seul,
+    relu au démarrage (les clés restent valables après un redémarrage du service)
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from utils.config import logger, config, IDEMPOTENCY_FILE
+
+
+IDEMPOTENCY_NEW = 'new'
+IDEMPOTENCY_REPLAY = 'replay'
+IDEMPOTENCY_IN_PROGRESS = 'in_progress'
+IDEMPOTENCY_MISMATCH = 'mismatch'
+
+
+class IdempotencyCache:
+    """Associe une clé d'idempotence à la réponse (code HTTP + corps JSON) de la première requête."""
+
+    def __init__(self, path=None):
+        self.path = path or IDEMPOTENCY_FILE
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clé -> {'fingerprint', 'expires', 'status_code', 'body'}
+        self._loaded = False
+        self._appended = 0  # lignes ajoutées depuis la dernière réécriture du fichier
+
+    def begin(self, key, fingerprint):
+        """
+        Réserve `key` pour une nouvelle requête, ou retourne la réponse enregistrée.
+
+        Returns:
+            tuple: (état, entrée) — état IDEMPOTENCY_NEW (la requête doit être traitée
+                   puis complete() / abort()), IDEMPOTENCY_REPLAY (entrée = réponse
+                   d'origine), IDEMPOTENCY_IN_PROGRESS ou IDEMPOTENCY_MISMATCH
+        """
+        now = time.time()
+        with self._lock:
+            self._load()
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry['fingerprint'] != fingerprint:
+                    return IDEMPOTENCY_MISMATCH, entry
+                if entry['body'] is None:
+                    return IDEMPOTENCY_IN_PROGRESS, entry
+                return IDEMPOTENCY_REPLAY, entry
+
+            self._entries[key] = {
+                'fingerprint': fingerprint,
+                'expires': now + config.get('idempotency_ttl', 3600),
+                'status_code': None,
+                'body': None,
+            }
+            while len(self._entries) > config.get('idempotency_max_keys', 10000):
+                self._entries.popitem(last=False)
+            return IDEMPOTENCY_NEW, None
+
+    def complete(self, key, status_code, body):
+        """Enregistre la réponse de la requête réservée par begin()."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry['status_code'] = status_code
+            entry['body'] = body
+            if config.get('idempotency_persist', False):
+                self._append(key, entry)
+
+    def abort(self, key):
+        """Libère une clé dont la requête a échoué : le client pourra réessayer."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['body'] is None:
+                del self._entries[key]
+
+    # -- Interne (verrou tenu) ------------------------------------------------
+
+    def _expire(self, now):
+        # Insertion chronologique et TTL fixe : les plus anciennes expirent en premier
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry['expires'] > now:
+                break
+            del self._entries[key]
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not config.get('idempotency_persist', False) or not os.path.exists(self.path):
+            return
+        now = time.time()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # ligne tronquée par un arrêt brutal
+                    if record['expires'] > now:
+                        self._entries[record.pop('key')] = record
+            self._rewrite()
+            logger.info(f"{len(self._entries)} clé(s) d'idempotence rechargée(s)")
+        except Exception as e:
+            logger.warning(f"Clés d'idempotence non rechargées: {e}")
+
+    def _rewrite(self):
+        """Réécrit le fichier avec les seules réponses encore valables."""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for key, entry in self._entries.items():
+                if entry['body'] is not None:
+                    f.write(json.dumps({'key': key, **entry}, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+        self._appended = 0
+
+    def _append(self, key, entry):
+        try:
+            if self._appended >= config.get('idempotency_max_keys', 10000):
+                self._rewrite()  # les clés expirées ou évincées ne s'accumulent pas
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'key': key, **entry}, ensure_ascii=False) + '\n')
+            self._appended += 1
+        except OSError as e:
+            logger.warning(f"Clé d'idempotence non persistée: {e}")
+
+
+# Instance partagée par l'API
+idempotency_cache = IdempotencyCache()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Métriques internes de l'API exposées au format texte Prometheus (/metrics).
+
+Compteurs et histogrammes de latence en mémoire, sans dépendance externe :
+  - durée de chaque étape d'une impression (analyse JSON, validation,
+    résolution de l'imprimante, rendu/encodage, attente en file, transport)
+  - octets envoyés et erreurs par imprimante et type de connexion
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Bornes (secondes) des histogrammes de latence : de 0.5 ms a 30 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + (list(extra) if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Histogram:
+    """Histogramme cumulatif d'une série (un jeu d'étiquettes)."""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Metrics:
+    """Registre thread-safe de compteurs et d'histogrammes étiquetés."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self._buckets = tuple(buckets)
+        self._help = {}
+        self._counters = {}    # nom -> {labels: valeur}
+        self._histograms = {}  # nom -> {labels: _Histogram}
+        self._started = time.time()
+
+    def describe(self, name, text):
+        """Texte d'aide (# HELP) d'une métrique."""
+        self._help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        """Incrémente le compteur `name` pour les étiquettes données."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """Enregistre une durée (secondes) dans l'histogramme `name`."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram(self._buckets)
+            for i, bound in enumerate(self._buckets):
+                if seconds <= bound:
+                    hist.counts[i] += 1
+                    break
+            hist.sum += seconds
+            hist.count += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Mesure la durée du bloc dans l'histogramme `name` (même en cas d'exception)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        """Remet toutes les séries à zéro."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._started = time.time()
+
+    def render(self):
+        """Exposition au format texte Prometheus (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+            for name in sorted(self._histograms):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(self._buckets, hist.counts):
+                        cumulative += count
+                        le = _format_labels(key, [('le', _format_value(float(bound)))])
+                        lines.append(f"{name}_bucket{le} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {hist.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(hist.sum)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+
+            lines.append("# TYPE thermal_api_uptime_seconds gauge")
+            lines.append(f"thermal_api_uptime_seconds {time.time() - self._started:.3f}")
+        return '\n'.join(lines) + '\n'
+
+
+# Instance partagée par l'API et les files d'impression
+metrics = Metrics()
+
+metrics.describe('thermal_stage_duration_seconds',
+                 "Durée de chaque étape du traitement d'une impression")
+metrics.describe('thermal_requests_total', "Requêtes d'impression reçues, par endpoint et statut HTTP")
+metrics.describe('thermal_jobs_total', "Travaux d'impression terminés, par imprimante et résultat")
+metrics.describe('thermal_bytes_sent_total', "Octets ESC/POS envoyés avec succès aux imprimantes")
+metrics.describe('thermal_errors_total', "Erreurs par étape du traitement")